@@ -0,0 +1,99 @@
+# Порівняння форматів кешу боржників у Redis:
+# розмір запису та швидкість пакетного декодування проти старого JSON-шляху.
+#
+#   python benchmarks/bench_codecs.py --entries 100000
+#   python benchmarks/bench_codecs.py --entries 100000 --redis   # + MEMORY USAGE у Redis
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from databases.models import DebtorReport
+from databases.codecs import CODECS
+
+
+def make_entries(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    names = ["Шевченко", "Бойко", "Шпак", "Мельник", "Ткаченко"]
+    return [
+        (
+            f"RIC-{i:08d}",
+            f"{rng.choice(names)} {rng.choice(names)[0]}.",
+            float(rng.choice([150, 250, 500, 99.99])),
+            date.today() - timedelta(days=rng.randint(31, 400)),
+        )
+        for i in range(count)
+    ]
+
+
+def bench_legacy(entries):
+    # попередній формат: model_dump_json з обчислюваними полями + DebtorReport(**data) на читання
+    values = [
+        DebtorReport(ric=ric, full_name=name, monthly_fee=fee, last_payment_date=paid).model_dump_json()
+        for ric, name, fee, paid in entries
+    ]
+    started = time.perf_counter()
+    decoded = [DebtorReport(**json.loads(value)) for value in values]
+    elapsed = time.perf_counter() - started
+    assert len(decoded) == len(entries)
+    return values, elapsed
+
+
+def bench_codec(codec, entries):
+    values = [codec.encode(*entry) for entry in entries]
+    started = time.perf_counter()
+    df = codec.decode_frame(values)
+    elapsed = time.perf_counter() - started
+    assert len(df) == len(entries)
+    return values, elapsed
+
+
+def redis_memory(values, key: str) -> float:
+    from databases.redis_db import RedisManager
+
+    r = RedisManager().r_raw
+    r.delete(key)
+    pipe = r.pipeline(transaction=False)
+    for i, value in enumerate(values):
+        pipe.hset(key, f"RIC-{i:08d}", value)
+    pipe.execute()
+    usage = r.memory_usage(key, samples=0)
+    r.delete(key)
+    return usage / len(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк кодеків кешу боржників")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--redis", action="store_true", help="виміряти MEMORY USAGE у локальному Redis")
+    args = parser.parse_args()
+
+    entries = make_entries(args.entries)
+    results = [("legacy-json", *bench_legacy(entries))]
+    for name, codec_cls in CODECS.items():
+        try:
+            codec = codec_cls()
+        except ImportError as e:
+            print(f"[skip] {name}: {e}")
+            continue
+        results.append((name, *bench_codec(codec, entries)))
+
+    header = f"{'codec':<12} {'bytes/entry':>12} {'decode, rows/s':>16}"
+    if args.redis:
+        header += f" {'redis bytes/entry':>18}"
+    print(header)
+    for name, values, elapsed in results:
+        size = sum(len(v.encode("utf-8") if isinstance(v, str) else v) for v in values) / len(values)
+        line = f"{name:<12} {size:>12.1f} {len(values) / elapsed:>16,.0f}"
+        if args.redis:
+            line += f" {redis_memory(values, f'bench:codec:{name}'):>18.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# Навантажувальний бенчмарк шару даних: засіває синтетичних абонентів і заявки,
+# міряє p50/p99 і рядки/с для методів менеджерів і зберігає результат у JSON.
+#
+#   python run.py up                                          # бази з docker-compose
+#   python benchmarks/bench_data_layer.py --sizes 10000 100000
+#   python benchmarks/bench_data_layer.py --sizes 1000000 --repeat 20
+#   python benchmarks/bench_data_layer.py --sizes 10000 --compare benchmarks/results/<попередній>.json
+#
+# Бенчмарк додає лише записи з префіксом RIC-BENCH- і видаляє їх після кожного розміру,
+# але повні проходи по таблицях зачіпають і решту даних, тож краще запускати на порожніх базах.
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from databases import PostgresManager, MongoManager, RedisManager
+from databases.generators import generate_subscribers, generate_requests
+
+PREFIX = "RIC-BENCH-"
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(size: int, operation: str, timings, rows: int):
+    timings = sorted(timings)
+    total = sum(timings)
+    return {
+        "size": size,
+        "operation": operation,
+        "calls": len(timings),
+        "rows": rows,
+        "p50_ms": round(percentile(timings, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.mean(timings) * 1000, 3),
+        "rows_per_sec": round(rows / total, 1) if total and rows else None,
+    }
+
+
+class Bench:
+    def __init__(self, size: int, repeat: int, seed: int):
+        self.size = size
+        self.repeat = repeat
+        self.rng = random.Random(seed)
+        self.results = []
+
+    def run(self, operation: str, fn, calls=None):
+        # fn повертає кількість оброблених рядків
+        timings, rows = [], 0
+        for _ in range(calls or self.repeat):
+            started = time.perf_counter()
+            rows += fn() or 0
+            timings.append(time.perf_counter() - started)
+        result = summarize(self.size, operation, timings, rows)
+        self.results.append(result)
+        rate = f"{result['rows_per_sec']:>12,.0f} rows/s" if result["rows_per_sec"] else ""
+        print(f"  {operation:<36} p50 {result['p50_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms {rate}")
+        return result
+
+
+def server_versions(pg, mongo, redis):
+    def postgres():
+        with pg.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SHOW server_version")
+            return cursor.fetchone()[0]
+
+    probes = {
+        "postgres": postgres,
+        "mongo": lambda: mongo.client.server_info().get("version"),
+        "redis": lambda: redis.r.info("server").get("redis_version"),
+    }
+    versions = {}
+    for name, probe in probes.items():
+        try:
+            versions[name] = probe()
+        except Exception:
+            # версія лише довідкова, її відсутність не скасовує прогін
+            versions[name] = None
+    return versions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def cleanup(pg, mongo, redis):
+    with pg.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM subscribers WHERE ric LIKE %s", (PREFIX + "%",))
+    mongo.collection.delete_many({"ric": {"$regex": f"^{PREFIX}"}})
+    # видалення в обхід менеджера не проходить через підписників, тож кеш перебудується
+    redis.invalidate_debtors_cache()
+
+
+def bench_size(pg, mongo, redis, size: int, repeat: int, seed: int, requests_per_subscriber: float):
+    print(f"\n=== {size:,} абонентів ===")
+    bench = Bench(size, repeat, seed)
+    rics = [f"{PREFIX}{i:07d}" for i in range(size)]
+
+    def random_ric():
+        return bench.rng.choice(rics)
+
+    # --- засів: одноразові масові записи ---
+    subscribers = list(generate_subscribers(size, seed=seed, prefix=PREFIX))
+    bench.run("pg.bulk_add_subscribers", lambda: pg.bulk_add_subscribers(subscribers)["inserted"], calls=1)
+    requests = list(generate_requests(subscribers, per_subscriber=requests_per_subscriber, seed=seed))
+    bench.run("mongo.create_requests", lambda: len(mongo.create_requests(requests)), calls=1)
+    del subscribers, requests
+
+    heavy = max(1, min(repeat, 3))
+
+    # --- Postgres ---
+    bench.run("pg.get_subscriber", lambda: 1 if pg.get_subscriber(random_ric()) else 0)
+    bench.run("pg.get_subscribers[100]", lambda: len(pg.get_subscribers(bench.rng.sample(rics, 100))))
+    bench.run("pg.get_subscribers_page[50]", lambda: len(pg.get_subscribers_page(random_ric(), 50)))
+    bench.run("pg.get_subscribers_frame[1000]", lambda: len(pg.get_subscribers_frame(random_ric(), 1000)))
+    bench.run("pg.update_subscriber",
+              lambda: pg.update_subscriber(random_ric(), {"monthly_fee": float(bench.rng.choice([150, 250]))}) or 1)
+    bench.run("pg.get_debtors_report[50]", lambda: len(pg.get_debtors_report(limit=50)))
+    bench.run("pg.get_debtors_totals", lambda: pg.get_debtors_totals()["debtors_count"])
+    bench.run("pg.get_tariff_analytics", lambda: len(pg.get_tariff_analytics()))
+    # одруківки й незакінчені слова: з pg_trgm топ-N читається з GiST-індексів за відстанню <<->
+    search_terms = ["Шевчинко", "Ткачен", "redmi", PREFIX + "00001"]
+    bench.run("pg.search_subscribers[20]", lambda: len(pg.search_subscribers(bench.rng.choice(search_terms))))
+    bench.run("pg.get_custom_columns[2]", lambda: len(pg.get_custom_columns(["ric", "monthly_fee"])["ric"]),
+              calls=heavy)
+    bench.run("pg.get_debt_candidates_frame", lambda: len(pg.get_debt_candidates_frame()), calls=heavy)
+    bench.run("pg.iter_subscribers", lambda: sum(1 for _ in pg.iter_subscribers()), calls=heavy)
+
+    # --- Redis ---
+    def rebuild():
+        redis.invalidate_debtors_cache()
+        df, _ = redis.get_or_rebuild_debtors_frame(pg.get_debt_candidates_frame)
+        return len(df)
+
+    bench.run("redis.rebuild_debtors_cache", rebuild, calls=heavy)
+    bench.run("redis.get_cached_debtors_frame", lambda: len(redis.get_cached_debtors_frame()))
+
+    # --- Mongo ---
+    bench.run("mongo.count_open_requests", mongo.count_open_requests)
+    bench.run("mongo.get_open_requests_page[20]", lambda: len(mongo.get_open_requests_page(limit=20)[0]))
+    bench.run("mongo.get_requests_by_ric", lambda: len(mongo.get_requests_by_ric(random_ric())))
+    bench.run("mongo.get_requests_by_rics[100]",
+              lambda: sum(map(len, mongo.get_requests_by_rics(bench.rng.sample(rics, 100)).values())))
+
+    cleanup(pg, mongo, redis)
+    return bench.results
+
+
+def compare(results, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["size"], r["operation"]): r for r in json.load(f)["results"]}
+
+    print(f"\nПорівняння з {baseline_path}:")
+    print(f"  {'size':>9} {'operation':<36} {'p50 before':>11} {'p50 now':>9} {'change':>8}")
+    for result in results:
+        before = baseline.get((result["size"], result["operation"]))
+        if not before or not before["p50_ms"]:
+            continue
+        change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100
+        print(f"  {result['size']:>9,} {result['operation']:<36} {before['p50_ms']:>11.2f} "
+              f"{result['p50_ms']:>9.2f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк шару даних")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=50, help="викликів на точкову операцію")
+    parser.add_argument("--requests-per-subscriber", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="шлях до JSON (типово benchmarks/results/data_layer-<час>.json)")
+    parser.add_argument("--compare", help="JSON попереднього запуску для порівняння p50")
+    args = parser.parse_args()
+
+    pg = PostgresManager()
+    mongo = MongoManager()
+    redis = RedisManager()
+    pg.add_change_listener(redis.apply_subscriber_changes)
+
+    started_at = datetime.now()
+    versions = server_versions(pg, mongo, redis)
+    results = []
+    try:
+        cleanup(pg, mongo, redis)
+        for size in args.sizes:
+            results.extend(bench_size(pg, mongo, redis, size, args.repeat, args.seed,
+                                      args.requests_per_subscriber))
+    finally:
+        cleanup(pg, mongo, redis)
+        pg.close()
+
+    report = {
+        "meta": {
+            "started_at": started_at.isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "servers": versions,
+            "sizes": args.sizes,
+            "repeat": args.repeat,
+            "requests_per_subscriber": args.requests_per_subscriber,
+            "seed": args.seed,
+            "redis_codec": redis.codec.name,
+            "prepared_statements": pg.statements.enabled,
+        },
+        "results": results,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"data_layer-{started_at:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультати збережено: {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
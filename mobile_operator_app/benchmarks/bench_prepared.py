@@ -0,0 +1,89 @@
+# Затримка одного виклику гарячих запитів PostgresManager:
+# попередній шлях (текст запиту + sql.SQL на кожен UPDATE) проти PREPARE/EXECUTE.
+#
+#   python benchmarks/bench_prepared.py --calls 5000
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor
+from databases.postgres_db import PostgresManager, GET_SUBSCRIBER_QUERY
+from databases.models import Subscriber
+
+BENCH_RICS = [f"RIC-BENCH-{i:05d}" for i in range(100)]
+
+
+def legacy_get_subscriber(pg: PostgresManager, ric: str):
+    with pg.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute(GET_SUBSCRIBER_QUERY, (ric,))
+        return cursor.fetchone()
+
+
+def legacy_update_subscriber(pg: PostgresManager, ric: str, updates: dict):
+    # так update_subscriber працював раніше: композиція sql.SQL на кожен виклик
+    set_clauses = [sql.SQL("{} = %s").format(sql.Identifier(col)) for col in updates]
+    query = sql.SQL("UPDATE subscribers SET {} WHERE ric = %s RETURNING *").format(
+        sql.SQL(', ').join(set_clauses)
+    )
+    with pg.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute(query, [*updates.values(), ric])
+        return cursor.fetchone()
+
+
+def measure(fn, calls: int):
+    timings = []
+    for i in range(calls):
+        started = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.mean(timings) * 1e6, timings[int(len(timings) * 0.99) - 1] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк підготовлених запитів")
+    parser.add_argument("--calls", type=int, default=5000)
+    args = parser.parse_args()
+
+    pg = PostgresManager(min_connections=1, max_connections=1)
+    pg.bulk_add_subscribers(
+        Subscriber(
+            ric=ric, pin_code="0000", full_name="Бенчмарк", phone_model="Pixel 7", phone_type="Смартфон",
+            service_type="Стандарт", contract_start_date=date(2024, 1, 1), contract_duration_months=12,
+            monthly_fee=100.0, last_payment_date=date.today()
+        )
+        for ric in BENCH_RICS
+    )
+    updates = {"full_name": "Бенчмарк", "monthly_fee": 100.0, "last_payment_date": date.today()}
+
+    def ric(i):
+        return BENCH_RICS[i % len(BENCH_RICS)]
+
+    cases = [
+        ("get_subscriber / text", lambda i: legacy_get_subscriber(pg, ric(i))),
+        ("get_subscriber / prepared", lambda i: pg._load_subscriber(ric(i))),
+        ("update_subscriber / sql.SQL", lambda i: legacy_update_subscriber(pg, ric(i), updates)),
+        ("update_subscriber / prepared", lambda i: pg.update_subscriber(ric(i), updates)),
+    ]
+
+    try:
+        print(f"{'case':<32} {'mean, us':>10} {'p99, us':>10}")
+        for name, fn in cases:
+            measure(fn, min(200, args.calls))  # прогрів: PREPARE і кеш планів
+            mean, p99 = measure(fn, args.calls)
+            print(f"{name:<32} {mean:>10.1f} {p99:>10.1f}")
+        print(f"statements: {pg.statement_stats()}")
+    finally:
+        with pg.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("DELETE FROM subscribers WHERE ric = ANY(%s)", (BENCH_RICS,))
+        pg.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from datetime import date
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+from .models import Subscriber, SubscriberProfile
+from .profiles import build_profiles
+from .async_postgres_db import AsyncPostgresManager
+from .async_mongo_db import AsyncMongoManager
+from .async_redis_db import AsyncRedisManager
+from .change_stream import AsyncChangeStreamPublisher
+from .mongo_db import HISTORY_FIELDS
+
+
+class LoopThread:
+    # Streamlit синхронний, а пули asyncpg/redis прив'язані до одного циклу подій,
+    # тож тримаємо власний цикл у фоновому потоці й віддаємо в нього корутини
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="async-db-loop", daemon=True)
+        self._thread.start()
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+async def gather(**calls: Awaitable) -> Dict[str, Any]:
+    # незалежні запити йдуть одночасно: час відповіді — найповільніший, а не сума
+    names = list(calls)
+    results = await asyncio.gather(*calls.values())
+    return dict(zip(names, results))
+
+
+class AsyncDataFacade:
+    def __init__(self, pg: Optional[AsyncPostgresManager] = None, mongo: Optional[AsyncMongoManager] = None,
+                 redis: Optional[AsyncRedisManager] = None, change_stream: bool = False):
+        self.pg = pg or AsyncPostgresManager()
+        self.mongo = mongo or AsyncMongoManager()
+        self.redis = redis or AsyncRedisManager()
+        if change_stream:
+            # кеші оновлює споживач потоку змін, тут лише публікуємо події
+            self.change_stream = AsyncChangeStreamPublisher(self.redis.r)
+            self.pg.add_change_listener(self.change_stream.publish)
+        else:
+            self.change_stream = None
+            self.pg.add_change_listener(self.redis.apply_subscriber_changes)
+        self._loop_thread: Optional[LoopThread] = None
+
+    async def connect(self):
+        await self.pg.connect()
+        return self
+
+    async def close(self):
+        await asyncio.gather(self.pg.close(), self.mongo.close(), self.redis.close())
+
+    def start(self):
+        self._loop_thread = LoopThread()
+        self.run(self.connect())
+        return self
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = 30.0):
+        return self._loop_thread.run(coro, timeout)
+
+    def stop(self):
+        if self._loop_thread is not None:
+            self.run(self.close())
+            self._loop_thread.stop()
+            self._loop_thread = None
+
+    async def get_subscriber_with_history(self, ric: str, fields: Optional[List[str]] = HISTORY_FIELDS
+                                          ) -> Tuple[Optional[Subscriber], List[Dict[str, Any]]]:
+        results = await gather(
+            subscriber=self.pg.get_subscriber(ric),
+            history=self.mongo.get_requests_by_ric(ric, fields=fields),
+        )
+        return results["subscriber"], results["history"]
+
+    async def get_subscriber_profiles(self, rics: List[str], as_of: Optional[date] = None
+                                      ) -> Dict[str, Optional[SubscriberProfile]]:
+        # два запити на будь-яку кількість RIC: ric = ANY(...) у Postgres і $in у Mongo
+        rics = list(dict.fromkeys(rics))
+        results = await gather(
+            subscribers=self.pg.get_subscribers(rics),
+            history=self.mongo.get_requests_by_rics(rics, fields=HISTORY_FIELDS),
+        )
+        return build_profiles(rics, results["subscribers"], results["history"], as_of)
+
+    async def get_subscriber_profile(self, ric: str, as_of: Optional[date] = None) -> Optional[SubscriberProfile]:
+        return (await self.get_subscriber_profiles([ric], as_of))[ric]
@@ -0,0 +1,166 @@
+import logging
+import os
+from pymongo import AsyncMongoClient, ASCENDING, DESCENDING, UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from datetime import datetime
+from .models import ServiceRequest
+from .mongo_db import MongoManager, REQUEST_INDEXES
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# курсори сторінок, проєкції та розбір id спільні з синхронним MongoManager
+_projection = MongoManager._projection
+_to_dicts = MongoManager._to_dicts
+_parse_ids = MongoManager._parse_ids
+
+
+class AsyncMongoManager:
+    def __init__(self):
+        uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+        self.client = AsyncMongoClient(uri)
+        self.db = self.client["mobile_operator_coursework"]
+        self.collection = self.db["service_requests"]
+        self.batch_size = 1000
+
+    async def ensure_indexes(self) -> List[str]:
+        return await self.collection.create_indexes(REQUEST_INDEXES)
+
+    async def create_request(self, req: ServiceRequest) -> str:
+        result = await self.collection.insert_one(req.model_dump())
+        return str(result.inserted_id)
+
+    async def create_requests(self, requests: Iterable[ServiceRequest]) -> List[Optional[str]]:
+        docs = [req.model_dump() for req in requests]
+        ids: List[Optional[str]] = []
+        for start in range(0, len(docs), self.batch_size):
+            batch = docs[start:start + self.batch_size]
+            failed = set()
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                logger.error("Error creating requests: %s of %s failed", len(failed), len(batch))
+            ids.extend(None if i in failed else str(doc["_id"]) for i, doc in enumerate(batch))
+        return ids
+
+    async def get_all_requests(self, only_open: bool = True,
+                               fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        filter_query = {"status": "open"} if only_open else {}
+        cursor = self.collection.find(filter_query, _projection(fields)).sort("created_at", -1)
+        return _to_dicts(await cursor.to_list())
+
+    async def get_requests_by_ric(self, ric: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        cursor = self.collection.find({"ric": ric}, _projection(fields)).sort("created_at", -1)
+        return _to_dicts(await cursor.to_list())
+
+    async def get_requests_by_rics(self, rics: List[str],
+                                   fields: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        if not rics:
+            return {}
+        filter_query, projection = MongoManager._rics_query(rics, fields)
+        cursor = self.collection.find(filter_query, projection).sort([("ric", ASCENDING), ("created_at", DESCENDING)])
+        return MongoManager._group_by_ric(rics, await cursor.to_list())
+
+    async def get_open_requests_page(self, after: Optional[str] = None, limit: int = 20,
+                                     fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        filter_query: Dict[str, Any] = {"status": "open"}
+        if after:
+            created_at, oid = MongoManager._decode_page_cursor(after)
+            filter_query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": oid}},
+            ]
+
+        cursor = (
+            self.collection.find(filter_query, _projection(fields))
+            .sort([("created_at", DESCENDING), ("_id", DESCENDING)])
+            .limit(limit + 1)
+        )
+        docs = await cursor.to_list()
+
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = MongoManager._encode_page_cursor(docs[-1]["created_at"], docs[-1]["_id"])
+
+        return _to_dicts(docs), next_cursor
+
+    async def count_open_requests(self) -> int:
+        return await self.collection.count_documents({"status": "open"})
+
+    async def close_request(self, request_id: str) -> bool:
+        try:
+            await self.collection.update_one(
+                {"_id": ObjectId(request_id)},
+                {"$set": {"status": "closed", "closed_at": datetime.now()}}
+            )
+            return True
+        except Exception as e:
+            logger.error("Error closing request: %s", e)
+            return False
+
+    async def delete_request(self, request_id: str) -> bool:
+        try:
+            await self.collection.delete_one({"_id": ObjectId(request_id)})
+            return True
+        except Exception as e:
+            logger.error("Error deleting request: %s", e)
+            return False
+
+    async def _bulk_write(self, operations: List[Any]) -> set:
+        failed = set()
+        for start in range(0, len(operations), self.batch_size):
+            batch = operations[start:start + self.batch_size]
+            try:
+                await self.collection.bulk_write(batch, ordered=False)
+            except BulkWriteError as e:
+                failed.update(start + error["index"] for error in e.details.get("writeErrors", []))
+        return failed
+
+    async def _existing_ids(self, oids: List[ObjectId], extra_filter: Optional[Dict[str, Any]] = None) -> set:
+        found = set()
+        for start in range(0, len(oids), self.batch_size):
+            query = {"_id": {"$in": oids[start:start + self.batch_size]}, **(extra_filter or {})}
+            async for doc in self.collection.find(query, {"_id": 1}):
+                found.add(doc["_id"])
+        return found
+
+    async def close_requests(self, request_ids: Iterable[str]) -> Dict[str, bool]:
+        results, oids = _parse_ids(request_ids)
+        if not oids:
+            return results
+
+        closed_at = datetime.now()
+        id_list = list(oids.values())
+        failed = await self._bulk_write([
+            UpdateOne({"_id": oid, "status": "open"}, {"$set": {"status": "closed", "closed_at": closed_at}})
+            for oid in id_list
+        ])
+        closed = await self._existing_ids(
+            [oid for i, oid in enumerate(id_list) if i not in failed],
+            {"status": "closed", "closed_at": closed_at},
+        )
+        for request_id, oid in oids.items():
+            results[request_id] = oid in closed
+        return results
+
+    async def delete_requests(self, request_ids: Iterable[str]) -> Dict[str, bool]:
+        results, oids = _parse_ids(request_ids)
+        if not oids:
+            return results
+
+        found = await self._existing_ids(list(oids.values()))
+        existing = [oid for oid in oids.values() if oid in found]
+        failed = await self._bulk_write([DeleteOne({"_id": oid}) for oid in existing])
+        deleted = {oid for i, oid in enumerate(existing) if i not in failed}
+        for request_id, oid in oids.items():
+            results[request_id] = oid in deleted
+        return results
+
+    async def close(self):
+        await self.client.close()
@@ -0,0 +1,306 @@
+import asyncio
+import logging
+import os
+import inspect
+import asyncpg
+import pandas as pd
+from datetime import date
+from dotenv import load_dotenv
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from .models import Subscriber, DebtorReport
+from .debt import debt_sql
+from .postgres_db import (
+    SUBSCRIBER_COLUMNS, SUBSCRIBER_FRAME_COLUMNS, TARIFF_ANALYTICS_QUERY,
+    TARIFF_REVENUE_HISTORY_QUERY, DEBTORS_REPORT_ORDER, SubscriberChange, column_arrays,
+    update_columns, update_subscriber_sql
+)
+from .result_cache import ColumnArrays, ColumnsResultCache
+from .subscriber_cache import SubscriberCache
+from .search import SEARCH_MIN_LENGTH, asyncpg_search_query, search_params
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# asyncpg використовує позиційні параметри $1, $2, ... замість %s
+GET_SUBSCRIBER_QUERY = "SELECT * FROM subscribers WHERE ric = $1"
+
+DEBTORS_CTE = f"""
+    WITH debtors AS (
+        SELECT ric, full_name, monthly_fee::float8 AS monthly_fee, last_payment_date,
+            {debt_sql("$1")}
+        FROM subscribers
+        WHERE last_payment_date < $1::date - INTERVAL '1 month'
+        AND is_active = TRUE
+    )
+"""
+
+
+class AsyncPostgresManager:
+    # схему й міграції веде синхронний PostgresManager, тут лише робота з даними
+    def __init__(self, min_connections: Optional[int] = None, max_connections: Optional[int] = None):
+        self.min_connections = min_connections or int(os.getenv("PG_POOL_MIN", 1))
+        self.max_connections = max_connections or int(os.getenv("PG_POOL_MAX", 10))
+        self.pool: Optional[asyncpg.Pool] = None
+        self._change_listeners: List[Callable] = []
+        self.subscriber_cache: Optional[SubscriberCache] = None
+        self.columns_cache: Optional[ColumnsResultCache] = None
+        self.trigram_search = False
+
+    async def connect(self):
+        if self.pool is None:
+            self.pool = await asyncpg.create_pool(
+                min_size=self.min_connections,
+                max_size=self.max_connections,
+                timeout=float(os.getenv("PG_POOL_TIMEOUT", 30)),
+                database=os.getenv("PG_DB"),
+                user=os.getenv("PG_USER"),
+                password=os.getenv("PG_PASSWORD"),
+                host=os.getenv("PG_HOST"),
+                port=os.getenv("PG_PORT")
+            )
+            async with self.connection() as conn:
+                self.trigram_search = bool(
+                    await conn.fetchval("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                )
+        return self
+
+    def connection(self):
+        return self.pool.acquire()
+
+    def pool_stats(self) -> Dict[str, int]:
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+        return {"min_size": self.min_connections, "max_size": self.max_connections,
+                "size": size, "idle": idle, "in_use": size - idle}
+
+    def add_change_listener(self, callback: Callable):
+        # підписник може бути звичайною функцією або корутиною
+        self._change_listeners.append(callback)
+
+    def enable_subscriber_cache(self, cache: SubscriberCache):
+        # той самий кеш, що й у синхронного менеджера: записи з будь-якого боку його інвалідують
+        self.subscriber_cache = cache
+        self.add_change_listener(cache.apply_subscriber_changes)
+
+    def enable_columns_cache(self, cache: ColumnsResultCache):
+        # спільний з синхронним менеджером кеш: записи будь-якого шару піднімають версію таблиці
+        self.columns_cache = cache
+        self.add_change_listener(cache.apply_subscriber_changes)
+
+    async def _publish_changes(self, changes: List[SubscriberChange]):
+        if not changes:
+            return
+        for callback in self._change_listeners:
+            try:
+                result = callback(changes)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error("Error publishing subscriber changes: %s", e)
+
+    async def _fetch_frame(self, query: str, *args) -> pd.DataFrame:
+        async with self.connection() as conn:
+            statement = await conn.prepare(query)
+            rows = await statement.fetch(*args)
+            columns = [attr.name for attr in statement.get_attributes()]
+        return pd.DataFrame.from_records([tuple(row) for row in rows], columns=columns)
+
+    async def add_subscriber(self, subscriber: Subscriber):
+        columns = ", ".join(SUBSCRIBER_COLUMNS)
+        placeholders = ", ".join(f"${i}" for i in range(1, len(SUBSCRIBER_COLUMNS) + 1))
+        query = f"""
+            INSERT INTO subscribers({columns})
+            VALUES ({placeholders})
+            ON CONFLICT (ric) DO NOTHING
+            RETURNING *;
+        """
+        values = [getattr(subscriber, column) for column in SUBSCRIBER_COLUMNS]
+
+        async with self.connection() as conn:
+            row = await conn.fetchrow(query, *values)
+
+        if row:
+            await self._publish_changes([(row["ric"], dict(row))])
+
+    async def get_subscriber(self, ric: str) -> Optional[Subscriber]:
+        if self.subscriber_cache is None:
+            return await self._load_subscriber(ric)
+        # кеш синхронний (локальний шар і Redis), тож звертаємось до нього поза циклом подій
+        found, subscriber = await asyncio.to_thread(self.subscriber_cache.lookup, ric)
+        if found:
+            return subscriber
+        token = await asyncio.to_thread(self.subscriber_cache.reserve, ric)
+        subscriber = await self._load_subscriber(ric)
+        await asyncio.to_thread(self.subscriber_cache.store, ric, subscriber, token)
+        return subscriber
+
+    async def _load_subscriber(self, ric: str) -> Optional[Subscriber]:
+        async with self.connection() as conn:
+            row = await conn.fetchrow(GET_SUBSCRIBER_QUERY, ric)
+        return Subscriber(**row) if row else None
+
+    async def get_subscribers(self, rics: List[str]) -> List[Subscriber]:
+        if not rics:
+            return []
+        async with self.connection() as conn:
+            rows = await conn.fetch("SELECT * FROM subscribers WHERE ric = ANY($1::text[]) ORDER BY ric", list(rics))
+        return [Subscriber(**row) for row in rows]
+
+    async def get_all_subscribers(self) -> List[Subscriber]:
+        return [subscriber async for subscriber in self.iter_subscribers()]
+
+    async def iter_subscribers(self, itersize: int = 2000) -> AsyncIterator[Subscriber]:
+        async with self.connection() as conn, conn.transaction():
+            # серверний курсор asyncpg підтягує рядки пачками по prefetch
+            async for row in conn.cursor("SELECT * FROM subscribers", prefetch=itersize):
+                yield Subscriber(**row)
+
+    async def get_subscribers_page(self, after_ric: Optional[str] = None, limit: int = 50) -> List[Subscriber]:
+        async with self.connection() as conn:
+            if after_ric is None:
+                rows = await conn.fetch("SELECT * FROM subscribers ORDER BY ric LIMIT $1", limit)
+            else:
+                rows = await conn.fetch(
+                    "SELECT * FROM subscribers WHERE ric > $1 ORDER BY ric LIMIT $2", after_ric, limit
+                )
+        return [Subscriber(**row) for row in rows]
+
+    async def get_subscribers_frame(self, after_ric: Optional[str] = None,
+                                    limit: Optional[int] = None) -> pd.DataFrame:
+        query = f"SELECT {SUBSCRIBER_FRAME_COLUMNS} FROM subscribers"
+        params = []
+        if after_ric is not None:
+            params.append(after_ric)
+            query += f" WHERE ric > ${len(params)}"
+        query += " ORDER BY ric"
+        if limit is not None:
+            params.append(limit)
+            query += f" LIMIT ${len(params)}"
+
+        return await self._fetch_frame(query, *params)
+
+    async def search_subscribers(self, query: str, limit: int = 20, min_score: float = 0.4) -> pd.DataFrame:
+        if len(query.strip()) < SEARCH_MIN_LENGTH:
+            return pd.DataFrame()
+        sql, names = asyncpg_search_query(SUBSCRIBER_FRAME_COLUMNS, self.trigram_search)
+        params = search_params(query, limit, min_score)
+        return await self._fetch_frame(sql, *(params[name] for name in names))
+
+    async def delete_subscriber(self, ric: str):
+        async with self.connection() as conn:
+            deleted = await conn.fetchval("DELETE FROM subscribers WHERE ric = $1 RETURNING ric", ric)
+
+        if deleted:
+            await self._publish_changes([(ric, None)])
+
+    async def deactivate_subscriber(self, ric: str):
+        async with self.connection() as conn:
+            row = await conn.fetchrow("UPDATE subscribers SET is_active = FALSE WHERE ric = $1 RETURNING *", ric)
+
+        if row:
+            await self._publish_changes([(ric, dict(row))])
+
+    async def update_subscriber(self, ric: str, updates: dict):
+        # той самий набір колонок у будь-якому порядку дає той самий текст і один запис кешу asyncpg
+        columns = update_columns(updates)
+        if not columns:
+            return
+
+        query = update_subscriber_sql(columns)
+        values = [updates[col] for col in columns]
+
+        try:
+            async with self.connection() as conn:
+                row = await conn.fetchrow(query, *values, ric)
+        except Exception as e:
+            logger.error("Error: %s", e)
+            return
+
+        if row:
+            await self._publish_changes([(ric, dict(row))])
+
+    async def get_debtors_raw(self) -> List[DebtorReport]:
+        query = f"{DEBTORS_CTE} SELECT ric, full_name, last_payment_date, monthly_fee FROM debtors"
+        async with self.connection() as conn:
+            rows = await conn.fetch(query, date.today())
+        return [DebtorReport(**row) for row in rows]
+
+    async def get_debt_candidates_frame(self) -> pd.DataFrame:
+        query = """
+            SELECT ric, full_name, monthly_fee::float8 AS monthly_fee, last_payment_date
+            FROM subscribers
+            WHERE is_active = TRUE AND last_payment_date IS NOT NULL
+        """
+        return await self._fetch_frame(query)
+
+    async def get_debtors_frame(self, as_of: Optional[date] = None) -> pd.DataFrame:
+        return await self._fetch_frame(f"{DEBTORS_CTE} SELECT * FROM debtors", as_of or date.today())
+
+    async def get_debtors_report(self, order_by: str = "debt_amount", descending: bool = True,
+                                 min_debt: float = 0.0, limit: Optional[int] = None, offset: int = 0,
+                                 as_of: Optional[date] = None) -> pd.DataFrame:
+        if order_by not in DEBTORS_REPORT_ORDER:
+            raise ValueError(f"Unknown order column: {order_by}")
+
+        direction = "DESC" if descending else "ASC"
+        query = f"""
+            {DEBTORS_CTE}
+            SELECT * FROM debtors
+            WHERE debt_amount >= $2
+            ORDER BY {order_by} {direction}, ric
+            LIMIT $3 OFFSET $4
+        """
+        return await self._fetch_frame(query, as_of or date.today(), min_debt, limit, offset)
+
+    async def get_debtors_totals(self, min_debt: float = 0.0, as_of: Optional[date] = None) -> Dict[str, float]:
+        query = f"""
+            {DEBTORS_CTE}
+            SELECT
+                COUNT(*) AS debtors_count,
+                COALESCE(SUM(debt_amount), 0)::float8 AS total_debt,
+                COALESCE(AVG(debt_amount), 0)::float8 AS avg_debt,
+                COALESCE(MAX(days_overdue), 0) AS max_days_overdue
+            FROM debtors
+            WHERE debt_amount >= $2
+        """
+        async with self.connection() as conn:
+            return dict(await conn.fetchrow(query, as_of or date.today(), min_debt))
+
+    async def get_custom_columns(self, columns: List[str]) -> ColumnArrays:
+        requested = set(columns)
+        safe_columns = tuple(col for col in SUBSCRIBER_COLUMNS if col in requested)
+        if not safe_columns:
+            return {}
+
+        if self.columns_cache is None:
+            return await self._load_columns(safe_columns)
+        # версія таблиці читається з Redis синхронним клієнтом, тож поза циклом подій
+        version, cached = await asyncio.to_thread(self.columns_cache.lookup, safe_columns)
+        if cached is not None:
+            return cached
+        arrays = await self._load_columns(safe_columns)
+        self.columns_cache.store(safe_columns, version, arrays)
+        return arrays
+
+    async def _load_columns(self, columns: Tuple[str, ...]) -> ColumnArrays:
+        select = ", ".join(f'"{col}"::float8 AS "{col}"' if col == "monthly_fee" else f'"{col}"'
+                           for col in columns)
+        async with self.connection() as conn:
+            rows = await conn.fetch(f"SELECT {select} FROM subscribers")
+        return column_arrays(columns, [tuple(row) for row in rows])
+
+    async def get_tariff_analytics(self):
+        async with self.connection() as conn:
+            return [dict(row) for row in await conn.fetch(TARIFF_ANALYTICS_QUERY)]
+
+    async def get_tariff_analytics_frame(self) -> pd.DataFrame:
+        return await self._fetch_frame(TARIFF_ANALYTICS_QUERY)
+
+    async def get_tariff_revenue_history(self) -> pd.DataFrame:
+        return await self._fetch_frame(TARIFF_REVENUE_HISTORY_QUERY)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
@@ -0,0 +1,76 @@
+import logging
+import pandas as pd
+import redis.asyncio as aioredis
+from datetime import date
+from typing import List, Optional, Tuple
+from .models import DebtorReport
+from .debt import add_debt_columns, debt_cutoff
+from .redis_db import DebtorsCacheLayout
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRedisManager(DebtorsCacheLayout):
+    def __init__(self, codec: Optional[str] = None):
+        super().__init__(codec)
+        params = self._connection_params()
+
+        self.r = aioredis.Redis(**params, decode_responses=True)
+        self.r_raw = aioredis.Redis(**params)
+
+    async def apply_subscriber_changes(self, changes: List[Tuple[str, Optional[dict]]]):
+        building = await self.r.get(self.build_key)
+
+        async with self.r.pipeline(transaction=False) as pipe:
+            for ric, row in changes:
+                entry = self._change_entry(row)
+                self._apply_entry(pipe, self.entries_key, self.index_key, ric, entry)
+                if building:
+                    pipe.rpush(f"{self.build_key}:{building}", self._journal_entry(ric, entry))
+            if building:
+                pipe.expire(f"{self.build_key}:{building}", self.lock_lease_seconds)
+            await pipe.execute()
+
+    async def is_debtors_cache_ready(self) -> bool:
+        return bool(await self.r.exists(self.ready_key))
+
+    async def get_cached_debtors_frame_if_ready(self, as_of: Optional[date] = None) -> Optional[pd.DataFrame]:
+        # перебудову кешу виконує синхронний RedisManager; тут лише швидкий шлях читання
+        if not await self.is_debtors_cache_ready():
+            return None
+        return await self.get_cached_debtors_frame(as_of)
+
+    async def _load_debtor_entries(self, as_of: Optional[date] = None) -> pd.DataFrame:
+        cutoff = debt_cutoff(as_of)
+        rics = await self.r.zrangebyscore(self.index_key, "-inf", f"({cutoff.toordinal()}")
+
+        client = self.r_raw if self.codec.binary else self.r
+        raw_data = []
+        for i in range(0, len(rics), self.batch_size):
+            raw_data.extend(await client.hmget(self.entries_key, rics[i:i + self.batch_size]))
+        return self.codec.decode_frame(item for item in raw_data if item is not None)
+
+    async def get_cached_debtors_frame(self, as_of: Optional[date] = None) -> pd.DataFrame:
+        df = await self._load_debtor_entries(as_of)
+        if df.empty:
+            return pd.DataFrame()
+        return add_debt_columns(df, as_of)
+
+    async def get_cached_debtors(self, as_of: Optional[date] = None) -> List[DebtorReport]:
+        debtors_list = []
+        for data_dict in (await self._load_debtor_entries(as_of)).to_dict("records"):
+            try:
+                debtors_list.append(DebtorReport(**data_dict))
+            except Exception as e:
+                logger.error("Error: %s", e)
+        return debtors_list
+
+    async def invalidate_debtors_cache(self):
+        await self.r.delete(self.ready_key)
+
+    async def clear_cache(self):
+        await self.r.delete(self.entries_key, self.index_key, self.ready_key)
+
+    async def close(self):
+        await self.r.aclose()
+        await self.r_raw.aclose()
@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import redis
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SubscriberChange = Tuple[str, Optional[dict]]
+
+# у подію потрапляють лише колонки, з яких будуються похідні представлення
+CHANGE_COLUMNS = ("full_name", "monthly_fee", "is_active", "last_payment_date")
+
+OP_UPSERT = "u"
+OP_DELETE = "d"
+OP_RESET = "t"
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Unsupported change value: {type(value).__name__}")
+
+
+def encode_change(ric: str, row: Optional[dict]) -> Dict[str, str]:
+    if row is None:
+        return {"op": OP_DELETE, "ric": ric}
+    compact = {column: row.get(column) for column in CHANGE_COLUMNS}
+    return {"op": OP_UPSERT, "ric": ric,
+            "row": json.dumps(compact, default=_json_default, ensure_ascii=False, separators=(",", ":"))}
+
+
+def coalesce_events(events: List[Dict[str, str]]) -> Tuple[bool, List[SubscriberChange]]:
+    # у пачці лишається останній стан кожного RIC; очищення таблиці відкидає все, що було до нього
+    reset = False
+    latest: Dict[str, Optional[dict]] = {}
+    for fields in events:
+        op = fields["op"]
+        if op == OP_RESET:
+            reset = True
+            latest.clear()
+            continue
+        ric = fields["ric"]
+        latest.pop(ric, None)
+        latest[ric] = json.loads(fields["row"]) if op == OP_UPSERT else None
+    return reset, list(latest.items())
+
+
+class ChangeStreamLayout:
+    # ключ потоку й група споживачів, спільні для синхронного та async видавців
+    def __init__(self, stream_key: Optional[str] = None, group: str = "derived-views",
+                 maxlen: Optional[int] = None):
+        self.stream_key = stream_key or os.getenv("CHANGE_STREAM_KEY", "subscribers:changes")
+        self.group = group
+        # потік обрізається приблизно (~), щоб XADD не перебирав вузли на кожному записі
+        self.maxlen = maxlen or int(os.getenv("CHANGE_STREAM_MAXLEN", 100000))
+
+
+class ChangeStreamPublisher(ChangeStreamLayout):
+    def __init__(self, redis_client, **kwargs):
+        super().__init__(**kwargs)
+        self.r = redis_client
+
+    def publish(self, changes: List[SubscriberChange]):
+        pipe = self.r.pipeline(transaction=False)
+        for ric, row in changes:
+            pipe.xadd(self.stream_key, encode_change(ric, row), maxlen=self.maxlen, approximate=True)
+        pipe.execute()
+
+    def publish_reset(self):
+        self.r.xadd(self.stream_key, {"op": OP_RESET}, maxlen=self.maxlen, approximate=True)
+
+
+class AsyncChangeStreamPublisher(ChangeStreamLayout):
+    def __init__(self, redis_client, **kwargs):
+        super().__init__(**kwargs)
+        self.r = redis_client
+
+    async def publish(self, changes: List[SubscriberChange]):
+        async with self.r.pipeline(transaction=False) as pipe:
+            for ric, row in changes:
+                pipe.xadd(self.stream_key, encode_change(ric, row), maxlen=self.maxlen, approximate=True)
+            await pipe.execute()
+
+    async def publish_reset(self):
+        await self.r.xadd(self.stream_key, {"op": OP_RESET}, maxlen=self.maxlen, approximate=True)
+
+
+class ChangeStreamConsumer(ChangeStreamLayout):
+    def __init__(self, redis_client, consumer: Optional[str] = None, batch_size: int = 500,
+                 block_ms: int = 1000, claim_idle_ms: int = 60000, max_attempts: int = 5, **kwargs):
+        super().__init__(**kwargs)
+        self.r = redis_client
+        # кілька процесів застосунку ділять одну групу: кожна подія застосовується один раз
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.max_attempts = max_attempts
+
+        self._listeners: List[Tuple[Callable[[List[SubscriberChange]], None], Optional[Callable[[], None]]]] = []
+        self._group_ready = False
+        # після перезапуску чи збою обробника спершу дочитуємо власні непідтверджені події
+        self._backlog = True
+        self._attempts = 0
+        self._next_claim = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._counters = {"events": 0, "batches": 0, "changes": 0, "resets": 0, "errors": 0, "dropped": 0}
+        self._lag_ms = 0.0
+        self._max_lag_ms = 0.0
+
+    def add_change_listener(self, callback: Callable[[List[SubscriberChange]], None],
+                            on_reset: Optional[Callable[[], None]] = None):
+        self._listeners.append((callback, on_reset))
+
+    def ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            # нова група читає потік з початку: події, видані до її появи, теж застосуються
+            self.r.xgroup_create(self.stream_key, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    def _claim_abandoned(self):
+        # події, які взяв і не підтвердив споживач, що впав, переходять до нас
+        if time.monotonic() < self._next_claim:
+            return
+        self._next_claim = time.monotonic() + self.claim_idle_ms / 1000
+        _, claimed, *_ = self.r.xautoclaim(self.stream_key, self.group, self.consumer,
+                                           min_idle_time=self.claim_idle_ms, start_id="0-0",
+                                           count=self.batch_size)
+        if claimed:
+            self._backlog = True
+
+    def _read(self, block_ms: Optional[int]):
+        if self._backlog:
+            response = self.r.xreadgroup(self.group, self.consumer, {self.stream_key: "0"}, count=self.batch_size)
+            entries = response[0][1] if response else []
+            if entries:
+                return entries
+            self._backlog = False
+
+        response = self.r.xreadgroup(self.group, self.consumer, {self.stream_key: ">"},
+                                     count=self.batch_size, block=block_ms)
+        return response[0][1] if response else []
+
+    def _notify(self, reset: bool, changes: List[SubscriberChange]):
+        for callback, on_reset in self._listeners:
+            if reset and on_reset is not None:
+                on_reset()
+            if changes:
+                callback(changes)
+
+    def _reset_listeners(self):
+        for _, on_reset in self._listeners:
+            if on_reset is None:
+                continue
+            try:
+                on_reset()
+            except Exception as e:
+                logger.error("Error resetting derived view: %s", e)
+
+    def poll(self, block_ms: Optional[int] = None) -> int:
+        # одна пачка: прочитати, згорнути, застосувати, підтвердити; повертає кількість подій
+        self.ensure_group()
+        self._claim_abandoned()
+        entries = self._read(self.block_ms if block_ms is None else block_ms)
+        if not entries:
+            return 0
+
+        ids = [entry_id for entry_id, _ in entries]
+        # після видалення за MAXLEN непідтверджена подія приходить без полів
+        events = [fields for _, fields in entries if fields]
+        reset, changes = coalesce_events(events)
+        try:
+            self._notify(reset, changes)
+        except Exception as e:
+            self._attempts += 1
+            self._backlog = True
+            with self._lock:
+                self._counters["errors"] += 1
+            if self._attempts < self.max_attempts:
+                logger.error("Error applying change events (attempt %s): %s", self._attempts, e)
+                return 0
+            # пачка так і не застосувалась: скидаємо похідні дані, щоб вони перебудувались з Postgres
+            logger.error("Error applying change events, dropping %s events: %s", len(ids), e)
+            self._reset_listeners()
+            with self._lock:
+                self._counters["dropped"] += len(ids)
+
+        self._attempts = 0
+        self.r.xack(self.stream_key, self.group, *ids)
+        lag_ms = max(0.0, time.time() * 1000 - int(ids[-1].split("-")[0]))
+        with self._lock:
+            self._counters["events"] += len(ids)
+            self._counters["batches"] += 1
+            self._counters["changes"] += len(changes)
+            self._counters["resets"] += int(reset)
+            self._lag_ms = lag_ms
+            self._max_lag_ms = max(self._max_lag_ms, lag_ms)
+        return len(ids)
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except redis.RedisError as e:
+                logger.error("Error reading change stream: %s", e)
+                self._stop.wait(1.0)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="change-stream-consumer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout if timeout is not None else self.block_ms / 1000 + 1)
+            self._thread = None
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["lag_ms"] = round(self._lag_ms, 1)
+            stats["max_lag_ms"] = round(self._max_lag_ms, 1)
+        try:
+            stats["pending"] = self.r.xpending(self.stream_key, self.group)["pending"]
+        except redis.RedisError:
+            pass
+        return stats
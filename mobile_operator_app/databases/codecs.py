@@ -0,0 +1,103 @@
+import json
+import struct
+import numpy as np
+import pandas as pd
+from datetime import date
+from typing import Iterable, List
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DEBTOR_COLUMNS = ["ric", "full_name", "monthly_fee", "last_payment_date"]
+
+# datetime64[D] рахує дні від 1970-01-01, а date.toordinal() — від 0001-01-01
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _debtors_frame(rics: List[str], names: List[str], fees_cents, ordinals) -> pd.DataFrame:
+    # тариф зберігається в копійках, дата — як порядковий номер дня
+    days = np.asarray(ordinals, dtype=np.int64) - EPOCH_ORDINAL
+    return pd.DataFrame({
+        "ric": rics,
+        "full_name": names,
+        "monthly_fee": np.asarray(fees_cents, dtype=np.int64) / 100,
+        "last_payment_date": days.astype("datetime64[D]").astype(object),
+    }, columns=DEBTOR_COLUMNS)
+
+
+class JsonCodec:
+    name = "json"
+    binary = False
+
+    def encode(self, ric: str, full_name: str, monthly_fee: float, last_payment_date: date) -> str:
+        return json.dumps([ric, full_name, round(monthly_fee * 100), last_payment_date.toordinal()],
+                          ensure_ascii=False)
+
+    def decode_frame(self, values: Iterable) -> pd.DataFrame:
+        rows = [json.loads(value) for value in values]
+        if not rows:
+            return pd.DataFrame(columns=DEBTOR_COLUMNS)
+        rics, names, fees, ordinals = zip(*rows)
+        return _debtors_frame(list(rics), list(names), fees, ordinals)
+
+
+class StructCodec:
+    name = "struct"
+    binary = True
+
+    # копійки (int64), день (uint32), довжини RIC і ПІБ у байтах (uint16), далі самі рядки
+    header = struct.Struct("<qIHH")
+
+    def encode(self, ric: str, full_name: str, monthly_fee: float, last_payment_date: date) -> bytes:
+        ric_bytes = ric.encode("utf-8")
+        name_bytes = full_name.encode("utf-8")
+        return self.header.pack(
+            round(monthly_fee * 100), last_payment_date.toordinal(), len(ric_bytes), len(name_bytes)
+        ) + ric_bytes + name_bytes
+
+    def decode_frame(self, values: Iterable) -> pd.DataFrame:
+        unpack = self.header.unpack_from
+        size = self.header.size
+        rics, names, fees, ordinals = [], [], [], []
+        for value in values:
+            cents, ordinal, ric_len, name_len = unpack(value)
+            rics.append(value[size:size + ric_len].decode("utf-8"))
+            names.append(value[size + ric_len:size + ric_len + name_len].decode("utf-8"))
+            fees.append(cents)
+            ordinals.append(ordinal)
+        return _debtors_frame(rics, names, fees, ordinals)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    binary = True
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("MsgpackCodec requires the 'msgpack' package: pip install msgpack")
+
+    def encode(self, ric: str, full_name: str, monthly_fee: float, last_payment_date: date) -> bytes:
+        return msgpack.packb([ric, full_name, round(monthly_fee * 100), last_payment_date.toordinal()])
+
+    def decode_frame(self, values: Iterable) -> pd.DataFrame:
+        unpackb = msgpack.unpackb
+        rows = [unpackb(value) for value in values]
+        if not rows:
+            return pd.DataFrame(columns=DEBTOR_COLUMNS)
+        rics, names, fees, ordinals = zip(*rows)
+        return _debtors_frame(list(rics), list(names), fees, ordinals)
+
+
+CODECS = {
+    JsonCodec.name: JsonCodec,
+    StructCodec.name: StructCodec,
+    MsgpackCodec.name: MsgpackCodec,
+}
+
+
+def get_codec(name: str):
+    if name not in CODECS:
+        raise ValueError(f"Unknown debtors cache codec: {name}")
+    return CODECS[name]()
@@ -0,0 +1,74 @@
+import calendar
+import numpy as np
+import pandas as pd
+from datetime import date
+from typing import NamedTuple, Optional
+
+DAYS_PER_MONTH = 30
+
+
+class DebtColumns(NamedTuple):
+    days_overdue: np.ndarray
+    months_overdue: np.ndarray
+    debt_amount: np.ndarray
+
+
+def debt_cutoff(as_of: Optional[date] = None) -> date:
+    # те саме, що CURRENT_DATE - INTERVAL '1 month' у Postgres: 31 березня -> 29 лютого
+    as_of = as_of or date.today()
+    year, month = (as_of.year, as_of.month - 1) if as_of.month > 1 else (as_of.year - 1, 12)
+    day = min(as_of.day, calendar.monthrange(year, month)[1])
+    return date(year, month, day)
+
+
+def _round_money(values: np.ndarray) -> np.ndarray:
+    # np.round множить на 100 і може розійтися з round() на значеннях
+    # близьких до половини копійки, тому такі рідкісні випадки рахуємо як DebtorReport
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_half):
+        rounded[i] = round(float(values[i]), 2)
+    return rounded
+
+
+def compute_debt(last_payment_dates, monthly_fees, as_of: Optional[date] = None) -> DebtColumns:
+    as_of = as_of or date.today()
+
+    payment_dates = pd.to_datetime(pd.Series(last_payment_dates, dtype=object)).to_numpy(dtype="datetime64[D]")
+    fees = np.asarray(monthly_fees, dtype=np.float64)
+
+    missing = np.isnat(payment_dates)
+    days = (np.datetime64(as_of, "D") - payment_dates).astype("int64")
+    days[missing] = 0
+
+    overdue = days > 0
+    # ціле ділення з округленням вгору == math.ceil(days / 30) для додатних днів
+    months = np.where(overdue, (days + DAYS_PER_MONTH - 1) // DAYS_PER_MONTH, 0)
+    debt = np.where(overdue, _round_money(months * fees), 0.0)
+
+    return DebtColumns(days, months, debt)
+
+
+def add_debt_columns(df: pd.DataFrame, as_of: Optional[date] = None) -> pd.DataFrame:
+    columns = compute_debt(df["last_payment_date"], df["monthly_fee"], as_of)
+
+    df["days_overdue"] = columns.days_overdue
+    df["months_overdue"] = columns.months_overdue
+    df["debt_amount"] = columns.debt_amount
+    return df
+
+
+def debt_sql(as_of_param: str = "%(as_of)s", date_column: str = "last_payment_date",
+             fee_column: str = "monthly_fee") -> str:
+    # monthly_fee зберігається як DECIMAL(10, 2), тому добуток місяців на тариф
+    # уже точний до копійки і ROUND у Postgres збігається з round() у Python
+    days = f"COALESCE({as_of_param}::date - {date_column}, 0)"
+    months = f"CASE WHEN {days} > 0 THEN ({days} + {DAYS_PER_MONTH - 1}) / {DAYS_PER_MONTH} ELSE 0 END"
+    debt = f"CASE WHEN {days} > 0 THEN ROUND(({months}) * {fee_column}, 2) ELSE 0 END"
+
+    return f"""
+        {days} AS days_overdue,
+        {months} AS months_overdue,
+        ({debt})::float8 AS debt_amount
+    """
@@ -0,0 +1,59 @@
+import random
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator, Optional
+from .models import Subscriber, ServiceRequest
+
+MODELS = ["iPhone 13", "Samsung S21", "Xiaomi Redmi 9", "Nokia 3310", "Pixel 7"]
+NAMES = ["Шевченко", "Бойко", "Шпак", "Мельник", "Ткаченко"]
+SERVICES = ["Преміум", "Стандарт", "Економ", "Студент"]
+ISSUES = ["Ремонт", "Зв'язок", "Консультація"]
+
+
+def make_subscriber(rng: random.Random, ric: str, today: Optional[date] = None) -> Subscriber:
+    today = today or date.today()
+    return Subscriber(
+        ric=ric,
+        pin_code=str(rng.randint(1000, 9999)),
+        full_name=f"{rng.choice(NAMES)} {rng.choice(NAMES)[0]}.",
+        phone_model=rng.choice(MODELS),
+        phone_type="Смартфон",
+        service_type=rng.choice(SERVICES),
+        contract_start_date=today - timedelta(days=rng.randint(100, 1000)),
+        contract_duration_months=12,
+        monthly_fee=float(rng.choice([150, 250, 500])),
+        is_active=rng.choice([True, True, False]),
+        last_payment_date=today - timedelta(days=rng.randint(0, 60))
+    )
+
+
+def generate_subscribers(count: int, seed: Optional[int] = None, prefix: str = "RIC-GEN-",
+                         today: Optional[date] = None) -> Iterator[Subscriber]:
+    # послідовні RIC і фіксований seed дають однаковий набір даних між запусками
+    rng = random.Random(seed)
+    for i in range(count):
+        yield make_subscriber(rng, f"{prefix}{i:07d}", today)
+
+
+def make_request(rng: random.Random, ric: str, phone_model: str, now: Optional[datetime] = None) -> ServiceRequest:
+    now = now or datetime.now()
+    is_open = rng.random() < 0.3
+    created_at = now - timedelta(minutes=rng.randint(1, 60 * 24 * 365))
+    return ServiceRequest(
+        ric=ric,
+        phone_model=phone_model,
+        issue_description=f"[{rng.choice(ISSUES)}] Звернення абонента",
+        status="open" if is_open else "closed",
+        created_at=created_at,
+        closed_at=None if is_open else created_at + timedelta(hours=rng.randint(1, 72))
+    )
+
+
+def generate_requests(subscribers: Iterable[Subscriber], per_subscriber: float = 1.0,
+                      seed: Optional[int] = None, now: Optional[datetime] = None) -> Iterator[ServiceRequest]:
+    # per_subscriber — середня кількість заявок; дробова частина розігрується випадково
+    rng = random.Random(seed)
+    whole, fraction = int(per_subscriber), per_subscriber - int(per_subscriber)
+    for sub in subscribers:
+        count = whole + (1 if rng.random() < fraction else 0)
+        for _ in range(count):
+            yield make_request(rng, sub.ric, sub.phone_model, now)
@@ -0,0 +1,310 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+import pandas as pd
+import redis
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_FINISHED = (JOB_DONE, JOB_FAILED)
+
+REPORT_DEBTORS = "debtors_report"
+REPORT_TARIFFS = "tariff_report"
+
+# обробник отримує параметри та функцію прогресу і повертає назву таблиці -> таблиця
+Progress = Callable[[float, str], None]
+JobHandler = Callable[[Dict[str, Any], Progress], Dict[str, pd.DataFrame]]
+
+
+def job_fingerprint(kind: str, params: Dict[str, Any]) -> str:
+    payload = json.dumps([kind, params], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class JobQueue:
+    def __init__(self, redis_client, redis_raw, prefix: str = "jobs", result_ttl: int = 3600,
+                 lease_seconds: int = 600):
+        self.r = redis_client
+        # результати — parquet, тож читаються клієнтом без декодування відповідей
+        self.r_raw = redis_raw
+        self.prefix = prefix
+        self.queue_key = f"{prefix}:queue"
+        self.result_ttl = result_ttl
+        self.lease_seconds = lease_seconds
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    def _result_key(self, job_id: str) -> str:
+        return f"{self.prefix}:result:{job_id}"
+
+    def _dedup_key(self, fingerprint: str) -> str:
+        return f"{self.prefix}:dedup:{fingerprint}"
+
+    def submit(self, kind: str, params: Optional[Dict[str, Any]] = None) -> str:
+        params = params or {}
+        fingerprint = job_fingerprint(kind, params)
+        job_id = uuid.uuid4().hex[:12]
+
+        # однаковий звіт, що вже чекає в черзі чи виконується, вдруге не ставиться;
+        # ключ живе не довше оренди, тож завдання зниклого воркера не блокує нові
+        if not self.r.set(self._dedup_key(fingerprint), job_id, nx=True, ex=self.lease_seconds):
+            existing = self.r.get(self._dedup_key(fingerprint))
+            if existing:
+                return existing
+            return self.submit(kind, params)
+
+        pipe = self.r.pipeline(transaction=True)
+        pipe.hset(self._job_key(job_id), mapping={
+            "kind": kind,
+            "params": json.dumps(params, default=str, ensure_ascii=False),
+            "fingerprint": fingerprint,
+            "status": JOB_QUEUED,
+            "progress": 0.0,
+            "message": "",
+            "error": "",
+            "created_at": _now(),
+        })
+        pipe.expire(self._job_key(job_id), self.result_ttl)
+        pipe.rpush(self.queue_key, job_id)
+        pipe.execute()
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.r.hgetall(self._job_key(job_id))
+        if not job:
+            return None
+        job["id"] = job_id
+        job["params"] = json.loads(job.get("params") or "{}")
+        job["progress"] = float(job.get("progress") or 0.0)
+        return job
+
+    def result(self, job_id: str) -> Optional[Dict[str, pd.DataFrame]]:
+        stored = self.r_raw.hgetall(self._result_key(job_id))
+        if not stored:
+            return None
+        return {name.decode("utf-8"): pd.read_parquet(io.BytesIO(data)) for name, data in stored.items()}
+
+    def queue_length(self) -> int:
+        return self.r.llen(self.queue_key)
+
+    def _update(self, job_id: str, **fields):
+        self.r.hset(self._job_key(job_id), mapping=fields)
+
+    def _finish(self, job_id: str, **fields):
+        # результат зберігається result_ttl від завершення, а не від постановки в чергу
+        pipe = self.r.pipeline(transaction=True)
+        pipe.hset(self._job_key(job_id), mapping=dict(fields, finished_at=_now()))
+        pipe.expire(self._job_key(job_id), self.result_ttl)
+        pipe.execute()
+
+    def _store_result(self, job_id: str, frames: Dict[str, pd.DataFrame]):
+        pipe = self.r_raw.pipeline(transaction=True)
+        pipe.delete(self._result_key(job_id))
+        for name, df in frames.items():
+            buffer = io.BytesIO()
+            df.to_parquet(buffer)
+            pipe.hset(self._result_key(job_id), name, buffer.getvalue())
+        pipe.expire(self._result_key(job_id), self.result_ttl)
+        pipe.execute()
+
+    def _release(self, job_id: str, fingerprint: str):
+        # знімаємо дедуплікацію, лише якщо ключ досі належить цьому завданню
+        key = self._dedup_key(fingerprint)
+        with self.r.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) == job_id:
+                    pipe.multi()
+                    pipe.delete(key)
+                    pipe.execute()
+            except redis.WatchError:
+                pass
+
+
+class JobWorker:
+    def __init__(self, queue: JobQueue, handlers: Dict[str, JobHandler], concurrency: int = 2,
+                 name: Optional[str] = None, block_seconds: float = 1.0, heartbeat_seconds: int = 30):
+        self.queue = queue
+        self.r = queue.r
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.block_seconds = block_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._counters = {"done": 0, "failed": 0, "running": 0, "recovered": 0}
+
+    def _processing_key(self, slot: int) -> str:
+        return f"{self.queue.prefix}:processing:{self.name}:{slot}"
+
+    def _heartbeat_key(self, name: str) -> str:
+        return f"{self.queue.prefix}:worker:{name}"
+
+    def _count(self, counter: str, delta: int = 1):
+        with self._lock:
+            self._counters[counter] += delta
+
+    def recover_orphans(self) -> int:
+        # завдання воркерів, що перестали відмічатися, повертаються на початок черги
+        recovered = 0
+        prefix = f"{self.queue.prefix}:processing:"
+        for key in self.r.scan_iter(match=prefix + "*", count=100):
+            owner = key[len(prefix):].rsplit(":", 1)[0]
+            if owner == self.name or self.r.exists(self._heartbeat_key(owner)):
+                continue
+            while self.r.lmove(key, self.queue.queue_key, "RIGHT", "LEFT") is not None:
+                recovered += 1
+        if recovered:
+            logger.warning("Recovered %s jobs from stopped workers", recovered)
+            self._count("recovered", recovered)
+        return recovered
+
+    def process(self, job_id: str):
+        job = self.queue.status(job_id)
+        if job is None:
+            # термін зберігання минув, поки завдання чекало в черзі
+            return
+        handler = self.handlers.get(job["kind"])
+
+        def progress(fraction: float, message: str = ""):
+            self.queue._update(job_id, progress=round(min(max(fraction, 0.0), 1.0), 3), message=message)
+
+        self._count("running")
+        self.queue._update(job_id, status=JOB_RUNNING, started_at=_now(), worker=self.name)
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+            frames = handler(job["params"], progress)
+            self.queue._store_result(job_id, frames)
+            self.queue._finish(job_id, status=JOB_DONE, progress=1.0)
+            self._count("done")
+        except Exception as e:
+            logger.error("Error running job %s (%s): %s", job_id, job["kind"], e)
+            self.queue._finish(job_id, status=JOB_FAILED, error=str(e))
+            self._count("failed")
+        finally:
+            self._count("running", -1)
+            self.queue._release(job_id, job["fingerprint"])
+
+    def _run(self, slot: int):
+        processing = self._processing_key(slot)
+        # завдання, узяте цим слотом перед перезапуском, повертаємо в чергу
+        while self.r.lmove(processing, self.queue.queue_key, "RIGHT", "LEFT") is not None:
+            self._count("recovered")
+
+        while not self._stop.is_set():
+            try:
+                job_id = self.r.blmove(self.queue.queue_key, processing, self.block_seconds, "LEFT", "RIGHT")
+                if job_id is None:
+                    continue
+                try:
+                    self.process(job_id)
+                finally:
+                    self.r.lrem(processing, 1, job_id)
+            except redis.RedisError as e:
+                logger.error("Error reading job queue: %s", e)
+                self._stop.wait(1.0)
+
+    def _heartbeat(self):
+        while not self._stop.is_set():
+            try:
+                self.r.set(self._heartbeat_key(self.name), 1, ex=self.heartbeat_seconds * 2)
+                self.recover_orphans()
+            except redis.RedisError as e:
+                logger.error("Error sending worker heartbeat: %s", e)
+            self._stop.wait(self.heartbeat_seconds)
+
+    def start(self):
+        if self._threads:
+            return self
+        self._stop.clear()
+        # відмічаємось до запуску слотів, інакше сусідній воркер вважатиме їхні завдання покинутими
+        self.r.set(self._heartbeat_key(self.name), 1, ex=self.heartbeat_seconds * 2)
+        self._threads = [threading.Thread(target=self._heartbeat, name="jobs-heartbeat", daemon=True)]
+        self._threads += [threading.Thread(target=self._run, args=(slot,), name=f"jobs-worker-{slot}", daemon=True)
+                          for slot in range(self.concurrency)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout if timeout is not None else self.block_seconds + 1)
+        self._threads = []
+        self.r.delete(self._heartbeat_key(self.name))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+        try:
+            stats["queued"] = self.queue.queue_length()
+        except redis.RedisError:
+            pass
+        return stats
+
+
+def report_handlers(pg, redis_manager) -> Dict[str, JobHandler]:
+    def debtors_report(params: Dict[str, Any], progress: Progress) -> Dict[str, pd.DataFrame]:
+        progress(0.1, "Читання кешу боржників")
+        df, is_stale = redis_manager.get_or_rebuild_debtors_frame(pg.get_debt_candidates_frame)
+        progress(0.9, "Звіт оновлюється, показано попередню версію" if is_stale else "")
+        return {"debtors": df}
+
+    def tariff_report(params: Dict[str, Any], progress: Progress) -> Dict[str, pd.DataFrame]:
+        if params.get("rebuild"):
+            # перерахунок блокує записи в subscribers, тож виконується у воркері, а не в сторінці
+            progress(0.05, "Перерахунок статистики з таблиці абонентів")
+            pg.rebuild_tariff_stats()
+        progress(0.1, "Статистика тарифів")
+        stats = pg.get_tariff_analytics_frame()
+        progress(0.5, "Дохід за місяцями")
+        history = pg.get_tariff_revenue_history()
+        return {"stats": stats, "history": history}
+
+    return {REPORT_DEBTORS: debtors_report, REPORT_TARIFFS: tariff_report}
+
+
+def main():
+    # окремий процес-воркер: python -m databases.jobs (або python run.py worker)
+    from .postgres_db import PostgresManager
+    from .redis_db import RedisManager
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    pg, redis_manager = PostgresManager(), RedisManager()
+    worker = JobWorker(JobQueue(redis_manager.r, redis_manager.r_raw), report_handlers(pg, redis_manager),
+                       concurrency=max(1, int(os.getenv("JOB_WORKERS", 2))))
+    worker.start()
+    logger.info("Job worker %s started", worker.name)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.stop()
+        pg.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+from typing import Any, Dict, List, Tuple
+
+# Унікальний ключ advisory-lock, щоб кілька процесів не застосовували міграції одночасно
+MIGRATIONS_LOCK_KEY = 724_001
+
+def _tariff_stats_trigger(event: str, delta: str) -> str:
+    # один upsert на тариф за оператор, а не на рядок: COPY на мільйон рядків
+    # оновлює лише кілька рядків статистики; ORDER BY фіксує порядок блокувань,
+    # а HAVING пропускає зміни, що не чіпають кількість і дохід (ПІБ, дата оплати)
+    function = f"tariff_stats_on_{event.lower()}"
+    transitions = {
+        "INSERT": "NEW TABLE AS new_rows",
+        "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+        "DELETE": "OLD TABLE AS old_rows",
+    }[event]
+    return f"""
+        CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+        BEGIN
+            WITH delta AS ({delta}),
+            by_tariff AS (
+                INSERT INTO tariff_stats AS t (service_type, user_count, total_revenue)
+                SELECT service_type, SUM(sign), SUM(sign * monthly_fee)
+                FROM delta GROUP BY service_type
+                HAVING SUM(sign) <> 0 OR SUM(sign * monthly_fee) <> 0
+                ORDER BY service_type
+                ON CONFLICT (service_type) DO UPDATE SET
+                    user_count = t.user_count + EXCLUDED.user_count,
+                    total_revenue = t.total_revenue + EXCLUDED.total_revenue
+            )
+            INSERT INTO tariff_revenue_monthly AS m (month, service_type, user_count, total_revenue)
+            SELECT date_trunc('month', contract_start_date)::date, service_type, SUM(sign), SUM(sign * monthly_fee)
+            FROM delta GROUP BY 1, 2
+            HAVING SUM(sign) <> 0 OR SUM(sign * monthly_fee) <> 0
+            ORDER BY 1, 2
+            ON CONFLICT (month, service_type) DO UPDATE SET
+                user_count = m.user_count + EXCLUDED.user_count,
+                total_revenue = m.total_revenue + EXCLUDED.total_revenue;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS {function} ON subscribers;
+        CREATE TRIGGER {function}
+            AFTER {event} ON subscribers
+            REFERENCING {transitions}
+            FOR EACH STATEMENT EXECUTE FUNCTION {function}();
+    """
+
+
+_NEW_ACTIVE = "SELECT service_type, contract_start_date, monthly_fee, 1 AS sign FROM new_rows WHERE is_active"
+_OLD_ACTIVE = "SELECT service_type, contract_start_date, monthly_fee, -1 AS sign FROM old_rows WHERE is_active"
+
+# Перерахунок статистики з нуля: початкове заповнення та відновлення після збою
+TARIFF_STATS_REBUILD = """
+    TRUNCATE tariff_stats, tariff_revenue_monthly;
+    INSERT INTO tariff_stats (service_type, user_count, total_revenue)
+    SELECT service_type, COUNT(*), SUM(monthly_fee)
+    FROM subscribers WHERE is_active GROUP BY service_type;
+    INSERT INTO tariff_revenue_monthly (month, service_type, user_count, total_revenue)
+    SELECT date_trunc('month', contract_start_date)::date, service_type, COUNT(*), SUM(monthly_fee)
+    FROM subscribers WHERE is_active GROUP BY 1, 2;
+"""
+
+MIGRATIONS: List[Tuple[int, str, str]] = [
+    (1, "create_subscribers", """
+        CREATE TABLE IF NOT EXISTS subscribers(
+            ric VARCHAR(50) PRIMARY KEY,
+            pin_code VARCHAR(10) NOT NULL,
+            full_name VARCHAR(100) NOT NULL,
+            phone_model VARCHAR(100) NOT NULL,
+            phone_type VARCHAR(50) NOT NULL,
+            service_type VARCHAR(50) NOT NULL,
+            contract_start_date DATE NOT NULL,
+            contract_duration_months INT NOT NULL,
+            monthly_fee DECIMAL(10, 2) NOT NULL,
+            is_active BOOLEAN NOT NULL DEFAULT TRUE,
+            last_payment_date DATE
+        );
+    """),
+    (2, "debtors_partial_index", """
+        CREATE INDEX IF NOT EXISTS idx_subscribers_debtors
+            ON subscribers (last_payment_date)
+            INCLUDE (ric, full_name, monthly_fee)
+            WHERE is_active;
+    """),
+    (3, "trigram_search_indexes", """
+        DO $$
+        BEGIN
+            -- pg_trgm входить у contrib; на збірках без нього пошук працює без індексу.
+            -- GiST, а не GIN: лише GiST віддає рядки за відстанню <<->, тож топ-N пошуку
+            -- читається з індексу. Кирилиця в триграмах потребує UTF-8 LC_CTYPE бази
+            -- (типово в образі postgres), у локалі C букви ігноруються
+            IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                CREATE INDEX IF NOT EXISTS idx_subscribers_full_name_trgm_gist
+                    ON subscribers USING gist (full_name gist_trgm_ops);
+                CREATE INDEX IF NOT EXISTS idx_subscribers_phone_model_trgm_gist
+                    ON subscribers USING gist (phone_model gist_trgm_ops);
+            ELSE
+                RAISE NOTICE 'pg_trgm is not available, search falls back to ILIKE';
+            END IF;
+        END
+        $$;
+    """),
+    (4, "materialized_tariff_stats", """
+        CREATE TABLE IF NOT EXISTS tariff_stats(
+            service_type VARCHAR(50) PRIMARY KEY,
+            user_count BIGINT NOT NULL DEFAULT 0,
+            total_revenue DECIMAL(16, 2) NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS tariff_revenue_monthly(
+            month DATE NOT NULL,
+            service_type VARCHAR(50) NOT NULL,
+            user_count BIGINT NOT NULL DEFAULT 0,
+            total_revenue DECIMAL(16, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, service_type)
+        );
+
+        CREATE OR REPLACE FUNCTION tariff_stats_on_truncate() RETURNS trigger AS $$
+        BEGIN
+            TRUNCATE tariff_stats, tariff_revenue_monthly;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS tariff_stats_on_truncate ON subscribers;
+        CREATE TRIGGER tariff_stats_on_truncate
+            AFTER TRUNCATE ON subscribers
+            FOR EACH STATEMENT EXECUTE FUNCTION tariff_stats_on_truncate();
+    """ + _tariff_stats_trigger("INSERT", _NEW_ACTIVE)
+        + _tariff_stats_trigger("UPDATE", f"{_NEW_ACTIVE} UNION ALL {_OLD_ACTIVE}")
+        + _tariff_stats_trigger("DELETE", _OLD_ACTIVE)
+        + TARIFF_STATS_REBUILD),
+    (5, "ric_prefix_search_index", """
+        CREATE INDEX IF NOT EXISTS idx_subscribers_ric_upper
+            ON subscribers ((upper(ric) COLLATE "C"));
+    """),
+]
+
+
+def apply_migrations(conn) -> List[int]:
+    applied_now = []
+    conn.autocommit = True
+
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations(
+                version INT PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_KEY,))
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cursor.fetchall()}
+
+        conn.autocommit = False
+        for version, name, statement in MIGRATIONS:
+            if version in applied:
+                continue
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(statement)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                        (version, name)
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied_now.append(version)
+    finally:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_KEY,))
+
+    return applied_now
+
+
+def seq_scanned_relations(plan: Dict[str, Any]) -> List[str]:
+    relations = []
+    if plan.get("Node Type") == "Seq Scan":
+        relations.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        relations.extend(seq_scanned_relations(child))
+    return relations
@@ -50,4 +50,12 @@ class DebtorReport(BaseModel):
             return 0.0
         months_overdue = math.ceil(days / 30)
 
-        return round(months_overdue * self.monthly_fee, 2)
\ No newline at end of file
+        return round(months_overdue * self.monthly_fee, 2)
+
+class SubscriberProfile(BaseModel):
+    subscriber: Subscriber
+    requests: List[dict] = []
+    open_requests: int = 0
+    days_overdue: int = 0
+    months_overdue: int = 0
+    debt_amount: float = 0.0
@@ -1,32 +1,85 @@
+import logging
 import os
 import pymongo
+from pymongo import IndexModel, ASCENDING, DESCENDING, UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from datetime import datetime
 from .models import ServiceRequest
+from .slow_queries import SlowFindListener, SlowQueryLog, get_slow_query_log
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Поля, які реально показують списки на сторінці заявок
+QUEUE_FIELDS = ["ric", "phone_model", "issue_description", "created_at"]
+HISTORY_FIELDS = ["ric", "phone_model", "issue_description", "status", "created_at", "closed_at"]
+
+# Індекси, які замінено новішими і треба прибрати при старті
+OBSOLETE_INDEXES = ["status_created_at"]
+
+REQUEST_INDEXES = [
+    # _id у ключі дає стабільний порядок для keyset-пагінації при однаковому created_at
+    IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+               name="status_created_at_id"),
+    IndexModel([("ric", ASCENDING), ("created_at", DESCENDING)], name="ric_created_at"),
+    IndexModel([("created_at", DESCENDING)], name="created_at"),
+]
+
+
+def plan_stages(explain: Dict[str, Any]) -> List[str]:
+    plan = explain["queryPlanner"]["winningPlan"]
+    # у MongoDB 7+ зі SBE дерево стадій лежить усередині queryPlan
+    plan = plan.get("queryPlan", plan)
+
+    stages = []
+    pending = [plan]
+    while pending:
+        stage = pending.pop()
+        stages.append(stage.get("stage"))
+        if "inputStage" in stage:
+            pending.append(stage["inputStage"])
+        pending.extend(stage.get("inputStages", []))
+    return stages
+
 class MongoManager():
     def __init__(self):
         uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-        self.client = pymongo.MongoClient(uri)
+        # повільні find/aggregate пояснюються у фоні й пишуться в спільний журнал з Postgres
+        slow_query_ms = float(os.getenv("MONGO_SLOW_QUERY_MS", 200))
+        self.slow_queries: Optional[SlowQueryLog] = get_slow_query_log() if slow_query_ms > 0 else None
+        listeners = []
+        if self.slow_queries is not None:
+            listeners.append(SlowFindListener(
+                self.slow_queries, slow_query_ms, int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", 10000))
+            ))
+        self.client = pymongo.MongoClient(uri, event_listeners=listeners)
+        for listener in listeners:
+            listener.attach(self.client)
         self.db = self.client["mobile_operator_coursework"]
         self.collection = self.db["service_requests"]
+        self.batch_size = 1000
+        self.ensure_indexes()
 
-    def create_request(self, req: ServiceRequest) -> str:
-        data = req.model_dump()
-        result = self.collection.insert_one(data)
-        return str(result.inserted_id)
-    
-    def get_all_requests(self, only_open: bool = True) -> List[Dict[str, Any]]:
-        filter_query = {}
-        if only_open:
-            filter_query = {"status": "open"}
+    def ensure_indexes(self) -> List[str]:
+        existing = self.collection.index_information()
+        for name in OBSOLETE_INDEXES:
+            if name in existing:
+                self.collection.drop_index(name)
+        return self.collection.create_indexes(REQUEST_INDEXES)
 
-        cursor = self.collection.find(filter_query).sort("created_at", -1)
+    @staticmethod
+    def _projection(fields: Optional[List[str]]):
+        if fields is None:
+            return None
+        return {field: 1 for field in fields}
 
+    @staticmethod
+    def _to_dicts(cursor) -> List[Dict[str, Any]]:
         results = []
         for doc in cursor:
             doc['id'] = str(doc['_id'])
@@ -34,17 +87,175 @@ class MongoManager():
             results.append(doc)
 
         return results
+
+    def create_request(self, req: ServiceRequest) -> str:
+        data = req.model_dump()
+        result = self.collection.insert_one(data)
+        return str(result.inserted_id)
     
-    def get_requests_by_ric(self, ric: str) -> List[Dict[str, Any]]:
-        cursor = self.collection.find({"ric": ric}).sort("created_at", -1)
+    def create_requests(self, requests: Iterable[ServiceRequest]) -> List[Optional[str]]:
+        # id у тому ж порядку, що й вхідні заявки; None — заявку не вставлено
+        ids: List[Optional[str]] = []
+        batch: List[Dict[str, Any]] = []
+        for req in requests:
+            batch.append(req.model_dump())
+            if len(batch) >= self.batch_size:
+                ids.extend(self._insert_batch(batch))
+                batch = []
+        if batch:
+            ids.extend(self._insert_batch(batch))
+        return ids
 
-        results = []
-        for doc in cursor:
-            doc['id'] = str(doc['_id'])
-            del doc['_id']
-            results.append(doc)
+    def _insert_batch(self, docs: List[Dict[str, Any]]) -> List[Optional[str]]:
+        failed = set()
+        try:
+            # insert_many проставляє _id у самі документи ще до відправки
+            self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            logger.error("Error creating requests: %s of %s failed", len(failed), len(docs))
+        return [None if i in failed else str(doc["_id"]) for i, doc in enumerate(docs)]
+
+    @staticmethod
+    def _parse_ids(request_ids: Iterable[str]) -> Tuple[Dict[str, bool], Dict[str, ObjectId]]:
+        results: Dict[str, bool] = {}
+        oids: Dict[str, ObjectId] = {}
+        for request_id in request_ids:
+            results[request_id] = False
+            try:
+                oids[request_id] = ObjectId(request_id)
+            except (InvalidId, TypeError):
+                logger.error("Error: invalid request id %r", request_id)
+        return results, oids
+
+    def _bulk_write(self, operations: List[Any]) -> set:
+        # повертає індекси операцій, що завершилися помилкою
+        failed = set()
+        for start in range(0, len(operations), self.batch_size):
+            batch = operations[start:start + self.batch_size]
+            try:
+                self.collection.bulk_write(batch, ordered=False)
+            except BulkWriteError as e:
+                failed.update(start + error["index"] for error in e.details.get("writeErrors", []))
+        return failed
+
+    def _existing_ids(self, oids: List[ObjectId], extra_filter: Optional[Dict[str, Any]] = None) -> set:
+        found = set()
+        for start in range(0, len(oids), self.batch_size):
+            query = {"_id": {"$in": oids[start:start + self.batch_size]}, **(extra_filter or {})}
+            found.update(doc["_id"] for doc in self.collection.find(query, {"_id": 1}))
+        return found
 
+    def close_requests(self, request_ids: Iterable[str]) -> Dict[str, bool]:
+        # True — заявку закрито саме цим викликом; уже закриті й неіснуючі дають False
+        results, oids = self._parse_ids(request_ids)
+        if not oids:
+            return results
+
+        closed_at = datetime.now()
+        id_list = list(oids.values())
+        failed = self._bulk_write([
+            UpdateOne({"_id": oid, "status": "open"}, {"$set": {"status": "closed", "closed_at": closed_at}})
+            for oid in id_list
+        ])
+        # bulk_write не повертає результат по кожній операції, тож дочитуємо закриті цим викликом
+        closed = self._existing_ids(
+            [oid for i, oid in enumerate(id_list) if i not in failed],
+            {"status": "closed", "closed_at": closed_at},
+        )
+        for request_id, oid in oids.items():
+            results[request_id] = oid in closed
         return results
+
+    def delete_requests(self, request_ids: Iterable[str]) -> Dict[str, bool]:
+        # True — заявка існувала на момент виклику і тепер її немає
+        results, oids = self._parse_ids(request_ids)
+        if not oids:
+            return results
+
+        found = self._existing_ids(list(oids.values()))
+        existing = [oid for oid in oids.values() if oid in found]
+        failed = self._bulk_write([DeleteOne({"_id": oid}) for oid in existing])
+        deleted = {oid for i, oid in enumerate(existing) if i not in failed}
+        for request_id, oid in oids.items():
+            results[request_id] = oid in deleted
+        return results
+
+    def get_all_requests(self, only_open: bool = True,
+                         fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        filter_query = {}
+        if only_open:
+            filter_query = {"status": "open"}
+
+        cursor = self.collection.find(filter_query, self._projection(fields)).sort("created_at", -1)
+        return self._to_dicts(cursor)
+    
+    def get_requests_by_ric(self, ric: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        cursor = self.collection.find({"ric": ric}, self._projection(fields)).sort("created_at", -1)
+        return self._to_dicts(cursor)
+
+    @staticmethod
+    def _group_by_ric(rics: List[str], docs) -> Dict[str, List[Dict[str, Any]]]:
+        grouped: Dict[str, List[Dict[str, Any]]] = {ric: [] for ric in rics}
+        for doc in MongoManager._to_dicts(docs):
+            grouped.setdefault(doc["ric"], []).append(doc)
+        return grouped
+
+    @staticmethod
+    def _rics_query(rics: List[str], fields: Optional[List[str]]):
+        # ric потрібен для групування, тому завжди потрапляє в проєкцію
+        if fields is not None and "ric" not in fields:
+            fields = ["ric", *fields]
+        return {"ric": {"$in": list(rics)}}, MongoManager._projection(fields)
+
+    def get_requests_by_rics(self, rics: List[str],
+                             fields: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        if not rics:
+            return {}
+        filter_query, projection = self._rics_query(rics, fields)
+        # сортування збігається з індексом ric_created_at, тож окремої SORT-стадії немає
+        cursor = self.collection.find(filter_query, projection).sort([("ric", ASCENDING), ("created_at", DESCENDING)])
+        return self._group_by_ric(rics, cursor)
+
+    def get_open_requests_page(self, after: Optional[str] = None, limit: int = 20,
+                               fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        filter_query: Dict[str, Any] = {"status": "open"}
+        if after:
+            created_at, oid = self._decode_page_cursor(after)
+            filter_query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": oid}},
+            ]
+
+        cursor = (
+            self.collection.find(filter_query, self._projection(fields))
+            .sort([("created_at", DESCENDING), ("_id", DESCENDING)])
+            .limit(limit + 1)
+        )
+        docs = list(cursor)
+
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            last = docs[-1]
+            next_cursor = self._encode_page_cursor(last["created_at"], last["_id"])
+
+        return self._to_dicts(docs), next_cursor
+
+    @staticmethod
+    def _encode_page_cursor(created_at: datetime, oid: ObjectId) -> str:
+        return f"{created_at.isoformat()}|{oid}"
+
+    @staticmethod
+    def _decode_page_cursor(token: str) -> Tuple[datetime, ObjectId]:
+        created_at, oid = token.split("|", 1)
+        return datetime.fromisoformat(created_at), ObjectId(oid)
+
+    def count_open_requests(self) -> int:
+        return self.collection.count_documents({"status": "open"})
+
+    def explain_find(self, filter_query: Dict[str, Any], sort_field: str = "created_at") -> Dict[str, Any]:
+        return self.collection.find(filter_query).sort(sort_field, -1).explain()
     
     def close_request(self, request_id: str):
         try:
@@ -61,7 +272,7 @@ class MongoManager():
             )
             return True
         except Exception as e:
-            print(f"Error closing request: {e}")
+            logger.error("Error closing request: %s", e)
             return False
         
     def delete_request(self, request_id: str):
@@ -70,4 +281,5 @@ class MongoManager():
             self.collection.delete_one({"_id": oid})
             return True
         except Exception as e:
+            logger.error("Error deleting request: %s", e)
             return False
\ No newline at end of file
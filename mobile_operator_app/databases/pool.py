@@ -0,0 +1,131 @@
+import threading
+import time
+import psycopg2
+from psycopg2 import pool
+from contextlib import contextmanager
+from typing import Dict, Any
+
+
+class PostgresPool:
+    def __init__(self, minconn: int, maxconn: int, timeout: float = 30.0,
+                 health_check_interval: float = 30.0, **conn_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, **conn_kwargs)
+        # ThreadedConnectionPool кидає PoolError, коли вільних з'єднань немає,
+        # тому семафор змушує потоки чекати своєї черги замість помилки
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used: Dict[int, float] = {}
+
+        self._in_use = 0
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._reconnects = 0
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self._release(conn, broken)
+
+    def _acquire(self):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise pool.PoolError(f"No free connection after {self.timeout}s")
+        waited = time.perf_counter() - started
+
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def _checkout(self):
+        conn = self._pool.getconn()
+        if self._is_healthy(conn):
+            return conn
+
+        self._pool.putconn(conn, close=True)
+        self._last_used.pop(id(conn), None)
+        with self._lock:
+            self._reconnects += 1
+
+        conn = self._pool.getconn()
+        conn.autocommit = True
+        return conn
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+
+        last_used = self._last_used.get(id(conn))
+        if last_used is None:
+            conn.autocommit = True
+            return True
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _release(self, conn, broken: bool):
+        discard = broken or conn.closed
+        if not discard and not conn.autocommit:
+            try:
+                conn.rollback()
+                conn.autocommit = True
+            except psycopg2.Error:
+                discard = True
+
+        if discard:
+            self._last_used.pop(id(conn), None)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+
+        try:
+            self._pool.putconn(conn, close=discard)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "in_use": self._in_use,
+                "idle": len(self._pool._pool),
+                "utilization": round(self._in_use / self.maxconn, 3),
+                "checkouts": checkouts,
+                "avg_wait_ms": round(self._wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "max_wait_ms": round(self._wait_max * 1000, 3),
+                "reconnects": self._reconnects,
+            }
+
+    def closeall(self):
+        self._pool.closeall()
+        self._last_used.clear()
@@ -1,93 +1,491 @@
+import logging
 import os
-import psycopg2
+import io
+import csv
+from itertools import islice
+import numpy as np
+from operator import attrgetter
+import pandas as pd
+from datetime import date
 from psycopg2.extras import RealDictCursor
-from psycopg2 import sql
+from psycopg2 import errors, sql
 from dotenv import load_dotenv
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from .models import Subscriber
 from .models import DebtorReport
+from .debt import debt_sql
+from .pool import PostgresPool
+from .subscriber_cache import SubscriberCache
+from .result_cache import ColumnArrays, ColumnsResultCache
+from .prepared import PreparedStatements
+from .migrations import apply_migrations, seq_scanned_relations, TARIFF_STATS_REBUILD
+from .slow_queries import SlowQueryExplainer, SlowQueryLog, get_slow_query_log, slow_query_connection_factory
+from .search import SEARCH_MIN_LENGTH, psycopg_search_query, search_params
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_COLUMNS = (
+    "ric", "pin_code", "full_name", "phone_model", "phone_type",
+    "service_type", "contract_start_date", "contract_duration_months",
+    "monthly_fee", "is_active", "last_payment_date"
+)
+
+# DECIMAL одразу приводимо до float8, щоб драйвер не створював Decimal на кожне значення
+SUBSCRIBER_FRAME_COLUMNS = """
+    ric, pin_code, full_name, phone_model, phone_type,
+    service_type, contract_start_date, contract_duration_months,
+    monthly_fee::float8 AS monthly_fee, is_active, last_payment_date,
+    contract_duration_months * monthly_fee::float8 AS total_cost
+"""
+
+GET_SUBSCRIBER_QUERY = "SELECT * FROM subscribers WHERE ric = %s"
+
+# Гарячі запити, які кожне з'єднання готує один раз (параметри $1, $2, ...)
+PREPARED_QUERIES = {
+    "get_subscriber": "SELECT * FROM subscribers WHERE ric = $1",
+    "get_subscribers": "SELECT * FROM subscribers WHERE ric = ANY($1) ORDER BY ric",
+    "subscribers_first_page": "SELECT * FROM subscribers ORDER BY ric LIMIT $1",
+    "subscribers_next_page": "SELECT * FROM subscribers WHERE ric > $1 ORDER BY ric LIMIT $2",
+    "add_subscriber": f"""
+        INSERT INTO subscribers({", ".join(SUBSCRIBER_COLUMNS)})
+        VALUES ({", ".join(f"${i}" for i in range(1, len(SUBSCRIBER_COLUMNS) + 1))})
+        ON CONFLICT (ric) DO NOTHING
+        RETURNING *
+    """,
+    "delete_subscriber": "DELETE FROM subscribers WHERE ric = $1 RETURNING ric",
+    "deactivate_subscriber": "UPDATE subscribers SET is_active = FALSE WHERE ric = $1 RETURNING *",
+}
+
+UPDATABLE_COLUMNS = tuple(col for col in SUBSCRIBER_COLUMNS if col != "ric")
+
+
+def update_columns(updates: dict) -> Tuple[str, ...]:
+    # канонічний порядок колонок: той самий набір полів дає той самий текст запиту,
+    # тож і один підготовлений запит (psycopg2) чи один запис кешу asyncpg
+    return tuple(col for col in UPDATABLE_COLUMNS if col in updates)
+
+
+def update_subscriber_sql(columns: Tuple[str, ...]) -> str:
+    # назви колонок узято з білого списку, тож їх можна підставити в текст запиту
+    set_clauses = ", ".join(f"{col} = ${i}" for i, col in enumerate(columns, start=1))
+    return f"UPDATE subscribers SET {set_clauses} WHERE ric = ${len(columns) + 1} RETURNING *"
+
+
+class _CopyText(dict):
+    # різних дат і тарифів у пачці значно менше, ніж рядків, тож текст рахуємо раз на значення
+    def __missing__(self, value):
+        text = self[value] = "\\N" if value is None else str(value)
+        return text
+
+
+def copy_payload(subscribers: List[Subscriber]) -> Tuple[io.StringIO, str]:
+    # текстовий формат COPY без лапок збирається f-рядком удвічі швидше за csv.writer,
+    # але не екранує \t, \n, \r і \ у полях; якщо вони трапились, пачку пише csv.
+    # Порядок полів — SUBSCRIBER_COLUMNS
+    dates, fees = _CopyText(), _CopyText()
+    text = "".join([
+        f"{s.ric}\t{s.pin_code}\t{s.full_name}\t{s.phone_model}\t{s.phone_type}\t{s.service_type}\t"
+        f"{dates[s.contract_start_date]}\t{s.contract_duration_months}\t{fees[s.monthly_fee]}\t"
+        f"{'t' if s.is_active else 'f'}\t{dates[s.last_payment_date]}\n"
+        for s in subscribers
+    ])
+    nulls = sum(1 for s in subscribers if s.last_payment_date is None)
+    if (text.count("\t") == 10 * len(subscribers) and text.count("\n") == len(subscribers)
+            and "\r" not in text and text.count("\\") == nulls):
+        return io.StringIO(text), "FORMAT text"
+
+    # QUOTE_ALL пише NULL як "", тому для єдиної nullable-колонки вмикаємо FORCE_NULL
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writerows(map(attrgetter(*SUBSCRIBER_COLUMNS), subscribers))
+    buffer.seek(0)
+    return buffer, "FORMAT csv, FORCE_NULL (last_payment_date)"
+
+
+def unique_by_ric(subscribers: List[Subscriber], upsert: bool) -> Dict[str, Subscriber]:
+    # повтори RIC в межах пачки: для DO NOTHING лишається перший запис,
+    # для upsert — останній, як при послідовних викликах add_subscriber
+    unique = {}
+    for sub in subscribers:
+        if upsert:
+            unique[sub.ric] = sub
+        else:
+            unique.setdefault(sub.ric, sub)
+    return unique
+
+
+def subscriber_row(subscriber: Subscriber) -> dict:
+    return dict(zip(SUBSCRIBER_COLUMNS, attrgetter(*SUBSCRIBER_COLUMNS)(subscriber)))
+
+# Вторинні індекси, які масове заповнення порожньої таблиці будує один раз після COPY;
+# унікальні (первинний ключ) лишаються, бо ловлять повтори RIC між пачками
+SECONDARY_INDEXES_QUERY = """
+    SELECT c.relname, pg_get_indexdef(i.indexrelid)
+    FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE i.indrelid = 'subscribers'::regclass AND NOT i.indisunique
+"""
+
+# Статистику тарифів ведуть тригери на subscribers (міграція 4), тож читання
+# проходить лише по рядку на тариф замість GROUP BY по всій таблиці
+TARIFF_ANALYTICS_QUERY = """
+    SELECT
+        service_type,
+        user_count,
+        total_revenue::float8 as total_revenue,
+        (total_revenue / user_count)::float8 as avg_check
+    FROM tariff_stats
+    WHERE user_count > 0
+    ORDER BY total_revenue DESC;
+"""
+
+TARIFF_REVENUE_HISTORY_QUERY = """
+    SELECT month, service_type, user_count, total_revenue::float8 AS total_revenue
+    FROM tariff_revenue_monthly
+    WHERE user_count > 0
+    ORDER BY month, service_type
+"""
+
+# Типи масивів для get_custom_columns; решта колонок — рядки й дати як object
+COLUMN_DTYPES = {
+    "contract_duration_months": np.int64,
+    "monthly_fee": np.float64,
+    "is_active": np.bool_,
+}
+
+def column_arrays(columns, rows) -> ColumnArrays:
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return {
+        col: np.array(column_values, dtype=COLUMN_DTYPES.get(col, object))
+        for col, column_values in zip(columns, values)
+    }
+
+# Зміна абонента: (ric, рядок після запису) або (ric, None), якщо запис видалено
+SubscriberChange = Tuple[str, Optional[dict]]
+
+DEBTORS_REPORT_ORDER = {
+    "ric", "full_name", "monthly_fee", "last_payment_date", "days_overdue", "debt_amount"
+}
+
 class PostgresManager:
-    def __init__(self):
-        self.connection = psycopg2.connect(
+    def __init__(self, min_connections: Optional[int] = None, max_connections: Optional[int] = None):
+        # запити, повільніші за поріг, пишуться в журнал разом з планом, який будується у фоні
+        slow_query_ms = float(os.getenv("PG_SLOW_QUERY_MS", 500))
+        self.slow_queries: Optional[SlowQueryLog] = get_slow_query_log() if slow_query_ms > 0 else None
+        conn_params = dict(
             dbname=os.getenv("PG_DB"),
             user=os.getenv("PG_USER"),
             password=os.getenv("PG_PASSWORD"),
             host=os.getenv("PG_HOST"),
-            port=os.getenv("PG_PORT")
+            port=os.getenv("PG_PORT"),
         )
-        self.connection.autocommit = True
-        self._create_table()
+        conn_kwargs = {}
+        self.slow_query_explainer: Optional[SlowQueryExplainer] = None
+        if self.slow_queries is not None:
+            self.slow_query_explainer = SlowQueryExplainer(
+                self.slow_queries, slow_query_ms, int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", 10000)),
+                **conn_params
+            )
+            conn_kwargs["connection_factory"] = slow_query_connection_factory(self.slow_query_explainer)
 
-    def _create_table(self):
-        query = """
-            CREATE TABLE IF NOT EXISTS subscribers(
-                ric VARCHAR(50) PRIMARY KEY,
-                pin_code VARCHAR(10) NOT NULL,
-                full_name VARCHAR(100) NOT NULL,
-                phone_model VARCHAR(100) NOT NULL,
-                phone_type VARCHAR(50) NOT NULL,
-                service_type VARCHAR(50) NOT NULL,
-                contract_start_date DATE NOT NULL,
-                contract_duration_months INT NOT NULL,
-                monthly_fee DECIMAL(10, 2) NOT NULL,
-                is_active BOOLEAN NOT NULL DEFAULT TRUE,
-                last_payment_date DATE
-            );
-        """
-        with self.connection.cursor() as cursor:
-            cursor.execute(query)
+        self.pool = PostgresPool(
+            minconn=min_connections or int(os.getenv("PG_POOL_MIN", 1)),
+            maxconn=max_connections or int(os.getenv("PG_POOL_MAX", 10)),
+            timeout=float(os.getenv("PG_POOL_TIMEOUT", 30)),
+            **conn_params,
+            **conn_kwargs
+        )
+        self._change_listeners: List[Callable[[List[SubscriberChange]], None]] = []
+        self._reset_listeners: List[Callable[[], None]] = []
+        self.subscriber_cache: Optional[SubscriberCache] = None
+        self.columns_cache: Optional[ColumnsResultCache] = None
+        self.statements = PreparedStatements(
+            prefix="subscribers", enabled=os.getenv("PG_PREPARED_STATEMENTS", "1") != "0"
+        )
+        for name, query in PREPARED_QUERIES.items():
+            self.statements.register(name, query)
+        if self.slow_query_explainer is not None:
+            self.slow_query_explainer.attach_statements(self.statements)
+        self._update_statements: Dict[Tuple[str, ...], str] = {}
+        self._migrate()
+        self.trigram_search = self._has_extension("pg_trgm")
+
+    def connection(self):
+        return self.pool.connection()
+
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def statement_stats(self):
+        return self.statements.stats()
+
+    def _execute(self, cursor, name: str, params=()):
+        self.statements.execute(cursor, f"{self.statements.prefix}_{name}", params)
+
+    def _migrate(self):
+        with self.connection() as conn:
+            return apply_migrations(conn)
+
+    def _has_extension(self, name: str) -> bool:
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = %s", (name,))
+            return cursor.fetchone() is not None
+
+    def add_change_listener(self, callback: Callable[[List[SubscriberChange]], None],
+                            on_reset: Optional[Callable[[], None]] = None):
+        # on_reset викликається, коли таблицю очищено повністю
+        self._change_listeners.append(callback)
+        if on_reset is not None:
+            self._reset_listeners.append(on_reset)
+
+    def enable_subscriber_cache(self, cache: SubscriberCache, events=None):
+        # events — джерело змін: сам менеджер або споживач потоку змін
+        self.subscriber_cache = cache
+        (events or self).add_change_listener(cache.apply_subscriber_changes, cache.clear)
+
+    def enable_columns_cache(self, cache: ColumnsResultCache, events=None):
+        self.columns_cache = cache
+        (events or self).add_change_listener(cache.apply_subscriber_changes, cache.clear)
+
+    def _publish_changes(self, changes: List[SubscriberChange]):
+        if not changes:
+            return
+        for callback in self._change_listeners:
+            # збій кешу не повинен відкочувати вже виконаний запис у Postgres
+            try:
+                callback(changes)
+            except Exception as e:
+                logger.error("Error publishing subscriber changes: %s", e)
+
+    def _publish_reset(self):
+        for callback in self._reset_listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.error("Error publishing subscribers reset: %s", e)
+
+    def clear_subscribers(self):
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("TRUNCATE TABLE subscribers")
+        self._publish_reset()
 
     def add_subscriber(self, subscriber: Subscriber):
-        query = """
-            INSERT INTO subscribers(
-                ric, pin_code, full_name, phone_model, phone_type,
-                service_type, contract_start_date, contract_duration_months,
-                monthly_fee, is_active, last_payment_date
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (ric) DO NOTHING;
-        """
-        values = (
-            subscriber.ric, subscriber.pin_code, subscriber.full_name, subscriber.phone_model,
-            subscriber.phone_type, subscriber.service_type, subscriber.contract_start_date,
-            subscriber.contract_duration_months, subscriber.monthly_fee, 
-            subscriber.is_active, subscriber.last_payment_date
-        )
+        values = attrgetter(*SUBSCRIBER_COLUMNS)(subscriber)
+
+        with self.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            self._execute(cursor, "add_subscriber", values)
+            row = cursor.fetchone()
+
+        if row:
+            self._publish_changes([(row["ric"], dict(row))])
+
+    def bulk_add_subscribers(self, subscribers: Iterable[Subscriber], chunk_size: int = 50000,
+                             upsert: bool = False) -> Dict[str, int]:
+        rows = iter(subscribers)
+        chunks = iter(lambda: list(islice(rows, chunk_size)), [])
+
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS subscribers_stage (LIKE subscribers)
+                    ON COMMIT DELETE ROWS;
+                """)
+            conn.autocommit = False
+
+            if self._lock_if_empty(conn):
+                return self._load_empty_subscribers(conn, chunks, upsert)
+
+            result = {"inserted": 0, "updated": 0, "skipped": 0}
+            for chunk in chunks:
+                unique = unique_by_ric(chunk, upsert)
+                with conn.cursor() as cursor:
+                    inserted, updated, changed = self._merge_chunk(cursor, unique, upsert)
+                conn.commit()
+
+                self._publish_changes(changed)
+
+                result["inserted"] += inserted
+                result["updated"] += updated
+                result["skipped"] += len(chunk) - inserted - updated
+
+        return result
+
+    def _lock_if_empty(self, conn) -> bool:
+        # NOWAIT: таблицею, яку хтось саме читає, не блокуємо, а йдемо звичайним шляхом
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM subscribers)")
+            if not cursor.fetchone()[0]:
+                try:
+                    cursor.execute("LOCK TABLE subscribers IN ACCESS EXCLUSIVE MODE NOWAIT")
+                    cursor.execute("SELECT EXISTS (SELECT 1 FROM subscribers)")
+                    if not cursor.fetchone()[0]:
+                        return True
+                except errors.LockNotAvailable:
+                    pass
+        conn.rollback()
+        return False
+
+    def _load_empty_subscribers(self, conn, chunks: Iterator[List[Subscriber]], upsert: bool) -> Dict[str, int]:
+        # перше заповнення порожньої таблиці: одна транзакція під ACCESS EXCLUSIVE, пачки
+        # йдуть COPY прямо в subscribers, а вторинні індекси будуються один раз наприкінці
+        copy_query = f"COPY subscribers ({', '.join(SUBSCRIBER_COLUMNS)}) FROM STDIN WITH ({{}})"
+        result = {"inserted": 0, "updated": 0, "skipped": 0}
+        changed = []
+
+        with conn.cursor() as cursor:
+            cursor.execute(SECONDARY_INDEXES_QUERY)
+            indexes = cursor.fetchall()
+            for name, _ in indexes:
+                cursor.execute(sql.SQL("DROP INDEX {}").format(sql.Identifier(name)))
+
+            for chunk in chunks:
+                unique = unique_by_ric(chunk, upsert)
+                buffer, options = copy_payload(list(unique.values()))
+                cursor.execute("SAVEPOINT bulk_chunk")
+                try:
+                    cursor.copy_expert(copy_query.format(options), buffer)
+                    inserted, updated = len(unique), 0
+                    if self._change_listeners:
+                        changed.extend((ric, subscriber_row(sub)) for ric, sub in unique.items())
+                except errors.UniqueViolation:
+                    # RIC повторився з попередньої пачки: цю пачку зливаємо через staging
+                    cursor.execute("ROLLBACK TO SAVEPOINT bulk_chunk")
+                    inserted, updated, merged = self._merge_chunk(cursor, unique, upsert)
+                    cursor.execute("TRUNCATE subscribers_stage")
+                    changed.extend(merged)
+
+                result["inserted"] += inserted
+                result["updated"] += updated
+                result["skipped"] += len(chunk) - inserted - updated
+
+            for _, definition in indexes:
+                cursor.execute(definition)
+        conn.commit()
+
+        self._publish_changes(changed)
+        return result
 
-        with self.connection.cursor() as cursor:
-            cursor.execute(query, values)
+    def _merge_chunk(self, cursor, unique: Dict[str, Subscriber], upsert: bool) -> Tuple[int, int, List[SubscriberChange]]:
+        columns = ", ".join(SUBSCRIBER_COLUMNS)
+        if upsert:
+            conflict = "DO UPDATE SET " + ", ".join(f"{col} = EXCLUDED.{col}" for col in UPDATABLE_COLUMNS)
+        else:
+            conflict = "DO NOTHING"
+        # записані рядки збігаються з вхідними, тож підписникам вистачає RIC,
+        # а без підписників — rowcount
+        returning = "RETURNING ric, (xmax = 0)" if self._change_listeners else ""
+
+        buffer, options = copy_payload(list(unique.values()))
+        cursor.copy_expert(f"COPY subscribers_stage ({columns}) FROM STDIN WITH ({options})", buffer)
+
+        updated = 0
+        if upsert and not self._change_listeners:
+            cursor.execute("SELECT count(*) FROM subscribers_stage JOIN subscribers USING (ric)")
+            updated = cursor.fetchone()[0]
+
+        cursor.execute(f"""
+            INSERT INTO subscribers ({columns})
+            SELECT {columns} FROM subscribers_stage
+            ORDER BY ric
+            ON CONFLICT (ric) {conflict}
+            {returning};
+        """)
+        if not self._change_listeners:
+            return cursor.rowcount - updated, updated, []
+
+        written = cursor.fetchall()
+        inserted = sum(1 for _, is_new in written if is_new)
+        return inserted, len(written) - inserted, [(ric, subscriber_row(unique[ric])) for ric, _ in written]
 
     def get_subscriber(self, ric: str) -> Optional[Subscriber]:
-        query = "SELECT * FROM subscribers WHERE ric = %s"
+        if self.subscriber_cache is not None:
+            return self.subscriber_cache.get(ric, self._load_subscriber)
+        return self._load_subscriber(ric)
 
-        with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute(query, (ric,))
+    def _load_subscriber(self, ric: str) -> Optional[Subscriber]:
+        with self.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            self._execute(cursor, "get_subscriber", (ric,))
             row = cursor.fetchone()
             if row:
                 return Subscriber(**row)
             return None
         
+    def get_subscribers(self, rics: List[str]) -> List[Subscriber]:
+        # один запит на весь набір RIC замість окремого get_subscriber для кожного
+        if not rics:
+            return []
+        with self.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            self._execute(cursor, "get_subscribers", (list(rics),))
+            return [Subscriber(**row) for row in cursor.fetchall()]
+
     def get_all_subscribers(self) -> List[Subscriber]:
+        return list(self.iter_subscribers())
+
+    def iter_subscribers(self, itersize: int = 2000) -> Iterator[Subscriber]:
         query = "SELECT * FROM subscribers"
 
-        with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            return [Subscriber(**row) for row in rows]
+        with self.connection() as conn:
+            # іменований (серверний) курсор працює лише всередині транзакції
+            conn.autocommit = False
+            with conn.cursor(name="subscribers_stream", cursor_factory=RealDictCursor) as cursor:
+                cursor.itersize = itersize
+                cursor.execute(query)
+                for row in cursor:
+                    yield Subscriber(**row)
+            conn.commit()
+
+    def get_subscribers_page(self, after_ric: Optional[str] = None, limit: int = 50) -> List[Subscriber]:
+        with self.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            if after_ric is None:
+                self._execute(cursor, "subscribers_first_page", (limit,))
+            else:
+                self._execute(cursor, "subscribers_next_page", (after_ric, limit))
+            return [Subscriber(**row) for row in cursor.fetchall()]
         
+    def _fetch_frame(self, query, params=None) -> pd.DataFrame:
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, params)
+            columns = [col.name for col in cursor.description]
+            return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+
+    def get_subscribers_frame(self, after_ric: Optional[str] = None, limit: Optional[int] = None) -> pd.DataFrame:
+        query = f"SELECT {SUBSCRIBER_FRAME_COLUMNS} FROM subscribers"
+        params = []
+        if after_ric is not None:
+            query += " WHERE ric > %s"
+            params.append(after_ric)
+        query += " ORDER BY ric"
+        if limit is not None:
+            query += " LIMIT %s"
+            params.append(limit)
+
+        return self._fetch_frame(query, params)
+
+    def search_subscribers(self, query: str, limit: int = 20, min_score: float = 0.4) -> pd.DataFrame:
+        # RIC за префіксом, ПІБ і модель телефону — за схожістю триграм; колонка score — ранг
+        if len(query.strip()) < SEARCH_MIN_LENGTH:
+            return pd.DataFrame()
+        return self._fetch_frame(
+            psycopg_search_query(SUBSCRIBER_FRAME_COLUMNS, self.trigram_search),
+            search_params(query, limit, min_score)
+        )
+
     def delete_subscriber(self, ric: str):
-        query = "DELETE FROM subscribers WHERE ric = %s"
+        with self.connection() as conn, conn.cursor() as cursor:
+            self._execute(cursor, "delete_subscriber", (ric,))
+            deleted = cursor.fetchone()
 
-        with self.connection.cursor() as cursor:
-            cursor.execute(query, (ric,))
+        if deleted:
+            self._publish_changes([(ric, None)])
 
     def deactivate_subscriber(self, ric: str):
-        query = "UPDATE subscribers SET is_active = FALSE WHERE ric = %s"
-        with self.connection.cursor() as cursor:
-            cursor.execute(query, (ric,))
+        with self.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            self._execute(cursor, "deactivate_subscriber", (ric,))
+            row = cursor.fetchone()
+
+        if row:
+            self._publish_changes([(ric, dict(row))])
 
     def get_debtors_raw(self):
         query = """
@@ -97,81 +495,176 @@ class PostgresManager:
             AND is_active = TRUE
         """
 
-        with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+        with self.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
             cursor.execute(query)
             rows = cursor.fetchall()
             return [DebtorReport(**row) for row in rows]
         
-    def get_custom_columns(self, columns: List[str]):
-        if not columns:
-            return []
-        
-        allowed_columns = {
-            "ric", "pin_code", "full_name", "phone_model", "phone_type",
-            "service_type", "contract_start_date", "contract_duration_months",
-            "monthly_fee", "is_active", "last_payment_date"
+    def get_debt_candidates_frame(self) -> pd.DataFrame:
+        # усі активні абоненти з датою оплати: боржниками вони стають з плином часу,
+        # тож кеш тримає їх заздалегідь і відбирає боржників за датою при читанні
+        query = """
+            SELECT ric, full_name, monthly_fee::float8 AS monthly_fee, last_payment_date
+            FROM subscribers
+            WHERE is_active = TRUE AND last_payment_date IS NOT NULL
+        """
+        return self._fetch_frame(query)
+
+    def get_debtors_frame(self, as_of: Optional[date] = None) -> pd.DataFrame:
+        query = f"{self._debtors_cte()} SELECT * FROM debtors"
+        return self._fetch_frame(query, {"as_of": as_of or date.today()})
+
+    def _debtors_cte(self) -> str:
+        return f"""
+            WITH debtors AS (
+                SELECT ric, full_name, monthly_fee::float8 AS monthly_fee, last_payment_date,
+                    {debt_sql()}
+                FROM subscribers
+                WHERE last_payment_date < %(as_of)s::date - INTERVAL '1 month'
+                AND is_active = TRUE
+            )
+        """
+
+    def get_debtors_report(self, order_by: str = "debt_amount", descending: bool = True,
+                           min_debt: float = 0.0, limit: Optional[int] = None, offset: int = 0,
+                           as_of: Optional[date] = None) -> pd.DataFrame:
+        if order_by not in DEBTORS_REPORT_ORDER:
+            raise ValueError(f"Unknown order column: {order_by}")
+
+        direction = "DESC" if descending else "ASC"
+        query = f"""
+            {self._debtors_cte()}
+            SELECT * FROM debtors
+            WHERE debt_amount >= %(min_debt)s
+            ORDER BY {order_by} {direction}, ric
+            LIMIT %(limit)s OFFSET %(offset)s
+        """
+        params = {
+            "as_of": as_of or date.today(),
+            "min_debt": min_debt,
+            "limit": limit,
+            "offset": offset,
         }
+        return self._fetch_frame(query, params)
+
+    def get_debtors_totals(self, min_debt: float = 0.0, as_of: Optional[date] = None) -> Dict[str, float]:
+        query = f"""
+            {self._debtors_cte()}
+            SELECT
+                COUNT(*) AS debtors_count,
+                COALESCE(SUM(debt_amount), 0)::float8 AS total_debt,
+                COALESCE(AVG(debt_amount), 0)::float8 AS avg_debt,
+                COALESCE(MAX(days_overdue), 0) AS max_days_overdue
+            FROM debtors
+            WHERE debt_amount >= %(min_debt)s
+        """
+        params = {"as_of": as_of or date.today(), "min_debt": min_debt}
+
+        with self.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(query, params)
+            return dict(cursor.fetchone())
 
-        safe_columns = [col for col in columns if col in allowed_columns]
+    def get_custom_columns(self, columns: List[str]) -> ColumnArrays:
+        # порядок і повтори не важливі: однаковий набір колонок дає один ключ кешу
+        requested = set(columns)
+        safe_columns = tuple(col for col in SUBSCRIBER_COLUMNS if col in requested)
         if not safe_columns:
-            return []
-        
-        with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
-            query = sql.SQL("SELECT {} FROM subscribers").format(
-                sql.SQL(', ').join(map(sql.Identifier, safe_columns))
-            )
+            return {}
+
+        if self.columns_cache is not None:
+            return self.columns_cache.get(safe_columns, self._load_columns)
+        return self._load_columns(safe_columns)
+
+    def _load_columns(self, columns: Tuple[str, ...]) -> ColumnArrays:
+        select = [
+            sql.SQL("{}::float8 AS {}").format(sql.Identifier(col), sql.Identifier(col))
+            if col == "monthly_fee" else sql.Identifier(col)
+            for col in columns
+        ]
+        query = sql.SQL("SELECT {} FROM subscribers").format(sql.SQL(', ').join(select))
+
+        with self.connection() as conn, conn.cursor() as cursor:
             cursor.execute(query)
-            return cursor.fetchall()
-        
+            rows = cursor.fetchall()
+
+        return column_arrays(columns, rows)
+
     def get_tariff_analytics(self):
-        query = """
-            SELECT 
-                service_type, 
-                COUNT(*) as user_count, 
-                SUM(monthly_fee) as total_revenue,
-                AVG(monthly_fee) as avg_check
-            FROM subscribers
-            WHERE is_active = TRUE
-            GROUP BY service_type
-            ORDER BY total_revenue DESC;
-        """
-        with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute(query)
+        with self.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(TARIFF_ANALYTICS_QUERY)
             return cursor.fetchall()
-        
-    def update_subscriber(self, ric: str, updates: dict):
-        if not updates:
-            return
 
-        allowed_columns = {
-            "pin_code", "full_name", "phone_model", "phone_type",
-            "service_type", "contract_start_date", "contract_duration_months",
-            "monthly_fee", "is_active", "last_payment_date"
+    def get_tariff_analytics_frame(self) -> pd.DataFrame:
+        return self._fetch_frame(TARIFF_ANALYTICS_QUERY)
+
+    def get_tariff_revenue_history(self) -> pd.DataFrame:
+        # дохід активних абонентів за місяцем початку контракту
+        return self._fetch_frame(TARIFF_REVENUE_HISTORY_QUERY)
+
+    def rebuild_tariff_stats(self):
+        # відновлення, якщо статистика розійшлась з таблицею (тригери вимикали, дані правили вручну)
+        with self.connection() as conn:
+            conn.autocommit = False
+            with conn.cursor() as cursor:
+                # блокуємо записи в subscribers, поки статистика перераховується
+                cursor.execute("LOCK TABLE subscribers IN SHARE MODE")
+                cursor.execute(TARIFF_STATS_REBUILD)
+            conn.commit()
+
+    def explain(self, query, params=None):
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+            return cursor.fetchone()[0][0]["Plan"]
+
+    def check_index_usage(self) -> Dict[str, List[str]]:
+        known_queries = {
+            "get_subscriber": (GET_SUBSCRIBER_QUERY, ("RIC-0",)),
+            "get_debtors_report": (
+                f"{self._debtors_cte()} SELECT * FROM debtors ORDER BY debt_amount DESC LIMIT 50",
+                {"as_of": date.today()}
+            ),
         }
 
-        safe_updates = {k: v for k, v in updates.items() if k in allowed_columns}
+        offenders = {}
+        for name, (query, params) in known_queries.items():
+            relations = seq_scanned_relations(self.explain(query, params))
+            if "subscribers" in relations:
+                offenders[name] = relations
+        return offenders
 
-        if not safe_updates:
+    def update_subscriber(self, ric: str, updates: dict):
+        if not updates:
             return
 
-        set_clauses = []
-        values = []
-
-        for column, value in safe_updates.items():
-            set_clauses.append(sql.SQL("{} = %s").format(sql.Identifier(column)))
-            values.append(value)
+        columns = update_columns(updates)
+        if not columns:
+            return
 
+        values = [updates[col] for col in columns]
         values.append(ric)
 
-        query = sql.SQL("UPDATE subscribers SET {} WHERE ric = %s").format(
-            sql.SQL(', ').join(set_clauses)
-        )
-
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(query, values)
+            with self.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                self._execute(cursor, self._update_statement(columns), values)
+                row = cursor.fetchone()
         except Exception as e:
-            print(f"Error: {e}")
+            logger.error("Error: %s", e)
+            return
+
+        if row:
+            self._publish_changes([(ric, dict(row))])
+
+    def _update_statement(self, columns: Tuple[str, ...]) -> str:
+        name = self._update_statements.get(columns)
+        if name is None:
+            # ім'я — бітова маска колонок, тож не залежить від порядку полів у updates
+            mask = sum(1 << i for i, col in enumerate(UPDATABLE_COLUMNS) if col in columns)
+            name = f"update_{mask:x}"
+            self.statements.register(name, update_subscriber_sql(columns))
+            self._update_statements[columns] = name
+        return name
         
     def close(self):
-        self.connection.close()
\ No newline at end of file
+        self.pool.closeall()
+        if self.slow_query_explainer is not None:
+            self.slow_query_explainer.close()
\ No newline at end of file
@@ -0,0 +1,71 @@
+import re
+import threading
+import weakref
+from psycopg2 import errors
+from typing import Dict, Optional, Sequence
+
+
+class PreparedStatements:
+    # PREPARE живе в межах сесії, тож кожне з'єднання пулу готує запит один раз
+    # при першому використанні, а далі надсилається лише EXECUTE з параметрами
+    def __init__(self, prefix: str = "stmt", enabled: bool = True):
+        self.prefix = prefix
+        # за пулерами в режимі транзакцій (PgBouncer) сесійні PREPARE не працюють
+        self.enabled = enabled
+        self._queries: Dict[str, str] = {}
+        self._plain: Dict[str, str] = {}
+        self._prepared: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._counters = {"prepares": 0, "executions": 0}
+
+    def register(self, name: str, query: str) -> str:
+        # query пишеться з параметрами $1, $2, ... — кожен один раз і по порядку,
+        # щоб без PREPARE той самий текст виконувався з %s
+        name = f"{self.prefix}_{name}"
+        with self._lock:
+            if name not in self._queries:
+                self._queries[name] = query
+                self._plain[name] = re.sub(r"\$\d+", "%s", query)
+        return name
+
+    def query(self, name: str) -> Optional[str]:
+        with self._lock:
+            return self._queries.get(name)
+
+    def execute(self, cursor, name: str, params: Sequence = ()):
+        if not self.enabled:
+            cursor.execute(self._plain[name], tuple(params))
+            return
+
+        conn = cursor.connection
+        with self._lock:
+            prepared = self._prepared.setdefault(conn, set())
+            needs_prepare = name not in prepared
+            query = self._queries[name]
+
+        if needs_prepare:
+            # PREPARE не транзакційний: відкат транзакції не знищує підготовлений запит
+            try:
+                cursor.execute(f"PREPARE {name} AS {query}")
+            except errors.DuplicatePreparedStatement:
+                # запит уже підготовлено в цій сесії іншим екземпляром реєстру
+                if not conn.autocommit:
+                    raise
+            with self._lock:
+                prepared.add(name)
+                self._counters["prepares"] += 1
+
+        if params:
+            placeholders = ", ".join(["%s"] * len(params))
+            cursor.execute(f"EXECUTE {name} ({placeholders})", tuple(params))
+        else:
+            cursor.execute(f"EXECUTE {name}")
+        with self._lock:
+            self._counters["executions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["statements"] = len(self._queries)
+            counters["connections"] = len(self._prepared)
+        return counters
@@ -0,0 +1,34 @@
+from datetime import date
+from typing import Dict, List, Optional
+from .models import Subscriber, SubscriberProfile
+from .debt import compute_debt, debt_cutoff
+
+
+def build_profiles(rics: List[str], subscribers: List[Subscriber], requests_by_ric: Dict[str, List[dict]],
+                   as_of: Optional[date] = None) -> Dict[str, Optional[SubscriberProfile]]:
+    # профілі в порядку запитаних RIC; None — абонента немає в Postgres
+    by_ric = {sub.ric: sub for sub in subscribers}
+    profiles: Dict[str, Optional[SubscriberProfile]] = {ric: None for ric in rics}
+    if not subscribers:
+        return profiles
+
+    cutoff = debt_cutoff(as_of)
+    debt = compute_debt([sub.last_payment_date for sub in subscribers],
+                        [sub.monthly_fee for sub in subscribers], as_of)
+
+    for i, sub in enumerate(subscribers):
+        # борг рахуємо так само, як звіт по боржниках: активні й без оплати понад місяць
+        is_debtor = sub.is_active and sub.last_payment_date is not None and sub.last_payment_date < cutoff
+        history = requests_by_ric.get(sub.ric, [])
+        profile = SubscriberProfile(
+            subscriber=sub,
+            requests=history,
+            open_requests=sum(1 for req in history if req.get("status") == "open"),
+        )
+        if is_debtor:
+            profile.days_overdue = int(debt.days_overdue[i])
+            profile.months_overdue = int(debt.months_overdue[i])
+            profile.debt_amount = float(debt.debt_amount[i])
+        if sub.ric in profiles:
+            profiles[sub.ric] = profile
+    return profiles
@@ -1,53 +1,298 @@
+import logging
 import os
+import time
+import uuid
+import threading
 import redis
 import json
+import pandas as pd
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from typing import List, Optional
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
 from .models import DebtorReport
+from .debt import add_debt_columns, debt_cutoff
+from .codecs import get_codec
 
 load_dotenv()
 
-class RedisManager:
-    def __init__(self):
-        host = os.getenv("REDIS_HOST", "localhost")
-        port = int(os.getenv("REDIS_PORT", 6379))
+logger = logging.getLogger(__name__)
 
-        self.r = redis.Redis(
-            host=host, 
-            port=port, 
-            db=0, 
-            decode_responses=True
-        )
-        self.cache_key = "debtors_cache"
+
+class DebtorsCacheLayout:
+    # ключі й формат записів кешу боржників, спільні для синхронного та async менеджерів
+    def __init__(self, codec: Optional[str] = None):
+        self.codec = get_codec(codec or os.getenv("REDIS_DEBTORS_CODEC", "struct"))
+
+        # формат записів входить у ключ, тож зміна кодека просто дає холодний кеш
+        self.entries_key = f"debtors:{self.codec.name}:entries"
+        self.index_key = f"debtors:{self.codec.name}:by_date"
+        self.ready_key = f"debtors:{self.codec.name}:ready"
+        self.lock_key = f"debtors:{self.codec.name}:lock"
+        self.build_key = f"debtors:{self.codec.name}:building"
         self.ttl_seconds = 3600
+        self.lock_lease_seconds = 60
+        self.batch_size = 5000
+
+    @staticmethod
+    def _connection_params() -> dict:
+        return {
+            "host": os.getenv("REDIS_HOST", "localhost"),
+            "port": int(os.getenv("REDIS_PORT", 6379)),
+            "db": 0,
+        }
+
+    @staticmethod
+    def _change_entry(row: Optional[dict]):
+        if row is None or not row.get("is_active") or row.get("last_payment_date") is None:
+            return None
+        return row["full_name"], float(row["monthly_fee"]), str(row["last_payment_date"])
+
+    def _apply_entry(self, pipe, entries_key: str, index_key: str, ric: str, entry):
+        if entry is None:
+            pipe.hdel(entries_key, ric)
+            pipe.zrem(index_key, ric)
+        else:
+            full_name, monthly_fee, last_payment_date = entry
+            payment_date = date.fromisoformat(last_payment_date)
+            pipe.hset(entries_key, ric, self.codec.encode(ric, full_name, float(monthly_fee), payment_date))
+            pipe.zadd(index_key, {ric: payment_date.toordinal()})
+
+    def _journal_entry(self, ric: str, entry) -> str:
+        return json.dumps([ric, entry], ensure_ascii=False)
+
+
+class RedisManager(DebtorsCacheLayout):
+    def __init__(self, codec: Optional[str] = None):
+        super().__init__(codec)
+        params = self._connection_params()
+
+        self.r = redis.Redis(**params, decode_responses=True)
+        # бінарні кодеки читаються окремим клієнтом без декодування відповідей
+        self.r_raw = redis.Redis(**params)
+
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "rebuilds": 0, "stale": 0}
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def stats(self) -> Dict[str, float]:
+        # звернення до кешу боржників у цьому процесі
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = sum(counters.values())
+        counters["hit_ratio"] = round(counters["hits"] / lookups, 3) if lookups else 0.0
+        return counters
+
+    def _begin_build(self) -> str:
+        # з цього моменту зміни абонентів дублюються в журнал побудови
+        token = uuid.uuid4().hex
+        self.r.set(self.build_key, token, ex=self.lock_lease_seconds)
+        return token
+
+    def _build_keys(self, token: str) -> Tuple[str, str, str]:
+        # тимчасові записи, тимчасовий індекс і журнал змін однієї побудови
+        return (f"{self.entries_key}:build:{token}", f"{self.index_key}:build:{token}",
+                f"{self.build_key}:{token}")
+
+    @contextmanager
+    def _lease(self, token: str, lock=None):
+        # повна перебудова може тривати довше за оренду: поки вона йде, фоновий потік
+        # подовжує блокування, маркер побудови, журнал і тимчасові ключі
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.lock_lease_seconds / 3):
+                try:
+                    if lock is not None:
+                        lock.extend(self.lock_lease_seconds, replace_ttl=True)
+                    if self.r.get(self.build_key) != token:
+                        logger.error("Error: debtors cache build %s lost its lease", token)
+                        return
+                    pipe = self.r.pipeline(transaction=False)
+                    for key in (self.build_key, *self._build_keys(token)):
+                        pipe.expire(key, self.lock_lease_seconds)
+                    pipe.execute()
+                except redis.exceptions.LockError:
+                    logger.error("Error: debtors cache lock lost during rebuild %s", token)
+                    return
+                except redis.RedisError as e:
+                    logger.error("Error renewing debtors cache lease: %s", e)
+
+        thread = threading.Thread(target=renew, name="debtors-cache-lease", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _write_entries(self, entries, token: Optional[str] = None):
+        # звіт будується під тимчасовими ключами і підміняється одним RENAME у MULTI,
+        # тож читачі бачать або старий, або новий звіт, але не напівзаписаний
+        if token is None:
+            token = self._begin_build()
+            with self._lease(token):
+                self._write_entries(entries, token)
+            return
+        entries_tmp, index_tmp, journal_key = self._build_keys(token)
+
+        try:
+            pipe = self.r.pipeline(transaction=False)
+            for i, (ric, full_name, monthly_fee, last_payment_date) in enumerate(entries, start=1):
+                if last_payment_date is None:
+                    continue
+                self._apply_entry(pipe, entries_tmp, index_tmp, ric,
+                                  (full_name, monthly_fee, str(last_payment_date)))
+                if i % self.batch_size == 0:
+                    pipe.execute()
+            pipe.expire(entries_tmp, self.lock_lease_seconds)
+            pipe.expire(index_tmp, self.lock_lease_seconds)
+            pipe.execute()
+
+            self._swap_in(token)
+        finally:
+            self.r.delete(entries_tmp, index_tmp, journal_key)
+
+    def _swap_in(self, token: str) -> bool:
+        entries_tmp, index_tmp, journal_key = self._build_keys(token)
+        replayed = 0
+        while True:
+            with self.r.pipeline() as pipe:
+                try:
+                    # зміни, що прийшли під час побудови, доганяємо у тимчасових ключах
+                    pipe.watch(journal_key, self.build_key)
+                    if pipe.get(self.build_key) != token:
+                        # оренда сплила і перебудову почав інший клієнт (або журнал зник):
+                        # наша копія могла пропустити зміни, тож не підміняємо нею звіт
+                        logger.error("Error: debtors cache build %s lost its lease, result discarded", token)
+                        return False
+                    pending = pipe.lrange(journal_key, replayed, -1)
+                    if pending:
+                        catch_up = self.r.pipeline(transaction=False)
+                        for item in pending:
+                            ric, entry = json.loads(item)
+                            self._apply_entry(catch_up, entries_tmp, index_tmp, ric, entry)
+                        catch_up.execute()
+                        replayed += len(pending)
+                        continue
+
+                    has_entries = pipe.exists(entries_tmp)
+                    pipe.multi()
+                    if has_entries:
+                        pipe.rename(entries_tmp, self.entries_key)
+                        pipe.rename(index_tmp, self.index_key)
+                        pipe.persist(self.entries_key)
+                        pipe.persist(self.index_key)
+                    else:
+                        pipe.delete(self.entries_key, self.index_key)
+                    pipe.delete(self.build_key)
+                    pipe.set(self.ready_key, 1, ex=self.ttl_seconds)
+                    pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue
 
     def cache_debtors(self, debtors: List[DebtorReport]):
-        self.r.delete(self.cache_key)
+        self._write_entries(
+            (d.ric, d.full_name, d.monthly_fee, d.last_payment_date) for d in debtors
+        )
 
-        if not debtors:
+    def cache_debtors_frame(self, df: pd.DataFrame, token: Optional[str] = None):
+        if df.empty:
+            self._write_entries([], token)
             return
-        
-        json_data = [d.model_dump_json() for d in debtors]
-        self.r.rpush(self.cache_key, *json_data)
-        self.r.expire(self.cache_key, self.ttl_seconds)
 
-    def get_cached_debtors(self) -> List[DebtorReport]:
-        if not self.r.exists(self.cache_key):
-            return []
-        
-        raw_data = self.r.lrange(self.cache_key, 0, -1)
+        source = df[["ric", "full_name", "monthly_fee", "last_payment_date"]]
+        self._write_entries(source.itertuples(index=False, name=None), token)
 
+    def apply_subscriber_changes(self, changes: List[Tuple[str, Optional[dict]]]):
+        building = self.r.get(self.build_key)
+
+        pipe = self.r.pipeline(transaction=False)
+        for ric, row in changes:
+            entry = self._change_entry(row)
+            self._apply_entry(pipe, self.entries_key, self.index_key, ric, entry)
+            if building:
+                pipe.rpush(f"{self.build_key}:{building}", self._journal_entry(ric, entry))
+        if building:
+            pipe.expire(f"{self.build_key}:{building}", self.lock_lease_seconds)
+        pipe.execute()
+
+    def is_debtors_cache_ready(self) -> bool:
+        return bool(self.r.exists(self.ready_key))
+
+    def get_or_rebuild_debtors_frame(self, loader: Callable[[], pd.DataFrame], as_of: Optional[date] = None,
+                                     wait_timeout: float = 10.0) -> Tuple[pd.DataFrame, bool]:
+        # повертає (звіт, чи він застарілий); перебудову виконує лише власник блокування
+        if self.is_debtors_cache_ready():
+            self._count("hits")
+            return self.get_cached_debtors_frame(as_of), False
+
+        # токен блокування спільний для потоків: оренду подовжує фоновий потік
+        lock = self.r.lock(self.lock_key, timeout=self.lock_lease_seconds, blocking=False, thread_local=False)
+        if lock.acquire():
+            try:
+                if self.is_debtors_cache_ready():
+                    self._count("hits")
+                else:
+                    self._count("rebuilds")
+                    token = self._begin_build()
+                    with self._lease(token, lock):
+                        self.cache_debtors_frame(loader(), token)
+            finally:
+                try:
+                    lock.release()
+                except redis.exceptions.LockError:
+                    logger.error("Error: debtors cache lock lease expired during rebuild")
+            return self.get_cached_debtors_frame(as_of), False
+
+        # звіт уже перебудовує інший клієнт: віддаємо попередню версію, якщо вона є
+        if self.r.exists(self.entries_key):
+            self._count("stale")
+            return self.get_cached_debtors_frame(as_of), True
+
+        deadline = time.monotonic() + wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            if self.is_debtors_cache_ready():
+                self._count("hits")
+                return self.get_cached_debtors_frame(as_of), False
+        self._count("stale")
+        return self.get_cached_debtors_frame(as_of), True
+
+    def _load_debtor_entries(self, as_of: Optional[date] = None) -> pd.DataFrame:
+        cutoff = debt_cutoff(as_of)
+        rics = self.r.zrangebyscore(self.index_key, "-inf", f"({cutoff.toordinal()}")
+
+        client = self.r_raw if self.codec.binary else self.r
+        raw_data = []
+        for i in range(0, len(rics), self.batch_size):
+            raw_data.extend(client.hmget(self.entries_key, rics[i:i + self.batch_size]))
+        return self.codec.decode_frame(item for item in raw_data if item is not None)
+
+    def get_cached_debtors_frame(self, as_of: Optional[date] = None) -> pd.DataFrame:
+        df = self._load_debtor_entries(as_of)
+        if df.empty:
+            return pd.DataFrame()
+        return add_debt_columns(df, as_of)
+
+    def get_cached_debtors(self, as_of: Optional[date] = None) -> List[DebtorReport]:
         debtors_list = []
-        for item in raw_data:
+        for data_dict in self._load_debtor_entries(as_of).to_dict("records"):
             try:
-                data_dict = json.loads(item)
-                
                 obj = DebtorReport(**data_dict)
                 debtors_list.append(obj)
             except Exception as e:
-                print(f"Error: {e}")
-        
+                logger.error("Error: %s", e)
+
         return debtors_list
-    
+
+    def invalidate_debtors_cache(self):
+        # дані лишаються як застаріла копія, поки триває перебудова
+        self.r.delete(self.ready_key)
+
     def clear_cache(self):
-        self.r.delete(self.cache_key)
\ No newline at end of file
+        self.r.delete(self.entries_key, self.index_key, self.ready_key)
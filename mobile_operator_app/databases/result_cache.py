@@ -0,0 +1,112 @@
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Результат вибірки колонок: назва колонки -> масив значень
+ColumnArrays = Dict[str, np.ndarray]
+
+
+class ColumnsResultCache:
+    def __init__(self, redis_client=None, max_entries: int = 8):
+        self.redis = redis_client
+        self.max_entries = max_entries
+        # лічильник версії таблиці спільний для всіх процесів, якщо є Redis
+        self.version_key = "subscribers:version"
+
+        self._local_version = 0
+        self._max_seen_version = 0
+        self._entries: "OrderedDict[Tuple[str, ...], Tuple[int, ColumnArrays]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "subset_hits": 0, "misses": 0}
+
+    def version(self) -> Optional[int]:
+        if self.redis is None:
+            return self._local_version
+        try:
+            version = int(self.redis.get(self.version_key) or 0)
+        except Exception as e:
+            # без версії не можна довіряти кешу, тож читаємо напряму з бази
+            logger.error("Error reading table version: %s", e)
+            return None
+
+        with self._lock:
+            if version < self._max_seen_version:
+                # лічильник у Redis скинуто: старі записи могли збігтися з новою версією
+                self._entries.clear()
+            self._max_seen_version = version
+        return version
+
+    def bump(self):
+        with self._lock:
+            self._local_version += 1
+        if self.redis is not None:
+            try:
+                self.redis.incr(self.version_key)
+            except Exception as e:
+                logger.error("Error bumping table version: %s", e)
+                with self._lock:
+                    self._entries.clear()
+
+    def apply_subscriber_changes(self, changes: List[Tuple[str, Optional[dict]]]):
+        self.bump()
+
+    def _lookup(self, columns: Tuple[str, ...], version: int) -> Optional[ColumnArrays]:
+        with self._lock:
+            item = self._entries.get(columns)
+            if item is not None and item[0] == version:
+                self._entries.move_to_end(columns)
+                self._counters["hits"] += 1
+                return item[1]
+
+            # ширша вибірка тієї ж версії вже містить потрібні колонки
+            for cached_columns, (cached_version, arrays) in self._entries.items():
+                if cached_version == version and set(columns) <= set(cached_columns):
+                    self._counters["subset_hits"] += 1
+                    return {column: arrays[column] for column in columns}
+
+            self._counters["misses"] += 1
+            return None
+
+    def get(self, columns: Tuple[str, ...], loader: Callable[[Tuple[str, ...]], ColumnArrays]) -> ColumnArrays:
+        version, cached = self.lookup(columns)
+        if cached is not None:
+            return cached
+        arrays = loader(columns)
+        self.store(columns, version, arrays)
+        return arrays
+
+    def lookup(self, columns: Tuple[str, ...]) -> Tuple[Optional[int], Optional[ColumnArrays]]:
+        # версію беремо до запиту: запис, що завершився під час читання, дасть промах наступного разу
+        version = self.version()
+        if version is None:
+            return None, None
+        return version, self._lookup(columns, version)
+
+    def store(self, columns: Tuple[str, ...], version: Optional[int], arrays: ColumnArrays):
+        for values in arrays.values():
+            # масиви спільні для всіх викликів, тому лише для читання
+            values.flags.writeable = False
+
+        if version is not None:
+            with self._lock:
+                self._entries[columns] = (version, arrays)
+                self._entries.move_to_end(columns)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self.bump()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["entries"] = len(self._entries)
+        lookups = counters["hits"] + counters["subset_hits"] + counters["misses"]
+        counters["hit_ratio"] = round((lookups - counters["misses"]) / lookups, 3) if lookups else 0.0
+        return counters
@@ -0,0 +1,91 @@
+from typing import Any, Dict, List, Tuple
+
+# коротші запити дають надто багато шуму в триграмах
+SEARCH_MIN_LENGTH = 2
+# параметри пошуку в порядку позиційних $n для asyncpg
+SEARCH_PARAMS = ("term", "exact", "prefix", "starts", "contains", "limit", "min_score")
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_params(term: str, limit: int, min_score: float) -> Dict[str, Any]:
+    term = term.strip()
+    return {
+        "term": term,
+        "exact": term.upper(),
+        "prefix": escape_like(term.upper()) + "%",
+        "starts": escape_like(term) + "%",
+        "contains": "%" + escape_like(term) + "%",
+        "limit": limit,
+        "min_score": min_score,
+    }
+
+
+# RIC шукається за префіксом через індекс upper(ric) COLLATE "C" (міграція 5):
+# у C-колації LIKE 'RIC-1%' стає діапазоном, і рядки йдуть з індексу вже впорядкованими
+_RIC_CANDIDATES = """
+    (SELECT ric, (CASE WHEN upper(ric) = {exact} THEN 1.0 ELSE 0.95 END)::float8 AS score
+     FROM subscribers
+     WHERE upper(ric) COLLATE "C" LIKE {prefix}
+     ORDER BY upper(ric) COLLATE "C"
+     LIMIT {limit})
+"""
+
+# <<-> — відстань 1 - word_similarity: GiST-індекс віддає найближчі рядки без сортування
+# всіх збігів, а схожість за словом терпить одруківки й незакінчені слова
+_TRIGRAM_CANDIDATES = """
+    (SELECT ric, word_similarity({term}, full_name)::float8 AS score
+     FROM subscribers
+     ORDER BY {term} <<-> full_name
+     LIMIT {limit})
+    UNION ALL
+    (SELECT ric, 0.9 * word_similarity({term}, phone_model)::float8 AS score
+     FROM subscribers
+     ORDER BY {term} <<-> phone_model
+     LIMIT {limit})
+"""
+
+# без pg_trgm лишається ILIKE без індексу: точний підрядок, вище — збіг з початку
+_ILIKE_CANDIDATES = """
+    (SELECT ric, (CASE WHEN full_name ILIKE {starts} THEN 0.8 ELSE 0.6 END)::float8 AS score
+     FROM subscribers
+     WHERE full_name ILIKE {contains}
+     ORDER BY ric
+     LIMIT {limit})
+    UNION ALL
+    (SELECT ric, (CASE WHEN phone_model ILIKE {starts} THEN 0.72 ELSE 0.54 END)::float8 AS score
+     FROM subscribers
+     WHERE phone_model ILIKE {contains}
+     ORDER BY ric
+     LIMIT {limit})
+"""
+
+
+def search_sql(columns: str, trigram: bool) -> str:
+    # шаблон з маркерами {term}, {limit}, ...: кожна гілка бере не більше limit рядків,
+    # тож ціна запиту не залежить від того, скільки абонентів підходить під запит
+    candidates = _RIC_CANDIDATES + " UNION ALL " + (_TRIGRAM_CANDIDATES if trigram else _ILIKE_CANDIDATES)
+    return f"""
+        WITH candidates AS ({candidates}),
+        best AS (
+            SELECT ric, MAX(score) AS score FROM candidates GROUP BY ric
+        )
+        SELECT {columns}, best.score
+        FROM best JOIN subscribers USING (ric)
+        WHERE best.score >= {{min_score}}
+        ORDER BY best.score DESC, ric
+        LIMIT {{limit}}
+    """
+
+
+def psycopg_search_query(columns: str, trigram: bool) -> str:
+    return search_sql(columns, trigram).format(**{name: f"%({name})s" for name in SEARCH_PARAMS})
+
+
+def asyncpg_search_query(columns: str, trigram: bool) -> Tuple[str, List[str]]:
+    # Postgres не виводить тип параметра, якого немає в тексті, тож нумеруємо лише використані
+    template = search_sql(columns, trigram)
+    names = [name for name in SEARCH_PARAMS if f"{{{name}}}" in template]
+    return template.format(**{name: f"${i}" for i, name in enumerate(names, 1)}), names
@@ -0,0 +1,391 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+import psycopg2
+import psycopg2.extensions
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+from pymongo import monitoring
+from typing import Any, Dict, List, Optional, Tuple
+from .migrations import seq_scanned_relations
+
+DEFAULT_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "logs", "slow_queries.log")
+
+# EXPLAIN ANALYZE виконує запит ще раз, тому лише для читання; DML отримує оцінний план
+ANALYZE_STATEMENTS = {"select", "with", "values", "table"}
+PLAN_ONLY_STATEMENTS = {"insert", "update", "delete"}
+EXPLAIN_ANALYZE = "ANALYZE, BUFFERS, FORMAT JSON"
+EXPLAIN_PLAN = "FORMAT JSON"
+# величезні пакетні INSERT ... VALUES немає сенсу пересилати заради плану
+MAX_EXPLAIN_QUERY_BYTES = 64 * 1024
+MAX_LOGGED_QUERY_CHARS = 4000
+
+MONGO_EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct"}
+MONGO_PLAN_VALUE_FIELDS = {"parsedQuery", "filter", "indexBounds", "$match"}
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ARRAY_LIST = re.compile(r"array\[\s*\?(?:\s*,\s*\?)*\s*\]")
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+# CTE з DML і SELECT ... FOR UPDATE/SHARE змінюють дані або блокують рядки
+_WRITE_KEYWORDS = re.compile(r"\b(?:insert|update|delete|share)\b")
+_EXECUTE = re.compile(r"^\s*execute\s+(\w+)", re.I)
+
+
+def normalize_sql(query: str) -> str:
+    # літерали й параметри замінюються на ?, списки значень згортаються:
+    # запити, що відрізняються лише даними, мають однаковий відбиток
+    text = _COMMENT.sub(" ", query)
+    text = _STRING_LITERAL.sub("?", text)
+    text = _PLACEHOLDER.sub("?", text)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = " ".join(text.split()).lower()
+    text = _VALUE_LIST.sub("(...)", text)
+    return _ARRAY_LIST.sub("array[...]", text)
+
+
+def _shape(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $and/$or зберігають структуру, списки значень ($in) — ні
+        if value and all(isinstance(item, dict) for item in value):
+            return [_shape(item) for item in value]
+        return "?"
+    return "?"
+
+
+def normalize_mongo(command_name: str, command: Dict[str, Any]) -> str:
+    shape = {"command": command_name, "collection": command.get(command_name)}
+    for field in ("filter", "pipeline", "query"):
+        if field in command:
+            shape[field] = _shape(command[field])
+    # сортування, проєкція й поле distinct описують форму запиту, а не дані
+    for field in ("sort", "projection", "key"):
+        if field in command:
+            shape[field] = command[field]
+    return json.dumps(shape, sort_keys=True, default=str)
+
+
+def scrub_pg_plan(value: Any) -> Any:
+    # умови вузлів плану ("Index Cond", "Filter") містять літерали запиту
+    if isinstance(value, dict):
+        return {key: scrub_pg_plan(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [scrub_pg_plan(item) for item in value]
+    if isinstance(value, str):
+        return _STRING_LITERAL.sub("'?'", value)
+    return value
+
+
+def scrub_mongo_plan(value: Any) -> Any:
+    # розібраний фільтр і межі індексу повторюють значення з запиту
+    if isinstance(value, dict):
+        return {key: _shape(item) if key in MONGO_PLAN_VALUE_FIELDS else scrub_mongo_plan(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [scrub_mongo_plan(item) for item in value]
+    return value
+
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def explain_options(normalized: str) -> Optional[str]:
+    statement = normalized.split(" ", 1)[0].lstrip("(")
+    if statement in ANALYZE_STATEMENTS:
+        return EXPLAIN_PLAN if _WRITE_KEYWORDS.search(normalized) else EXPLAIN_ANALYZE
+    if statement in PLAN_ONLY_STATEMENTS:
+        return EXPLAIN_PLAN
+    return None
+
+
+class SlowQueryLog:
+    # JSON-рядки в обмеженому файлі з ротацією; той самий відбиток пишеться не частіше cooldown
+    def __init__(self, path: str = DEFAULT_LOG_PATH, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                 cooldown_seconds: float = 300.0, max_recent: int = 200, log_raw_queries: bool = False):
+        self.path = path
+        # сирий текст містить значення параметрів (PIN, ПІБ, дати), тому за замовчуванням
+        # у журнал іде лише нормалізований запит без літералів
+        self.log_raw_queries = log_raw_queries
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._last_captured: Dict[str, float] = {}
+        self._recent: "deque[dict]" = deque(maxlen=max_recent)
+        self._counters = {"slow": 0, "captured": 0, "suppressed": 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                            encoding="utf-8", delay=True)
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger = logging.getLogger(f"{__name__}.file.{os.path.abspath(path)}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._logger.addHandler(self._handler)
+
+    def should_capture(self, query_fingerprint: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self._counters["slow"] += 1
+            last = self._last_captured.get(query_fingerprint)
+            if last is not None and now - last < self.cooldown_seconds:
+                self._counters["suppressed"] += 1
+                return False
+            self._last_captured[query_fingerprint] = now
+            return True
+
+    def write(self, entry: Dict[str, Any]):
+        entry = {"logged_at": datetime.now().isoformat(timespec="milliseconds"), **entry}
+        with self._lock:
+            self._counters["captured"] += 1
+            self._recent.append(entry)
+        self._logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def recent(self) -> List[dict]:
+        with self._lock:
+            return list(reversed(self._recent))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["fingerprints"] = len(self._last_captured)
+        return counters
+
+    def close(self):
+        self._logger.removeHandler(self._handler)
+        self._handler.close()
+
+
+_logs: Dict[str, SlowQueryLog] = {}
+_logs_lock = threading.Lock()
+
+
+def get_slow_query_log(path: Optional[str] = None) -> SlowQueryLog:
+    # один обробник на файл: два RotatingFileHandler на тому ж файлі ламають ротацію
+    path = os.path.abspath(path or os.getenv("SLOW_QUERY_LOG", DEFAULT_LOG_PATH))
+    with _logs_lock:
+        if path not in _logs:
+            _logs[path] = SlowQueryLog(
+                path,
+                max_bytes=int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024)),
+                backup_count=int(os.getenv("SLOW_QUERY_LOG_BACKUPS", 5)),
+                cooldown_seconds=float(os.getenv("SLOW_QUERY_COOLDOWN_SECONDS", 300)),
+                log_raw_queries=os.getenv("SLOW_QUERY_LOG_RAW", "0") == "1",
+            )
+        return _logs[path]
+
+
+# --- PostgreSQL ---
+
+class _SlowQueryCursorMixin:
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        result = super().execute(query, vars)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms >= self.connection.slow_query_ms and self.name is None:
+            self.connection.capture_slow_query(self.query, elapsed_ms)
+        return result
+
+
+@lru_cache(maxsize=None)
+def _timed_cursor_class(cursor_factory):
+    return type(f"SlowQuery{cursor_factory.__name__}", (_SlowQueryCursorMixin, cursor_factory), {})
+
+
+class SlowQueryConnection(psycopg2.extensions.connection):
+    # підміняє фабрику курсорів, тож заміряється кожен execute менеджера,
+    # включно з RealDictCursor і EXECUTE підготовлених запитів
+    slow_query_explainer: Optional["SlowQueryExplainer"] = None
+    slow_query_ms: float = 500.0
+
+    def cursor(self, name=None, cursor_factory=None, **kwargs):
+        factory = cursor_factory or self.cursor_factory or psycopg2.extensions.cursor
+        return super().cursor(name, cursor_factory=_timed_cursor_class(factory), **kwargs)
+
+    def capture_slow_query(self, query: bytes, elapsed_ms: float):
+        # у потоці запиту лише відбиток і cooldown, EXPLAIN виконується у фоні
+        text = query.decode("utf-8", "replace") if isinstance(query, bytes) else str(query)
+        self.slow_query_explainer.submit(text, elapsed_ms)
+
+
+class SlowQueryExplainer:
+    # EXPLAIN виконується у фоновому потоці на окремому з'єднанні, щоб не затримувати
+    # запит, який виявився повільним, і не займати його транзакцію
+    def __init__(self, log: SlowQueryLog, threshold_ms: float, explain_timeout_ms: int = 10000,
+                 **conn_kwargs):
+        self.log = log
+        self.threshold_ms = threshold_ms
+        self.explain_timeout_ms = explain_timeout_ms
+        self.statements = None
+        self._conn_kwargs = conn_kwargs
+        self._conn = None
+        self._prepared: set = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pg-explain")
+
+    def attach_statements(self, statements):
+        # EXECUTE пояснюється через текст підготовленого запиту з реєстру
+        self.statements = statements
+
+    def submit(self, text: str, elapsed_ms: float):
+        normalized = normalize_sql(text)
+        query_fingerprint = fingerprint(normalized)
+        if self.log.should_capture(query_fingerprint):
+            self._executor.submit(self._capture, text, normalized, query_fingerprint, elapsed_ms)
+
+    def _capture(self, text: str, normalized: str, query_fingerprint: str, elapsed_ms: float):
+        entry = {
+            "source": "postgres",
+            "fingerprint": query_fingerprint,
+            "duration_ms": round(elapsed_ms, 3),
+            "threshold_ms": self.threshold_ms,
+            "normalized": normalized[:MAX_LOGGED_QUERY_CHARS],
+            "plan": None,
+        }
+        if self.log.log_raw_queries:
+            entry["query"] = text[:MAX_LOGGED_QUERY_CHARS]
+        prepared = self._prepared_query(text)
+        options = explain_options(normalize_sql(prepared[1]) if prepared else normalized)
+        statement = normalized.split(" ", 1)[0].lstrip("(")
+        if statement == "execute" and prepared is None:
+            entry["explain_skipped"] = "unknown prepared statement"
+        elif options is None:
+            entry["explain_skipped"] = f"statement {statement!r}"
+        elif len(text.encode("utf-8")) > MAX_EXPLAIN_QUERY_BYTES:
+            entry["explain_skipped"] = f"query larger than {MAX_EXPLAIN_QUERY_BYTES} bytes"
+        else:
+            try:
+                plan = self._explain(text, options, prepared)
+                entry["plan"] = plan if self.log.log_raw_queries else scrub_pg_plan(plan)
+                entry["seq_scans"] = seq_scanned_relations(plan["Plan"])
+            except psycopg2.Error as e:
+                # DETAIL може містити значення ключа, тож лише перший рядок повідомлення
+                entry["explain_error"] = str(e).strip().splitlines()[0]
+        self.log.write(entry)
+
+    def _prepared_query(self, text: str) -> Optional[Tuple[str, str]]:
+        match = _EXECUTE.match(text)
+        if match is None or self.statements is None:
+            return None
+        query = self.statements.query(match.group(1))
+        return (match.group(1), query) if query is not None else None
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg2.connect(**self._conn_kwargs)
+            self._conn.autocommit = True
+            self._prepared = set()
+        return self._conn
+
+    def _explain(self, query: str, options: str, prepared: Optional[Tuple[str, str]]) -> Dict[str, Any]:
+        # ANALYZE лише для читання, але транзакція все одно відкочується,
+        # а таймаут обмежує ціну повторного виконання
+        conn = self._connection()
+        try:
+            with conn.cursor() as cursor:
+                if prepared is not None and prepared[0] not in self._prepared:
+                    # PREPARE живе в сесії, тож на власному з'єднанні готуємо запит заново
+                    cursor.execute(f"PREPARE {prepared[0]} AS {prepared[1]}")
+                    self._prepared.add(prepared[0])
+                cursor.execute("BEGIN")
+                try:
+                    cursor.execute(f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}")
+                    cursor.execute(f"EXPLAIN ({options}) {query}")
+                    return cursor.fetchone()[0][0]
+                finally:
+                    cursor.execute("ROLLBACK")
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            conn.close()
+            raise
+
+    def wait(self, timeout: Optional[float] = None):
+        # один робочий потік: порожнє завдання завершиться після всіх поставлених раніше
+        self._executor.submit(lambda: None).result(timeout)
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+
+    def close(self):
+        self._executor.submit(self._close_connection)
+        self._executor.shutdown(wait=False)
+
+
+def slow_query_connection_factory(explainer: SlowQueryExplainer):
+    # psycopg2 створює з'єднання сам, тому налаштування передаються через підклас
+    return type("ConfiguredSlowQueryConnection", (SlowQueryConnection,), {
+        "slow_query_explainer": explainer,
+        "slow_query_ms": explainer.threshold_ms,
+    })
+
+
+# --- MongoDB ---
+
+class SlowFindListener(monitoring.CommandListener):
+    # explain виконується у фоновому потоці, щоб не затримувати запит, який виявився повільним
+    def __init__(self, log: SlowQueryLog, threshold_ms: float, explain_timeout_ms: int = 10000):
+        self.log = log
+        self.threshold_ms = threshold_ms
+        self.explain_timeout_ms = explain_timeout_ms
+        self.client = None
+        self._pending: Dict[Tuple[Any, int], Tuple[str, Dict[str, Any]]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mongo-explain")
+
+    def attach(self, client):
+        self.client = client
+
+    def started(self, event):
+        if event.command_name in MONGO_EXPLAINABLE_COMMANDS:
+            self._pending[(event.connection_id, event.request_id)] = (event.database_name, dict(event.command))
+
+    def succeeded(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None or event.duration_micros < self.threshold_ms * 1000:
+            return
+        database, command = pending
+        normalized = normalize_mongo(event.command_name, command)
+        query_fingerprint = fingerprint(normalized)
+        if self.client is not None and self.log.should_capture(query_fingerprint):
+            self._executor.submit(self._explain, database, event.command_name, command, normalized,
+                                  query_fingerprint, event.duration_micros / 1000)
+
+    def failed(self, event):
+        self._pending.pop((event.connection_id, event.request_id), None)
+
+    def _explain(self, database: str, command_name: str, command: Dict[str, Any], normalized: str,
+                 query_fingerprint: str, elapsed_ms: float):
+        # службові поля сесії й кластера не входять у команду для explain
+        command = {key: value for key, value in command.items()
+                   if not key.startswith("$") and key not in ("lsid", "txnNumber", "apiVersion")}
+        command["maxTimeMS"] = self.explain_timeout_ms
+        entry = {
+            "source": "mongo",
+            "fingerprint": query_fingerprint,
+            "duration_ms": round(elapsed_ms, 3),
+            "threshold_ms": self.threshold_ms,
+            "normalized": normalized[:MAX_LOGGED_QUERY_CHARS],
+            "plan": None,
+        }
+        if self.log.log_raw_queries:
+            entry["query"] = json.dumps(command, ensure_ascii=False, default=str)[:MAX_LOGGED_QUERY_CHARS]
+        try:
+            explain = self.client[database].command({"explain": command, "verbosity": "executionStats"})
+            plan = {key: explain[key] for key in ("queryPlanner", "executionStats", "stages") if key in explain}
+            entry["plan"] = plan if self.log.log_raw_queries else scrub_mongo_plan(plan)
+        except Exception as e:
+            # OperationFailure додає до тексту повну відповідь сервера разом із командою
+            entry["explain_error"] = str(e).split(", full error:")[0]
+        self.log.write(entry)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
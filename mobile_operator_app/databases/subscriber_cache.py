@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+import uuid
+import redis
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from .models import Subscriber
+
+logger = logging.getLogger(__name__)
+
+# Маркер "абонента немає" для негативного кешування
+_MISSING = object()
+_REDIS_MISSING = ""
+# Заглушка в Redis на час завантаження: інвалідація її видаляє, і застарілий рядок не запишеться
+_REDIS_FILLING = "filling:"
+
+
+class SubscriberCache:
+    def __init__(self, redis_client=None, max_size: int = 10000, local_ttl: float = 5.0,
+                 redis_ttl: int = 300, negative_ttl: int = 30, fill_ttl: int = 30):
+        self.redis = redis_client
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.negative_ttl = negative_ttl
+        self.fill_ttl = fill_ttl
+        self.key_prefix = "subscriber:"
+
+        self._local: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+        # RIC -> токен заповнення, що триває; живе лише від промаху до store()
+        self._filling: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._counters = {"local_hits": 0, "redis_hits": 0, "misses": 0, "negative_hits": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _get_local(self, ric: str):
+        with self._lock:
+            item = self._local.get(ric)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._local[ric]
+                return None
+            self._local.move_to_end(ric)
+            return value
+
+    def _put_local(self, ric: str, value, ttl: float):
+        with self._lock:
+            self._local[ric] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(ric)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    def get(self, ric: str, loader: Callable[[str], Optional[Subscriber]]) -> Optional[Subscriber]:
+        found, subscriber = self.lookup(ric)
+        if found:
+            return subscriber
+
+        token = self.reserve(ric)
+        subscriber = loader(ric)
+        self.store(ric, subscriber, token)
+        return subscriber
+
+    def lookup(self, ric: str) -> Tuple[bool, Optional[Subscriber]]:
+        # (знайдено, абонент): None з found=True — закешована відсутність абонента
+        value = self._get_local(ric)
+        if value is not None:
+            self._count("negative_hits" if value is _MISSING else "local_hits")
+            return True, None if value is _MISSING else value
+
+        if self.redis is not None:
+            try:
+                cached = self.redis.get(self.key_prefix + ric)
+            except Exception as e:
+                logger.error("Error reading subscriber cache: %s", e)
+                cached = None
+            if cached is not None and not cached.startswith(_REDIS_FILLING):
+                if cached == _REDIS_MISSING:
+                    self._count("negative_hits")
+                    self._put_local(ric, _MISSING, min(self.local_ttl, self.negative_ttl))
+                    return True, None
+                subscriber = Subscriber.model_validate_json(cached)
+                self._count("redis_hits")
+                self._put_local(ric, subscriber, self.local_ttl)
+                return True, subscriber
+
+        self._count("misses")
+        return False, None
+
+    def reserve(self, ric: str) -> str:
+        # викликається після промаху й до читання з БД; invalidate() між ними скасовує токен
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._filling[ric] = token
+        if self.redis is not None:
+            try:
+                self.redis.set(self.key_prefix + ric, _REDIS_FILLING + token, nx=True, ex=self.fill_ttl)
+            except Exception as e:
+                logger.error("Error reserving subscriber cache: %s", e)
+        return token
+
+    def store(self, ric: str, subscriber: Optional[Subscriber], token: str) -> bool:
+        # False — поки рядок читався, абонента змінили, і закешувати його вже не можна
+        with self._lock:
+            current = self._filling.get(ric)
+            if current == token:
+                del self._filling[ric]
+        stored = current == token
+
+        if subscriber is None:
+            local, local_ttl = _MISSING, min(self.local_ttl, self.negative_ttl)
+            payload, ttl = _REDIS_MISSING, self.negative_ttl
+        else:
+            local, local_ttl = subscriber, self.local_ttl
+            payload, ttl = subscriber.model_dump_json(), self.redis_ttl
+
+        if self.redis is not None:
+            # у Redis пишемо, лише якщо там досі наша заглушка: інвалідація з будь-якого процесу її видаляє
+            try:
+                stored = self._replace_placeholder(ric, token, payload, ttl)
+            except Exception as e:
+                # Redis недоступний: лишається перевірка токена локального шару
+                logger.error("Error writing subscriber cache: %s", e)
+
+        if stored:
+            self._put_local(ric, local, local_ttl)
+        return stored
+
+    def _replace_placeholder(self, ric: str, token: str, payload: str, ttl: int) -> bool:
+        key = self.key_prefix + ric
+        with self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) != _REDIS_FILLING + token:
+                    return False
+                pipe.multi()
+                pipe.set(key, payload, ex=ttl)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def invalidate(self, rics: Iterable[str]):
+        rics = list(rics)
+        with self._lock:
+            for ric in rics:
+                self._local.pop(ric, None)
+                self._filling.pop(ric, None)
+        if self.redis is not None and rics:
+            self.redis.delete(*(self.key_prefix + ric for ric in rics))
+
+    def apply_subscriber_changes(self, changes: List[Tuple[str, Optional[dict]]]):
+        # інвалідуємо, а не перезаписуємо: наступне читання підтягне актуальний рядок
+        self.invalidate(ric for ric, _ in changes)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+            self._filling.clear()
+        if self.redis is not None:
+            keys = list(self.redis.scan_iter(match=self.key_prefix + "*", count=1000))
+            for i in range(0, len(keys), 1000):
+                self.redis.delete(*keys[i:i + 1000])
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["local_size"] = len(self._local)
+        lookups = counters["local_hits"] + counters["redis_hits"] + counters["negative_hits"] + counters["misses"]
+        counters["hit_ratio"] = round((lookups - counters["misses"]) / lookups, 3) if lookups else 0.0
+        return counters
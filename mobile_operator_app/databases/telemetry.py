@@ -0,0 +1,390 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "mobile_operator"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# службові методи менеджерів: не звертаються до бази або повертають контекст-менеджер
+SKIP_METHODS = frozenset({
+    "connection", "add_change_listener", "enable_subscriber_cache", "enable_columns_cache",
+    "pool_stats", "statement_stats", "stats",
+})
+
+# поточний рендер сторінки і поточний виклик менеджера; contextvars переходять і в задачі
+# async-шару, бо run_coroutine_threadsafe запускає їх з копією контексту викликача
+_render = contextvars.ContextVar("telemetry_render", default=None)
+_call = contextvars.ContextVar("telemetry_call", default=None)
+
+# збирач метрик: назва метрики -> [(мітки, значення)]
+Collector = Callable[[], Dict[str, List[Tuple[Dict[str, str], float]]]]
+
+
+def payload_size(result: Any) -> Tuple[Optional[int], Optional[int]]:
+    # (рядки, байти) результату; байти рахуються лише там, де це дешево
+    if isinstance(result, tuple) and result and isinstance(result[0], pd.DataFrame):
+        result = result[0]
+    if result is None:
+        return 0, 0
+    if isinstance(result, pd.DataFrame):
+        return len(result), int(result.memory_usage(index=False).sum())
+    if isinstance(result, dict) and result and all(isinstance(v, np.ndarray) for v in result.values()):
+        return len(next(iter(result.values()))), int(sum(v.nbytes for v in result.values()))
+    if isinstance(result, (bytes, str)):
+        return 1, len(result)
+    if isinstance(result, (list, tuple, dict, set)):
+        return len(result), None
+    return None, None
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class _MethodStats:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.errors = 0
+        self.rows = 0
+        self.bytes = 0
+
+
+class _ErrorLogHandler(logging.Handler):
+    # помилки, які менеджери логують і не прокидають далі
+    def __init__(self, telemetry: "Telemetry"):
+        super().__init__(logging.WARNING)
+        self.telemetry = telemetry
+
+    def emit(self, record: logging.LogRecord):
+        self.telemetry.record_logged_error(record)
+
+
+class Telemetry:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS, max_calls: int = 5000, max_renders: int = 50):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._methods: Dict[Tuple[str, str], _MethodStats] = {}
+        self._logged_errors: Dict[str, int] = {}
+        self._calls: "deque[dict]" = deque(maxlen=max_calls)
+        self._renders: "deque[dict]" = deque(maxlen=max_renders)
+        self._collectors: List[Collector] = []
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    # --- підключення ---
+
+    def instrument(self, manager, component: str, skip: Iterable[str] = SKIP_METHODS):
+        # обгортки ставляться на екземпляр, тож клас і інші екземпляри лишаються без змін
+        skip = set(skip)
+        for name, member in inspect.getmembers(type(manager)):
+            if name.startswith("_") or name in skip or not inspect.isfunction(member):
+                continue
+            setattr(manager, name, self._wrap(getattr(manager, name), component, name))
+        return manager
+
+    def attach_logging(self, logger_name: str = "databases"):
+        target = logging.getLogger(logger_name)
+        if not any(isinstance(h, _ErrorLogHandler) and h.telemetry is self for h in target.handlers):
+            target.addHandler(_ErrorLogHandler(self))
+
+    def add_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def add_stats(self, name: str, stats: Callable[[], Dict[str, float]], **labels: str):
+        # кожне числове поле stats() стає окремою метрикою <name>_<поле>
+        def collect():
+            return {f"{name}_{key}": [(labels, value)] for key, value in stats().items()
+                    if isinstance(value, (int, float))}
+        self.add_collector(collect)
+
+    def begin_render(self, page: str) -> str:
+        render_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._renders.append({"render_id": render_id, "page": page, "started_at": datetime.now()})
+        _render.set(render_id)
+        return render_id
+
+    # --- обгортки ---
+
+    def _wrap(self, method: Callable, component: str, name: str) -> Callable:
+        if inspect.isasyncgenfunction(method):
+            @functools.wraps(method)
+            async def async_gen_wrapper(*args, **kwargs):
+                if _call.get() is not None and _call.get()["component"] == component:
+                    async for item in method(*args, **kwargs):
+                        yield item
+                    return
+                # контекст виклику не тримаємо між кроками: між ними виконується код викликача
+                call, token = self._start(component, name)
+                _call.reset(token)
+                generator = method(*args, **kwargs)
+                rows = 0
+                try:
+                    async for item in generator:
+                        rows += 1
+                        yield item
+                except Exception as e:
+                    self._finish(call, error=e, rows=rows)
+                    raise
+                finally:
+                    await generator.aclose()
+                    if "duration" not in call:
+                        self._finish(call, rows=rows)
+            return async_gen_wrapper
+
+        if inspect.isgeneratorfunction(method):
+            @functools.wraps(method)
+            def gen_wrapper(*args, **kwargs):
+                if _call.get() is not None and _call.get()["component"] == component:
+                    return method(*args, **kwargs)
+                call, token = self._start(component, name)
+                _call.reset(token)
+                return self._wrap_generator(method(*args, **kwargs), call)
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def async_wrapper(*args, **kwargs):
+                if _call.get() is not None and _call.get()["component"] == component:
+                    return await method(*args, **kwargs)
+                call, token = self._start(component, name)
+                try:
+                    result = await method(*args, **kwargs)
+                except Exception as e:
+                    self._finish(call, error=e)
+                    raise
+                finally:
+                    _call.reset(token)
+                self._finish(call, result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            # вкладені виклики того ж менеджера входять у час зовнішнього
+            if _call.get() is not None and _call.get()["component"] == component:
+                return method(*args, **kwargs)
+            call, token = self._start(component, name)
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                self._finish(call, error=e)
+                raise
+            finally:
+                _call.reset(token)
+            if inspect.isgenerator(result):
+                return self._wrap_generator(result, call)
+            self._finish(call, result)
+            return result
+        return wrapper
+
+    def _wrap_generator(self, generator, call: dict):
+        # час потокового читання рахується до вичерпання або закриття ітератора
+        # і включає обробку рядків викликачем між кроками
+        rows = 0
+        try:
+            for item in generator:
+                rows += 1
+                yield item
+        except Exception as e:
+            self._finish(call, error=e, rows=rows)
+            raise
+        finally:
+            # ранній вихід викликача закриває й вкладений генератор разом з його курсором
+            generator.close()
+            if "duration" not in call:
+                self._finish(call, rows=rows)
+
+    def _start(self, component: str, name: str) -> Tuple[dict, contextvars.Token]:
+        call = {
+            "render_id": _render.get(),
+            "component": component,
+            "method": name,
+            "started_at": datetime.now(),
+            "logged_errors": [],
+            "_started": time.perf_counter(),
+        }
+        return call, _call.set(call)
+
+    def _finish(self, call: dict, result: Any = None, error: Optional[BaseException] = None,
+                rows: Optional[int] = None):
+        call["duration"] = time.perf_counter() - call.pop("_started")
+        if error is not None:
+            call["rows"], call["bytes"] = None, None
+        elif rows is not None:
+            call["rows"], call["bytes"] = rows, None
+        else:
+            call["rows"], call["bytes"] = payload_size(result)
+        call["error"] = type(error).__name__ if error is not None else None
+        self.record(call)
+
+    def record(self, call: dict):
+        key = (call["component"], call["method"])
+        with self._lock:
+            stats = self._methods.get(key)
+            if stats is None:
+                stats = self._methods[key] = _MethodStats(self.buckets)
+            stats.buckets[bisect.bisect_left(self.buckets, call["duration"])] += 1
+            stats.count += 1
+            stats.seconds += call["duration"]
+            stats.errors += 1 if call["error"] else 0
+            stats.rows += call["rows"] or 0
+            stats.bytes += call["bytes"] or 0
+            self._calls.append(call)
+
+    def record_logged_error(self, record: logging.LogRecord):
+        with self._lock:
+            self._logged_errors[record.name] = self._logged_errors.get(record.name, 0) + 1
+        call = _call.get()
+        if call is not None:
+            call["logged_errors"].append(record.getMessage())
+
+    # --- читання ---
+
+    def renders(self) -> List[dict]:
+        with self._lock:
+            return list(reversed(self._renders))
+
+    def calls(self, render_id: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            calls = list(self._calls)
+        if render_id is not None:
+            calls = [call for call in calls if call["render_id"] == render_id]
+        return calls
+
+    def slowest_calls(self, render_id: Optional[str] = None, limit: int = 20) -> List[dict]:
+        return sorted(self.calls(render_id), key=lambda call: call["duration"], reverse=True)[:limit]
+
+    def method_stats(self) -> List[dict]:
+        with self._lock:
+            items = [(key, stats.count, stats.seconds, stats.errors, stats.rows, stats.bytes, list(stats.buckets))
+                     for key, stats in self._methods.items()]
+        result = []
+        for (component, method), count, seconds, errors, rows, nbytes, buckets in items:
+            result.append({
+                "component": component,
+                "method": method,
+                "calls": count,
+                "errors": errors,
+                "mean_ms": round(seconds / count * 1000, 3) if count else 0.0,
+                "p50_ms": self._quantile_ms(buckets, count, 0.50),
+                "p99_ms": self._quantile_ms(buckets, count, 0.99),
+                "rows": rows,
+                "bytes": nbytes,
+            })
+        return sorted(result, key=lambda item: item["mean_ms"] * item["calls"], reverse=True)
+
+    def _quantile_ms(self, buckets: List[int], count: int, q: float) -> Optional[float]:
+        # верхня межа кошика гістограми, як histogram_quantile без інтерполяції
+        if not count:
+            return None
+        rank, seen = q * count, 0
+        for bound, bucket_count in zip(self.buckets, buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return bound * 1000
+        return None
+
+    def logged_errors(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._logged_errors)
+
+    # --- Prometheus ---
+
+    def render_prometheus(self) -> str:
+        name = f"{METRIC_PREFIX}_db_call"
+        lines = [
+            f"# HELP {name}_duration_seconds Latency of data layer manager calls.",
+            f"# TYPE {name}_duration_seconds histogram",
+        ]
+        with self._lock:
+            methods = [(key, list(stats.buckets), stats.count, stats.seconds, stats.errors, stats.rows, stats.bytes)
+                       for key, stats in sorted(self._methods.items())]
+            logged_errors = sorted(self._logged_errors.items())
+
+        totals = {"errors": [], "rows": [], "payload_bytes": []}
+        for (component, method), buckets, count, seconds, errors, rows, nbytes in methods:
+            labels = {"component": component, "method": method}
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, buckets):
+                cumulative += bucket_count
+                lines.append(f"{name}_duration_seconds_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_duration_seconds_bucket{_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{name}_duration_seconds_sum{_labels(labels)} {seconds}")
+            lines.append(f"{name}_duration_seconds_count{_labels(labels)} {count}")
+            totals["errors"].append((labels, errors))
+            totals["rows"].append((labels, rows))
+            totals["payload_bytes"].append((labels, nbytes))
+
+        for total, samples in totals.items():
+            lines.append(f"# TYPE {name}_{total}_total counter")
+            lines.extend(f"{name}_{total}_total{_labels(labels)} {value}" for labels, value in samples)
+
+        lines.append(f"# TYPE {METRIC_PREFIX}_logged_errors_total counter")
+        lines.extend(f"{METRIC_PREFIX}_logged_errors_total{_labels({'logger': logger_name})} {count}"
+                     for logger_name, count in logged_errors)
+
+        # кілька збирачів можуть віддавати одну метрику з різними мітками,
+        # а формат вимагає, щоб усі її рядки йшли одним блоком
+        gauges: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+        for collector in self._collectors:
+            try:
+                metrics = collector()
+            except Exception as e:
+                logger.warning("Error collecting metrics: %s", e)
+                continue
+            for metric, samples in metrics.items():
+                gauges.setdefault(f"{METRIC_PREFIX}_{metric}", []).extend(samples)
+        for metric, samples in gauges.items():
+            lines.append(f"# TYPE {metric} gauge")
+            lines.extend(f"{metric}{_labels(labels)} {float(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        # окремий HTTP-сервер у фоновому потоці: /metrics не залежить від рендерів Streamlit
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        return self._server
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
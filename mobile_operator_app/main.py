@@ -1,22 +1,94 @@
 import streamlit as st
+import os
 import time
 import random
-from datetime import date, timedelta
+import logging
 from databases import PostgresManager, MongoManager, RedisManager
-from databases.models import Subscriber
+from databases.generators import make_subscriber
+from databases.subscriber_cache import SubscriberCache
+from databases.result_cache import ColumnsResultCache
+from databases.async_facade import AsyncDataFacade
+from databases.change_stream import ChangeStreamPublisher, ChangeStreamConsumer
+from databases.jobs import JobQueue, JobWorker, report_handlers
+from databases.telemetry import Telemetry
 
 st.set_page_config(page_title="CourseWork", layout="wide")
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
 
 @st.cache_resource
-def get_db_connections():
+def get_telemetry():
+    telemetry = Telemetry()
+    telemetry.attach_logging("databases")
+    telemetry.attach_logging(__name__)
+    port = int(os.getenv("METRICS_PORT", 9108))
+    if port:
+        try:
+            telemetry.serve(port)
+        except OSError as e:
+            # порт зайнятий іншим процесом Streamlit: метрики лишаються на сторінці діагностики
+            logger.error("Error starting metrics endpoint on port %s: %s", port, e)
+    return telemetry
+telemetry = get_telemetry()
+
+@st.cache_resource
+def get_db_connections(_telemetry):
     try:
-        pg = PostgresManager()
-        mongo = MongoManager()
-        redis = RedisManager()
-        return pg, mongo, redis
+        # обгортки ставимо до підписок, щоб інвалідація кешів теж потрапляла в таймінги
+        pg = _telemetry.instrument(PostgresManager(), "postgres")
+        mongo = _telemetry.instrument(MongoManager(), "mongo")
+        redis = _telemetry.instrument(RedisManager(), "redis")
+        # з потоком змін запис лише публікує подію, а кеші оновлює фоновий споживач пачками
+        events = pg
+        change_stream = None
+        if os.getenv("CHANGE_STREAM", "1") != "0":
+            publisher = ChangeStreamPublisher(redis.r)
+            pg.add_change_listener(publisher.publish, publisher.publish_reset)
+            events = change_stream = ChangeStreamConsumer(redis.r)
+        events.add_change_listener(redis.apply_subscriber_changes, redis.clear_cache)
+        pg.enable_subscriber_cache(SubscriberCache(redis.r), events)
+        pg.enable_columns_cache(ColumnsResultCache(redis.r), events)
+        _telemetry.add_stats("pg_pool", pg.pool_stats)
+        _telemetry.add_stats("pg_statements", pg.statement_stats)
+        _telemetry.add_stats("cache", pg.subscriber_cache.stats, cache="subscriber")
+        _telemetry.add_stats("cache", pg.columns_cache.stats, cache="columns")
+        _telemetry.add_stats("cache", redis.stats, cache="debtors")
+        if pg.slow_queries is not None:
+            _telemetry.add_stats("slow_queries", pg.slow_queries.stats)
+        if change_stream is not None:
+            _telemetry.add_stats("change_stream", change_stream.stats)
+            change_stream.start()
+        return pg, mongo, redis, change_stream
     except Exception as e:
         return None, None, None, str(e)
-pg_db, mongo_db, redis_db = get_db_connections()
+pg_db, mongo_db, redis_db, change_stream = get_db_connections(telemetry)
+
+@st.cache_resource
+def get_async_facade(_telemetry, _subscriber_cache, _columns_cache, change_stream=False):
+    # async-шар потрібен лише сторінкам, що читають з кількох баз одночасно;
+    # без нього вони працюють через синхронні менеджери
+    try:
+        facade = AsyncDataFacade(change_stream=change_stream).start()
+        _telemetry.instrument(facade.pg, "async_postgres")
+        _telemetry.instrument(facade.mongo, "async_mongo")
+        _telemetry.instrument(facade.redis, "async_redis")
+        # пошук абонента й вибірка колонок читають ті самі кеші, що й синхронний менеджер
+        facade.pg.enable_subscriber_cache(_subscriber_cache)
+        facade.pg.enable_columns_cache(_columns_cache)
+        return facade
+    except Exception as e:
+        logger.error("Error starting async data layer: %s", e)
+        return None
+
+@st.cache_resource
+def get_jobs(_telemetry, _pg, _redis):
+    # звіти рахує фоновий воркер, а сторінка лише ставить завдання і стежить за прогресом
+    queue = JobQueue(_redis.r, _redis.r_raw)
+    workers = int(os.getenv("JOB_WORKERS", 2))
+    if workers > 0:
+        worker = JobWorker(queue, report_handlers(_pg, _redis), concurrency=workers).start()
+        _telemetry.add_stats("jobs", worker.stats)
+    return queue
 
 if isinstance(pg_db, tuple) or pg_db is None:
     st.error("Не вдалося підключитися до баз даних! Перевірте Docker.")
@@ -24,42 +96,36 @@ if isinstance(pg_db, tuple) or pg_db is None:
 st.session_state['pg_db'] = pg_db
 st.session_state['mongo_db'] = mongo_db
 st.session_state['redis_db'] = redis_db
+st.session_state['telemetry'] = telemetry
+st.session_state['jobs'] = get_jobs(telemetry, pg_db, redis_db)
+st.session_state['async_db'] = get_async_facade(telemetry, pg_db.subscriber_cache, pg_db.columns_cache,
+                                                change_stream=change_stream is not None)
+telemetry.begin_render("Головна")
 
 st.success("Всі бази даних підключено (Postgres, Mongo, Redis)")
 
 def generate_test_data():
     pg_manager = st.session_state['pg_db']
     
-    models = ["iPhone 13", "Samsung S21", "Xiaomi Redmi 9", "Nokia 3310", "Pixel 7"]
-    names = ["Шевченко", "Бойко", "Шпак", "Мельник", "Ткаченко"]
-    services = ["Преміум", "Стандарт", "Економ", "Студент"]
-    
-    count = 0
+    subscribers = []
     errors = []
 
     for i in range(1, 6):
         ric = f"RIC-{random.randint(10000, 99999)}"
         try:
-            subscriber = Subscriber(
-                ric=ric,
-                pin_code=str(random.randint(1000, 9999)),
-                full_name=f"{random.choice(names)} {random.choice(names)[0]}.",
-                phone_model=random.choice(models),
-                phone_type="Смартфон",
-                service_type=random.choice(services),
-                contract_start_date=date.today() - timedelta(days=random.randint(100, 1000)),
-                contract_duration_months=12,
-                monthly_fee=float(random.choice([150, 250, 500])),
-                is_active=random.choice([True, True, False]),
-                last_payment_date=date.today() - timedelta(days=random.randint(0, 60))
-            )
-            pg_manager.add_subscriber(subscriber) 
-            count += 1
+            subscribers.append(make_subscriber(random, ric))
+        except Exception as e:
+            errors.append(str(e))
+
+    if subscribers:
+        try:
+            result = pg_manager.bulk_add_subscribers(subscribers)
+            if result["inserted"] > 0:
+                st.success(f"✅ Додано {result['inserted']} нових абонентів!")
+            if result["skipped"] > 0:
+                st.info(f"Пропущено дублікатів RIC: {result['skipped']}")
         except Exception as e:
             errors.append(str(e))
-            
-    if count > 0:
-        st.success(f"✅ Додано {count} нових абонентів!")
     
     if errors:
         st.error("⚠️ Помилки:")
@@ -69,13 +135,9 @@ def generate_test_data():
 
 def clear_all_data():
     pg_manager = st.session_state['pg_db']
-    redis_manager = st.session_state['redis_db']
     try:
-
-        with pg_manager.connection.cursor() as cursor:
-            cursor.execute("TRUNCATE TABLE subscribers;")
-
-        redis_manager.clear_cache()
+        # кеші Redis очищують підписники на подію очищення таблиці
+        pg_manager.clear_subscribers()
         st.toast("Бази даних очищено", icon="🧹")
         time.sleep(1)
     except Exception as e:
@@ -90,4 +152,28 @@ with st.sidebar:
     
     if st.button("Видалити всіх", type="primary"):
         clear_all_data()
-        st.rerun()
\ No newline at end of file
+        st.rerun()
+
+    st.divider()
+
+    with st.expander("Пул з'єднань Postgres"):
+        stats = pg_db.pool_stats()
+        st.metric("Завантаженість", f"{stats['utilization'] * 100:.0f}%",
+                  help=f"{stats['in_use']} з {stats['max_size']} з'єднань зайнято")
+        st.caption(f"Очікування: сер. {stats['avg_wait_ms']} мс, макс. {stats['max_wait_ms']} мс")
+        st.caption(f"Видано з'єднань: {stats['checkouts']} | Перепідключень: {stats['reconnects']}")
+
+    if pg_db.subscriber_cache is not None:
+        with st.expander("Кеш пошуку абонентів"):
+            cache_stats = pg_db.subscriber_cache.stats()
+            st.metric("Влучання", f"{cache_stats['hit_ratio'] * 100:.0f}%")
+            st.caption(f"Локально: {cache_stats['local_hits']} | Redis: {cache_stats['redis_hits']} | "
+                       f"Негативні: {cache_stats['negative_hits']} | Промахи: {cache_stats['misses']}")
+
+    if change_stream is not None:
+        with st.expander("Потік змін"):
+            stream_stats = change_stream.stats()
+            st.metric("Затримка", f"{stream_stats['lag_ms']:.0f} мс",
+                      help=f"Максимальна: {stream_stats['max_lag_ms']:.0f} мс")
+            st.caption(f"Подій: {stream_stats['events']} | Пачок: {stream_stats['batches']} | "
+                       f"Очікують: {stream_stats.get('pending', '—')} | Помилок: {stream_stats['errors']}")
@@ -2,6 +2,9 @@ import streamlit as st
 import pandas as pd
 from datetime import date
 from databases.models import Subscriber
+from databases.mongo_db import HISTORY_FIELDS
+from databases.profiles import build_profiles
+from databases.jobs import JOB_DONE, JOB_FAILED, JOB_FINISHED, REPORT_TARIFFS
 import time
 
 if 'pg_db' not in st.session_state or st.session_state['pg_db'] is None:
@@ -9,6 +12,12 @@ if 'pg_db' not in st.session_state or st.session_state['pg_db'] is None:
     st.stop()
 
 pg_db = st.session_state['pg_db']
+mongo_db = st.session_state.get('mongo_db')
+async_db = st.session_state.get('async_db')
+jobs = st.session_state['jobs']
+telemetry = st.session_state.get('telemetry')
+if telemetry is not None:
+    telemetry.begin_render("Абоненти")
 
 st.set_page_config(page_title="Абоненти", page_icon="👤", layout="wide")
 c1, c2 = st.columns([5, 1])
@@ -18,30 +27,75 @@ with c2:
     if st.button("🔄 Оновити", type="primary"):
         st.rerun()
 
-search_ric = st.text_input("🔍 Пошук по RIC:", placeholder="RIC-...")
+search_ric = st.text_input("🔍 Пошук (RIC, ПІБ або модель телефону):", placeholder="RIC-... / Шевченко / iPhone")
+
+if 'abonents_page_cursors' not in st.session_state:
+    st.session_state['abonents_page_cursors'] = [None]
 
 try:
+    has_next = False
     if search_ric:
-        found_sub = pg_db.get_subscriber(search_ric)
-        data = [found_sub.model_dump()] if found_sub else []
-        if not data:
-            st.warning(f"Абонента з номером '{search_ric}' не знайдено.")
+        # ранжований пошук: префікс RIC, схожість ПІБ і моделі телефону
+        df = pg_db.search_subscribers(search_ric, limit=50)
+        if df.empty:
+            st.warning(f"За запитом '{search_ric}' нічого не знайдено.")
     else:
-        subscribers = pg_db.get_all_subscribers()
-        data = [s.model_dump() for s in subscribers]
-    if data:
-        df = pd.DataFrame(data)
-        st.dataframe(df, width='stretch')
-        st.caption(f"Всього записів: {len(data)}")
+        page_size = st.session_state.get('abonents_page_size', 50)
+        cursors = st.session_state['abonents_page_cursors']
+        # беремо на один запис більше, щоб знати, чи є наступна сторінка
+        df = pg_db.get_subscribers_frame(after_ric=cursors[-1], limit=page_size + 1)
+        has_next = len(df) > page_size
+        df = df.iloc[:page_size]
+    if not df.empty:
+        if search_ric:
+            st.dataframe(df, width='stretch', column_config={
+                "score": st.column_config.ProgressColumn("Збіг", min_value=0.0, max_value=1.0, format="%.2f")})
+            st.caption(f"Всього записів: {len(df)}")
+        else:
+            st.dataframe(df, width='stretch')
+            page_number = len(st.session_state['abonents_page_cursors'])
+            st.caption(f"Сторінка {page_number} | Записів на сторінці: {len(df)}")
     else:
         st.info("База даних порожня")
 
+    if not search_ric:
+        p1, p2, p3 = st.columns([1, 1, 4])
+        with p1:
+            if st.button("◀ Назад", disabled=len(st.session_state['abonents_page_cursors']) == 1):
+                st.session_state['abonents_page_cursors'].pop()
+                st.rerun()
+        with p2:
+            if st.button("Далі ▶", disabled=not has_next):
+                st.session_state['abonents_page_cursors'].append(df['ric'].iloc[-1])
+                st.rerun()
+        with p3:
+            st.selectbox("Записів на сторінці", [25, 50, 100, 200], index=1,
+                         key='abonents_page_size',
+                         on_change=lambda: st.session_state.update(abonents_page_cursors=[None]))
+
 except Exception as e:
     st.error(f"Помилка завантаження таблиці: {e}")
 
+with st.expander("📤 Експорт колонок"):
+    export_columns = st.multiselect(
+        "Колонки", ["ric", "full_name", "phone_model", "service_type", "monthly_fee",
+                    "contract_start_date", "is_active", "last_payment_date"],
+        default=["ric", "full_name", "service_type", "monthly_fee"]
+    )
+    if export_columns and st.toggle("Підготувати файл", key="export_prepare"):
+        try:
+            # повторний експорт тих самих колонок береться з кешу, доки таблиця не змінилась
+            arrays = pg_db.get_custom_columns(export_columns)
+            export_df = pd.DataFrame({col: arrays[col] for col in export_columns if col in arrays})
+            st.caption(f"Рядків: {len(export_df)}")
+            st.download_button("⬇️ Завантажити CSV", export_df.to_csv(index=False).encode("utf-8"),
+                               file_name="subscribers_export.csv", mime="text/csv")
+        except Exception as e:
+            st.error(f"Помилка експорту: {e}")
+
 
 st.divider()
-tab_add, tab_edit, tab_anal = st.tabs(["➕ Додати нового", "✏️ Керування", "📈 Аналітика"])
+tab_add, tab_edit, tab_profile, tab_anal = st.tabs(["➕ Додати нового", "✏️ Керування", "🪪 Профіль", "📈 Аналітика"])
 if 'edit_subscriber_ric' not in st.session_state:
     st.session_state['edit_subscriber_ric'] = ""
 if 'subscriber_to_edit' not in st.session_state:
@@ -173,22 +227,84 @@ with tab_edit:
                 st.error(f"Помилка при видаленні: {e}")
     else:
         st.info("Введіть RIC та натисніть 'Знайти', щоб завантажити дані для керування.")
+with tab_profile:
+    st.subheader("Профіль абонента")
+    profile_input = st.text_input("RIC абонентів (через кому):", placeholder="RIC-1001, RIC-1002",
+                                  key="profile_rics_input")
+    profile_rics = list(dict.fromkeys(r.strip() for r in profile_input.split(",") if r.strip()))
+    if profile_rics:
+        try:
+            if async_db is not None:
+                profiles = async_db.run(async_db.get_subscriber_profiles(profile_rics))
+            else:
+                profiles = build_profiles(
+                    profile_rics,
+                    pg_db.get_subscribers(profile_rics),
+                    mongo_db.get_requests_by_rics(profile_rics, fields=HISTORY_FIELDS)
+                )
+            for ric, profile in profiles.items():
+                if profile is None:
+                    st.warning(f"Абонента з RIC '{ric}' не знайдено.")
+                    continue
+                sub = profile.subscriber
+                with st.container(border=True):
+                    st.markdown(f"### {sub.full_name} `{sub.ric}`")
+                    m1, m2, m3, m4 = st.columns(4)
+                    m1.metric("Тариф", sub.service_type, f"{sub.monthly_fee:.2f} грн/міс", delta_color="off")
+                    m2.metric("Статус", "Активний" if sub.is_active else "Неактивний")
+                    m3.metric("Відкритих заявок", profile.open_requests)
+                    m4.metric("Борг, грн", f"{profile.debt_amount:,.2f}",
+                              f"{profile.days_overdue} дн." if profile.days_overdue else None,
+                              delta_color="inverse")
+                    st.caption(f"Пристрій: {sub.phone_model} | Остання оплата: {sub.last_payment_date or '-'}")
+                    if profile.requests:
+                        st.dataframe(pd.DataFrame(profile.requests), width='stretch', hide_index=True)
+                    else:
+                        st.caption("Заявок не було.")
+        except Exception as e:
+            st.error(f"Помилка завантаження профілю: {e}")
+    else:
+        st.info("Введіть один або кілька RIC, щоб побачити дані абонента, заявки та борг разом.")
+
 with tab_anal:
     st.subheader("Фінансова статистика")
     
-    if st.button("📊 Розрахувати дохідність"):
-        try:
-            stats = pg_db.get_tariff_analytics()
-            if stats:
-                df_stats = pd.DataFrame(stats)
-                
-                df_stats["total_revenue"] = df_stats["total_revenue"].astype(float)
-                df_stats["avg_check"] = df_stats["avg_check"].astype(float)
+    c_run, c_rebuild = st.columns([1, 3])
+    with c_run:
+        if st.button("📊 Розрахувати дохідність"):
+            st.session_state['tariff_job'] = jobs.submit(REPORT_TARIFFS)
+    with c_rebuild:
+        if st.button("♻️ Перерахувати статистику з нуля",
+                     help="Якщо цифри розійшлися з даними абонентів. На час перерахунку записи чекають."):
+            st.session_state['tariff_job'] = jobs.submit(REPORT_TARIFFS, {"rebuild": True})
 
-                c_a1, c_a2 = st.columns(2)
-                with c_a1:
-                    st.dataframe(df_stats, width='stretch')
-            else:
-                st.info("Недостатньо даних.")
-        except Exception as e:
-            st.error(f"Помилка аналітики: {e}")
\ No newline at end of file
+    @st.fragment(run_every=1)
+    def tariff_job_progress(job_id):
+        job = jobs.status(job_id)
+        if job is None or job['status'] in JOB_FINISHED:
+            st.rerun()
+        st.progress(job['progress'], text=job['message'] or "Розрахунок у черзі...")
+
+    job_id = st.session_state.get('tariff_job')
+    job = jobs.status(job_id) if job_id else None
+    result = jobs.result(job_id) if job and job['status'] == JOB_DONE else None
+    if job and job['status'] not in JOB_FINISHED:
+        tariff_job_progress(job_id)
+    elif job and job['status'] == JOB_FAILED:
+        st.error(f"Помилка аналітики: {job['error']}")
+    elif job_id and result is None:
+        st.warning("Результат розрахунку більше не зберігається. Запустіть його ще раз.")
+    elif result is not None:
+        df_stats, df_history = result['stats'], result['history']
+        st.caption(f"Завдання {job_id} | Сформовано: {job['finished_at']}")
+        if not df_stats.empty:
+
+            c_a1, c_a2 = st.columns(2)
+            with c_a1:
+                st.dataframe(df_stats, width='stretch')
+            with c_a2:
+                if not df_history.empty:
+                    st.caption("Щомісячний дохід за місяцем початку контракту")
+                    st.bar_chart(df_history, x="month", y="total_revenue", color="service_type")
+        else:
+            st.info("Недостатньо даних.")
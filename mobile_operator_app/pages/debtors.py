@@ -1,35 +1,59 @@
 import streamlit as st
 import pandas as pd
 import time
+from databases.jobs import JOB_DONE, JOB_FAILED, JOB_FINISHED, REPORT_DEBTORS
 if 'pg_db' not in st.session_state or 'redis_db' not in st.session_state:
     st.error("На головну сторінку, щоб ініціалізувати систему.")
     st.stop()
 pg_db = st.session_state['pg_db']
 redis_db = st.session_state['redis_db']
+jobs = st.session_state['jobs']
+telemetry = st.session_state.get('telemetry')
+if telemetry is not None:
+    telemetry.begin_render("Боржники")
 st.set_page_config(page_title="Боржники", page_icon="💸")
 st.title("💸 Звіт по боржниках")
 st.info("показує абонентів, у яких остання оплата була більше 1 місяця")
+st.caption("Кеш оновлюється автоматично при кожній зміні абонента.")
 col_report, col_admin = st.columns([3, 1])
 
 with col_report:
     st.subheader("Генерація звіту")
     
     if st.button("🔄 Згенерувати звіт", type="primary"):
-        debtors = redis_db.get_cached_debtors()
-        if not debtors:
-            with st.spinner("Отримання даних..."):
-                debtors = pg_db.get_debtors_raw() 
-                redis_db.cache_debtors(debtors)
-        if debtors:
+        # звіт рахує фоновий воркер; повторне натискання повертає те саме завдання
+        st.session_state['debtors_job'] = jobs.submit(REPORT_DEBTORS)
+
+    @st.fragment(run_every=1)
+    def debtors_job_progress(job_id):
+        job = jobs.status(job_id)
+        if job is None or job['status'] in JOB_FINISHED:
+            st.rerun()
+        st.progress(job['progress'], text=job['message'] or "Звіт у черзі...")
+
+    job_id = st.session_state.get('debtors_job')
+    job = jobs.status(job_id) if job_id else None
+    result = jobs.result(job_id) if job and job['status'] == JOB_DONE else None
+    if job and job['status'] not in JOB_FINISHED:
+        debtors_job_progress(job_id)
+    elif job and job['status'] == JOB_FAILED:
+        st.error(f"Помилка формування звіту: {job['error']}")
+    elif job_id and result is None:
+        st.warning("Результат звіту більше не зберігається. Згенеруйте його ще раз.")
+    elif result is not None:
+        df = result['debtors']
+        if job['message']:
+            st.info(job['message'])
+        st.caption(f"Завдання {job_id} | Сформовано: {job['finished_at']}")
+        if not df.empty:
             st.success("✅ Звіт успішно згенеровано.")
-            data = [d.model_dump() for d in debtors]
-            df = pd.DataFrame(data)
             df.rename(columns={
                 'ric': 'RIC', 
                 'full_name': 'ПІБ', 
                 'monthly_fee': 'Тариф, грн',
                 'last_payment_date': 'Остання оплата',
                 'days_overdue': 'Днів простроч.',
+                'months_overdue': 'Місяців боргу',
                 'debt_amount': 'Сума боргу, грн'
             }, inplace=True)
             st.dataframe(df, width='stretch')
@@ -37,8 +61,48 @@ with col_report:
         else:
             st.warning("Боржників не знайдено.")
 
+    st.divider()
+    st.subheader("Детальний звіт")
+    f1, f2, f3, f4 = st.columns(4)
+    with f1:
+        order_labels = {
+            'debt_amount': 'Сума боргу',
+            'days_overdue': 'Днів прострочки',
+            'monthly_fee': 'Тариф',
+            'full_name': 'ПІБ',
+            'ric': 'RIC',
+        }
+        order_by = st.selectbox("Сортування", list(order_labels), format_func=order_labels.get)
+    with f2:
+        descending = st.toggle("За спаданням", value=True)
+    with f3:
+        min_debt = st.number_input("Мін. борг, грн", min_value=0.0, step=100.0, value=0.0)
+    with f4:
+        page_size = st.selectbox("Рядків", [25, 50, 100, 500], index=1)
+
+    try:
+        totals = pg_db.get_debtors_totals(min_debt=min_debt)
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Боржників", totals['debtors_count'])
+        m2.metric("Загальний борг, грн", f"{totals['total_debt']:,.2f}")
+        m3.metric("Середній борг, грн", f"{totals['avg_debt']:,.2f}")
+
+        pages_total = max(1, -(-totals['debtors_count'] // page_size))
+        page_number = st.number_input("Сторінка", min_value=1, max_value=pages_total, value=1, step=1)
+        report = pg_db.get_debtors_report(
+            order_by=order_by, descending=descending, min_debt=min_debt,
+            limit=page_size, offset=(page_number - 1) * page_size
+        )
+        if not report.empty:
+            st.dataframe(report, width='stretch')
+            st.caption(f"Сторінка {page_number} з {pages_total}")
+        else:
+            st.info("Немає боржників за заданими умовами.")
+    except Exception as e:
+        st.error(f"Помилка формування звіту: {e}")
+
 with col_admin:
     st.subheader("Керування")
-    if st.button("🗑️ Очистити кеш"):
-        redis_db.clear_cache()
-        st.warning("Кеш очищено")
\ No newline at end of file
+    if st.button("🗑️ Оновити кеш"):
+        redis_db.invalidate_debtors_cache()
+        st.warning("Кеш буде перебудовано при наступному запиті")
\ No newline at end of file
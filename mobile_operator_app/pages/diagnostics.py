@@ -0,0 +1,101 @@
+import os
+import streamlit as st
+import pandas as pd
+
+if 'telemetry' not in st.session_state:
+    st.error("На головну сторінку, щоб ініціалізувати систему.")
+    st.stop()
+telemetry = st.session_state['telemetry']
+pg_db = st.session_state.get('pg_db')
+mongo_db = st.session_state.get('mongo_db')
+st.set_page_config(page_title="Діагностика", page_icon="🩺", layout="wide")
+st.title("🩺 Діагностика шару даних")
+
+port = int(os.getenv("METRICS_PORT", 9108))
+if port:
+    st.caption(f"Метрики у форматі Prometheus: http://127.0.0.1:{port}/metrics")
+
+if st.button("🔄 Оновити"):
+    st.rerun()
+
+tab_renders, tab_methods, tab_slow = st.tabs(["⏱ Рендери сторінок", "📊 Усі виклики", "🐢 Повільні запити"])
+
+with tab_renders:
+    renders = telemetry.renders()
+    if not renders:
+        st.info("Ще немає рендерів. Відкрийте будь-яку сторінку застосунку.")
+    else:
+        labels = {r["render_id"]: f"{r['started_at']:%H:%M:%S} — {r['page']}" for r in renders}
+        render_id = st.selectbox("Рендер", list(labels), format_func=labels.get)
+
+        calls = telemetry.calls(render_id)
+        total_ms = sum(call["duration"] for call in calls) * 1000
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Викликів", len(calls))
+        c2.metric("Час у базах, мс", f"{total_ms:.1f}")
+        c3.metric("Помилок", sum(1 for call in calls if call["error"] or call["logged_errors"]))
+
+        slowest = telemetry.slowest_calls(render_id, limit=20)
+        if slowest:
+            st.subheader("Найповільніші виклики")
+            st.dataframe(pd.DataFrame([{
+                "Менеджер": call["component"],
+                "Метод": call["method"],
+                "Час, мс": round(call["duration"] * 1000, 2),
+                "Рядків": call["rows"],
+                "Байт": call["bytes"],
+                "Помилка": call["error"] or "; ".join(call["logged_errors"]) or None,
+            } for call in slowest]), width='stretch', hide_index=True)
+        else:
+            st.info("Цей рендер не звертався до баз даних.")
+
+with tab_methods:
+    stats = telemetry.method_stats()
+    if stats:
+        st.caption("p50/p99 — верхня межа кошика гістограми; відсортовано за сумарним часом.")
+        st.dataframe(pd.DataFrame(stats).rename(columns={
+            "component": "Менеджер",
+            "method": "Метод",
+            "calls": "Викликів",
+            "errors": "Помилок",
+            "mean_ms": "Сер., мс",
+            "p50_ms": "p50, мс",
+            "p99_ms": "p99, мс",
+            "rows": "Рядків",
+            "bytes": "Байт",
+        }), width='stretch', hide_index=True)
+    else:
+        st.info("Викликів ще не було.")
+
+    logged_errors = telemetry.logged_errors()
+    if logged_errors:
+        st.subheader("Залоговані помилки")
+        st.dataframe(pd.DataFrame(
+            [{"Модуль": name, "Кількість": count} for name, count in logged_errors.items()]
+        ), width='stretch', hide_index=True)
+
+with tab_slow:
+    # Postgres і Mongo пишуть в один журнал, якщо шлях до нього спільний
+    slow_log = getattr(pg_db, "slow_queries", None) or getattr(mongo_db, "slow_queries", None)
+    if slow_log is None:
+        st.info("Журнал повільних запитів вимкнено (PG_SLOW_QUERY_MS=0, MONGO_SLOW_QUERY_MS=0).")
+    else:
+        stats = slow_log.stats()
+        st.caption(f"Файл: {slow_log.path} | Повільних: {stats['slow']} | Записано: {stats['captured']} | "
+                   f"Пропущено повторів: {stats['suppressed']}")
+        entries = slow_log.recent()
+        if not entries:
+            st.info("Повільних запитів ще не було.")
+        for entry in entries[:50]:
+            title = f"{entry['duration_ms']:.0f} мс · {entry['source']} · {entry['normalized'][:100]}"
+            with st.expander(title):
+                st.caption(f"{entry['logged_at']} | відбиток {entry['fingerprint']}")
+                st.code(entry.get("query", entry["normalized"]), language="sql" if entry["source"] == "postgres" else "json")
+                if entry.get("seq_scans"):
+                    st.warning(f"Послідовне сканування: {', '.join(entry['seq_scans'])}")
+                if entry.get("explain_error"):
+                    st.caption(f"EXPLAIN: {entry['explain_error']}")
+                if entry.get("explain_skipped"):
+                    st.caption(f"План не знімався: {entry['explain_skipped']}")
+                if entry["plan"] is not None:
+                    st.json(entry["plan"], expanded=False)
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 from databases.models import ServiceRequest
+from databases.mongo_db import QUEUE_FIELDS, HISTORY_FIELDS
 from typing import List, Dict, Any
 
 if 'mongo_db' not in st.session_state:
@@ -11,6 +12,10 @@ if 'pg_db' not in st.session_state:
     st.error("На головну сторінку, щоб ініціалізувати систему.")
     st.stop()
 pg_db = st.session_state['pg_db']
+async_db = st.session_state.get('async_db')
+telemetry = st.session_state.get('telemetry')
+if telemetry is not None:
+    telemetry.begin_render("Заявки")
 st.set_page_config(page_title="Заявки", page_icon="🛠", layout="wide")
 if 'found_subscriber' not in st.session_state:
     st.session_state['found_subscriber'] = None
@@ -71,15 +76,39 @@ with tab_create:
 
 with tab_active:
     st.subheader("Черга заявок")
-    if st.button("🔄 Оновити список"):
+    if 'queue_page_cursors' not in st.session_state:
+        st.session_state['queue_page_cursors'] = [None]
+    col_refresh, col_size, col_count = st.columns([1, 1, 2])
+    with col_refresh:
+        if st.button("🔄 Оновити список"):
+            st.session_state['queue_page_cursors'] = [None]
+            st.rerun()
+    with col_size:
+        queue_page_size = st.selectbox("Заявок на сторінку", [10, 20, 50], index=1, key="queue_page_size",
+                                       on_change=lambda: st.session_state.update(queue_page_cursors=[None]))
+    with col_count:
+        st.metric("Відкритих заявок", mongo_db.count_open_requests())
+
+    # одна сторінка — один keyset-запит: ні обсяг черги, ні кількість переходів не впливає на відмальовку
+    queue_cursors = st.session_state['queue_page_cursors']
+    active_requests, next_cursor = mongo_db.get_open_requests_page(
+        after=queue_cursors[-1], limit=queue_page_size, fields=QUEUE_FIELDS
+    )
+    if not active_requests and len(queue_cursors) > 1:
+        # заявки останньої сторінки закрили: повертаємось на попередню
+        queue_cursors.pop()
         st.rerun()
-    active_requests = mongo_db.get_all_requests(only_open=True)
     if not active_requests:
         st.info("Черга пуста")
     else:
+        bulk_bar = st.container()
+        selected_ids = []
         for req in active_requests:
             with st.container(border=True):
-                col_info, col_actions = st.columns([4, 1])
+                col_select, col_info, col_actions = st.columns([0.3, 4, 1])
+                with col_select:
+                    if st.checkbox("Вибрати", key=f"sel_{req['id']}", label_visibility="collapsed"):
+                        selected_ids.append(req['id'])
                 with col_info:
                     st.markdown(f"**RIC:** `{req['ric']}` | **Пристрій:** {req['phone_model']}")
                     st.write(f"📝 {req['issue_description']}")
@@ -93,12 +122,48 @@ with tab_active:
                         mongo_db.delete_request(req['id'])
                         st.toast("Заявку видалено")
                         st.rerun()
+        with bulk_bar:
+            col_selected, col_bulk_close, col_bulk_del = st.columns([2, 1, 1])
+            col_selected.write(f"Вибрано заявок: **{len(selected_ids)}**")
+            if col_bulk_close.button("✅ Закрити вибрані", disabled=not selected_ids):
+                results = mongo_db.close_requests(selected_ids)
+                done = sum(results.values())
+                st.toast(f"Закрито {done} з {len(results)} заявок")
+                for req_id in selected_ids:
+                    st.session_state.pop(f"sel_{req_id}", None)
+                st.rerun()
+            if col_bulk_del.button("🗑️ Видалити вибрані", disabled=not selected_ids):
+                results = mongo_db.delete_requests(selected_ids)
+                done = sum(results.values())
+                st.toast(f"Видалено {done} з {len(results)} заявок")
+                for req_id in selected_ids:
+                    st.session_state.pop(f"sel_{req_id}", None)
+                st.rerun()
+    q1, q2, q3 = st.columns([1, 1, 4])
+    with q1:
+        if st.button("◀ Назад", key="queue_prev", disabled=len(queue_cursors) == 1):
+            queue_cursors.pop()
+            st.rerun()
+    with q2:
+        if st.button("Далі ▶", key="queue_next", disabled=not next_cursor):
+            queue_cursors.append(next_cursor)
+            st.rerun()
+    with q3:
+        st.caption(f"Сторінка {len(queue_cursors)} | Заявок на сторінці: {len(active_requests)}")
 
 with tab_search:
     st.subheader("Історія обслуговування")
     search_ric = st.text_input("Введіть RIC для пошуку:", placeholder="RIC-...")
     if search_ric:
-        results = mongo_db.get_requests_by_ric(search_ric) 
+        if async_db is not None:
+            # абонент з Postgres і історія з Mongo читаються одночасно
+            history_subscriber, results = async_db.run(async_db.get_subscriber_with_history(search_ric))
+        else:
+            history_subscriber = pg_db.get_subscriber(search_ric)
+            results = mongo_db.get_requests_by_ric(search_ric, fields=HISTORY_FIELDS)
+        if history_subscriber:
+            st.markdown(f"**Абонент:** {history_subscriber.full_name} | **Тариф:** {history_subscriber.service_type} "
+                        f"| **Пристрій:** {history_subscriber.phone_model}")
         if results:
             st.write(f"Знайдено записів: {len(results)}")
             for res in results:
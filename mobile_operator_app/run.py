@@ -7,6 +7,8 @@ import os
 # python run.py main - застосунок + бд
 # python run.py test - тести + бд
 # python run.py install - завантажити залежності
+# python run.py worker - окремий воркер фонових звітів
+# python run.py up - лише підняти бд (для бенчмарків)
 
 
 # --- Налаштування команд Docker ---
@@ -56,8 +58,8 @@ def main():
     parser = argparse.ArgumentParser(description="Менеджер запуску Mobile Operator App")
     parser.add_argument(
         'mode',
-        choices=['install', 'main', 'test', 'stop', 'wipe', 'check', 'down'],
-        help="Режим: install (бібліотеки), main (додаток), test (тести) або керування БД"
+        choices=['install', 'main', 'test', 'worker', 'up', 'stop', 'wipe', 'check', 'down'],
+        help="Режим: install (бібліотеки), main (додаток), test (тести), worker (фонові звіти) або керування БД"
     )
     args = parser.parse_args()
     python_cmd = sys.executable
@@ -87,7 +89,15 @@ def main():
                 print(" Запуск Pytest...")
                 run_command(f"{python_cmd} -m pytest tests -v -s")
 
+        elif args.mode == 'worker':
+            print(" Запуск воркера фонових звітів...")
+            run_command(f"{python_cmd} -m databases.jobs")
+
         # --- Режими обслуговування ---
+        elif args.mode == 'up':
+            print(" Запуск контейнерів...")
+            manage_db("up")
+
         elif args.mode == 'stop':
             print(" Зупинка контейнерів...")
             manage_db("stop")
@@ -1,3 +1,5 @@
+import math
+import time
 import pytest
 from datetime import date, timedelta
 from databases.models import Subscriber, DebtorReport
@@ -63,4 +65,578 @@ def test_debt_calculation_no_payment_date():
         last_payment_date=None
     )
     assert report.days_overdue == 0
-    assert report.debt_amount == 0.0
\ No newline at end of file
+    assert report.debt_amount == 0.0
+
+# --- Тести для векторного розрахунку боргу ---
+
+def test_debt_columns_match_debtor_report():
+    """Векторні колонки мають збігатися з обчислюваними полями DebtorReport"""
+    import pandas as pd
+    from databases.debt import add_debt_columns
+
+    reports = [
+        DebtorReport(ric=f"RIC-{days}", full_name="User", monthly_fee=fee,
+                     last_payment_date=date.today() - timedelta(days=days))
+        for days in (0, 1, 29, 30, 31, 35, 59, 60, 61, 400)
+        for fee in (0.0, 99.99, 150.0, 333.33)
+    ]
+    reports.append(DebtorReport(ric="RIC-NONE", full_name="User", monthly_fee=100.0))
+
+    df = pd.DataFrame([r.model_dump(exclude={"days_overdue", "debt_amount"}) for r in reports])
+    df = add_debt_columns(df)
+
+    assert df["days_overdue"].tolist() == [r.days_overdue for r in reports]
+    assert df["months_overdue"].tolist() == [
+        math.ceil(r.days_overdue / 30) if r.days_overdue > 0 else 0 for r in reports
+    ]
+    assert df["debt_amount"].tolist() == [r.debt_amount for r in reports]
+
+
+def test_compute_debt_uses_single_as_of_date():
+    """Усі значення рахуються від однієї переданої дати, а не від date.today()"""
+    from databases.debt import compute_debt
+
+    as_of = date(2024, 3, 1)
+    result = compute_debt(
+        [date(2024, 3, 1), date(2024, 1, 31), date(2024, 1, 1), None, date(2024, 4, 1)],
+        [100.0, 100.0, 100.0, 100.0, 100.0],
+        as_of=as_of
+    )
+
+    assert result.days_overdue.tolist() == [0, 30, 60, 0, -31]
+    assert result.months_overdue.tolist() == [0, 1, 2, 0, 0]
+    assert result.debt_amount.tolist() == [0.0, 100.0, 200.0, 0.0, 0.0]
+
+
+def test_compute_debt_rounding_matches_python_round():
+    """Округлення на межі половини копійки таке саме, як у round() з DebtorReport"""
+    from databases.debt import compute_debt
+
+    fees = [1.005, 2.675, 0.125, 1.115, 10.045, 99.995, 0.285]
+    days = 65
+    as_of = date.today()
+    result = compute_debt([as_of - timedelta(days=days)] * len(fees), fees, as_of=as_of)
+
+    expected = [round(math.ceil(days / 30) * fee, 2) for fee in fees]
+    assert result.debt_amount.tolist() == expected
+
+
+def test_debt_cutoff_matches_postgres_month_interval():
+    """Відсічка на місяць назад обрізає день до кінця попереднього місяця, як у Postgres"""
+    from databases.debt import debt_cutoff
+
+    assert debt_cutoff(date(2024, 3, 31)) == date(2024, 2, 29)
+    assert debt_cutoff(date(2023, 3, 31)) == date(2023, 2, 28)
+    assert debt_cutoff(date(2024, 1, 15)) == date(2023, 12, 15)
+    assert debt_cutoff(date(2024, 5, 31)) == date(2024, 4, 30)
+
+
+# --- Тести для кодеків кешу боржників ---
+
+@pytest.mark.parametrize("codec_name", ["json", "struct", "msgpack"])
+def test_debtor_codec_roundtrip(codec_name):
+    """Кодек зберігає лише вихідні поля і декодує їх без pydantic"""
+    from databases.codecs import get_codec
+
+    if codec_name == "msgpack":
+        pytest.importorskip("msgpack")
+    codec = get_codec(codec_name)
+
+    entries = [
+        ("RIC-1", "Шевченко Т.", 150.0, date(2024, 1, 31)),
+        ("RIC-2", 'O\'Brien "Jr"', 99.99, date(1999, 12, 31)),
+        ("RIC-3", "", 0.01, date(2030, 6, 1)),
+    ]
+    df = codec.decode_frame([codec.encode(*entry) for entry in entries])
+
+    assert list(df.itertuples(index=False, name=None)) == entries
+    assert codec.decode_frame([]).empty
+
+
+# --- Тести для кешу пошуку абонентів ---
+
+def test_subscriber_cache_local_tier_and_negative_caching():
+    """Повторні запити не доходять до БД, невідомий RIC теж кешується"""
+    from databases.subscriber_cache import SubscriberCache
+
+    sub = Subscriber(
+        ric="RIC-CACHE", pin_code="0000", full_name="Cached", phone_model="Pixel 7",
+        phone_type="Smartphone", service_type="Standard", contract_start_date=date.today(),
+        contract_duration_months=12, monthly_fee=100.0
+    )
+    calls = []
+
+    def loader(ric):
+        calls.append(ric)
+        return sub if ric == "RIC-CACHE" else None
+
+    cache = SubscriberCache(max_size=2)
+
+    assert cache.get("RIC-CACHE", loader) is sub
+    assert cache.get("RIC-CACHE", loader) is sub
+    assert cache.get("RIC-UNKNOWN", loader) is None
+    assert cache.get("RIC-UNKNOWN", loader) is None
+    assert calls == ["RIC-CACHE", "RIC-UNKNOWN"]
+
+    cache.apply_subscriber_changes([("RIC-CACHE", None)])
+    assert cache.get("RIC-CACHE", loader) is sub
+    assert calls.count("RIC-CACHE") == 2
+
+    cache.get("RIC-A", loader)
+    cache.get("RIC-B", loader)
+    assert cache.stats()["local_size"] == 2
+
+    stats = cache.stats()
+    assert stats["local_hits"] == 1
+    assert stats["negative_hits"] == 1
+    assert stats["misses"] == 5
+
+
+def test_subscriber_cache_skips_fill_invalidated_during_load():
+    """Зміна абонента між читанням з БД і записом у кеш не лишає в кеші старий рядок"""
+    from databases.subscriber_cache import SubscriberCache
+
+    def subscriber(name):
+        return Subscriber(
+            ric="RIC-RACE", pin_code="0000", full_name=name, phone_model="Pixel 7",
+            phone_type="Smartphone", service_type="Standard", contract_start_date=date.today(),
+            contract_duration_months=12, monthly_fee=100.0
+        )
+
+    rows = {"RIC-RACE": subscriber("Старе ім'я")}
+    cache = SubscriberCache()
+
+    def loader(ric):
+        row = rows[ric]
+        # запис комітиться й інвалідує кеш, поки читач ще не поклав свій результат
+        rows[ric] = subscriber("Нове ім'я")
+        cache.invalidate([ric])
+        return row
+
+    assert cache.get("RIC-RACE", loader).full_name == "Старе ім'я"
+    assert cache.get("RIC-RACE", lambda ric: rows[ric]).full_name == "Нове ім'я"
+    assert cache.get("RIC-RACE", loader).full_name == "Нове ім'я"
+    assert cache.stats()["local_hits"] == 1
+
+
+def test_subscriber_cache_local_ttl_expires():
+    from databases.subscriber_cache import SubscriberCache
+
+    calls = []
+    cache = SubscriberCache(local_ttl=0.05)
+    cache.get("RIC-TTL", lambda ric: calls.append(ric))
+    cache.get("RIC-TTL", lambda ric: calls.append(ric))
+    time.sleep(0.1)
+    cache.get("RIC-TTL", lambda ric: calls.append(ric))
+    assert len(calls) == 2
+
+
+# --- Тести для розбору планів MongoDB ---
+
+def test_mongo_plan_stages_classic_and_sbe():
+    """Стадії плану читаються і з класичного формату, і з SBE (queryPlan)"""
+    from databases.mongo_db import plan_stages
+
+    classic = {"queryPlanner": {"winningPlan": {
+        "stage": "FETCH",
+        "inputStage": {"stage": "IXSCAN", "indexName": "status_created_at"},
+    }}}
+    sbe = {"queryPlanner": {"winningPlan": {"queryPlan": {
+        "stage": "SORT",
+        "inputStage": {"stage": "COLLSCAN"},
+    }}}}
+
+    assert plan_stages(classic) == ["FETCH", "IXSCAN"]
+    assert plan_stages(sbe) == ["SORT", "COLLSCAN"]
+
+
+def test_build_profiles_debt_and_open_requests():
+    """Профіль рахує борг як звіт по боржниках і відкриті заявки з історії"""
+    from databases.profiles import build_profiles
+
+    as_of = date(2024, 6, 15)
+    debtor = Subscriber(
+        ric="RIC-1", pin_code="0000", full_name="Боржник", phone_model="Pixel 7",
+        phone_type="Смартфон", service_type="Стандарт", contract_start_date=date(2023, 1, 1),
+        contract_duration_months=12, monthly_fee=100.0, last_payment_date=as_of - timedelta(days=45)
+    )
+    recent = debtor.model_copy(update={"ric": "RIC-2", "last_payment_date": as_of - timedelta(days=10)})
+    history = {"RIC-1": [{"status": "open"}, {"status": "closed"}, {"status": "open"}]}
+
+    profiles = build_profiles(["RIC-2", "RIC-1", "RIC-404"], [debtor, recent], history, as_of)
+
+    assert list(profiles) == ["RIC-2", "RIC-1", "RIC-404"]
+    assert profiles["RIC-404"] is None
+    assert profiles["RIC-1"].open_requests == 2
+    assert profiles["RIC-1"].days_overdue == 45
+    assert profiles["RIC-1"].debt_amount == DebtorReport(
+        ric="RIC-1", full_name="Боржник", monthly_fee=100.0, last_payment_date=date.today() - timedelta(days=45)
+    ).debt_amount
+    # оплата менше місяця тому — ще не боржник
+    assert profiles["RIC-2"].debt_amount == 0.0
+    assert profiles["RIC-2"].requests == []
+
+
+def test_columns_result_cache_versions_and_subsets():
+    """Кеш колонок віддає збережений результат, поки версія таблиці не зміниться"""
+    import numpy as np
+    from databases.result_cache import ColumnsResultCache
+
+    calls = []
+
+    def loader(columns):
+        calls.append(columns)
+        return {col: np.array([f"{col}-{len(calls)}"], dtype=object) for col in columns}
+
+    cache = ColumnsResultCache()
+    wide = cache.get(("ric", "full_name", "monthly_fee"), loader)
+    assert cache.get(("ric", "full_name", "monthly_fee"), loader) is wide
+    # підмножина колонок тієї ж версії не йде в базу
+    narrow = cache.get(("ric",), loader)
+    assert narrow["ric"] is wide["ric"]
+    assert len(calls) == 1
+
+    with pytest.raises(ValueError):
+        wide["ric"][0] = "змінено"
+
+    cache.apply_subscriber_changes([("RIC-1", None)])
+    assert cache.get(("ric",), loader)["ric"][0] == "ric-2"
+    assert len(calls) == 2
+
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["subset_hits"] == 1 and stats["misses"] == 2
+
+
+def test_prepared_statements_prepare_once_per_connection():
+    """Запит готується один раз на з'єднання, далі лише EXECUTE"""
+    from databases.prepared import PreparedStatements
+
+    class FakeConnection:
+        autocommit = True
+
+    class FakeCursor:
+        def __init__(self, connection):
+            self.connection = connection
+            self.executed = []
+
+        def execute(self, query, params=None):
+            self.executed.append((query, params))
+
+    statements = PreparedStatements(prefix="t")
+    name = statements.register("get", "SELECT * FROM subscribers WHERE ric = $1 AND is_active = $2")
+
+    conn_a, conn_b = FakeConnection(), FakeConnection()
+    cursor_a, cursor_b = FakeCursor(conn_a), FakeCursor(conn_b)
+    statements.execute(cursor_a, name, ("RIC-1", True))
+    statements.execute(cursor_a, name, ("RIC-2", True))
+    statements.execute(cursor_b, name, ("RIC-3", False))
+
+    assert [q for q, _ in cursor_a.executed] == [
+        "PREPARE t_get AS SELECT * FROM subscribers WHERE ric = $1 AND is_active = $2",
+        "EXECUTE t_get (%s, %s)",
+        "EXECUTE t_get (%s, %s)",
+    ]
+    assert cursor_b.executed[0][0].startswith("PREPARE t_get")
+    assert statements.stats()["prepares"] == 2
+
+    # без PREPARE той самий текст виконується з параметрами psycopg2
+    plain = PreparedStatements(prefix="t", enabled=False)
+    plain.register("get", "SELECT * FROM subscribers WHERE ric = $1 AND is_active = $2")
+    cursor = FakeCursor(FakeConnection())
+    plain.execute(cursor, name, ("RIC-1", True))
+    assert cursor.executed == [("SELECT * FROM subscribers WHERE ric = %s AND is_active = %s", ("RIC-1", True))]
+
+
+def test_generators_are_deterministic_for_seed():
+    """Однаковий seed дає однаковий набір абонентів і заявок для порівняння прогонів"""
+    from datetime import datetime
+    from databases.generators import generate_subscribers, generate_requests
+
+    today, now = date(2024, 6, 15), datetime(2024, 6, 15, 12, 0)
+    first = list(generate_subscribers(50, seed=7, prefix="RIC-T-", today=today))
+    second = list(generate_subscribers(50, seed=7, prefix="RIC-T-", today=today))
+
+    assert first == second
+    assert [s.ric for s in first[:2]] == ["RIC-T-0000000", "RIC-T-0000001"]
+    assert len({s.ric for s in first}) == 50
+
+    requests = list(generate_requests(first, per_subscriber=2.5, seed=7, now=now))
+    assert requests == list(generate_requests(second, per_subscriber=2.5, seed=7, now=now))
+    # у середньому 2.5 заявки: кожен абонент має дві або три
+    assert 100 <= len(requests) <= 150
+    assert all(r.status == "open" or r.closed_at > r.created_at for r in requests)
+
+
+def test_telemetry_instruments_manager_methods():
+    """Обгортка рахує час, рядки, помилки й залоговані помилки кожного виклику менеджера"""
+    import asyncio
+    import logging
+    import pandas as pd
+    from databases.telemetry import Telemetry
+
+    class FakeManager:
+        def get_frame(self):
+            return pd.DataFrame({"ric": ["RIC-1", "RIC-2"]})
+
+        def get_many(self):
+            # вкладений виклик того ж менеджера не записується окремо
+            return self.get_frame()["ric"].tolist()
+
+        def iter_rows(self):
+            yield from range(3)
+
+        def broken(self):
+            raise ValueError("boom")
+
+        def swallowed(self):
+            logging.getLogger("databases.fake").error("Error: %s", "lost")
+            return False
+
+        async def get_async(self):
+            return [1]
+
+        async def iter_async(self):
+            for i in range(5):
+                await asyncio.sleep(0.01)
+                yield i
+
+        def _private(self):
+            return None
+
+    telemetry = Telemetry()
+    telemetry.attach_logging("databases")
+    manager = telemetry.instrument(FakeManager(), "fake")
+    render_id = telemetry.begin_render("Тест")
+
+    assert len(manager.get_frame()) == 2
+    assert manager.get_many() == ["RIC-1", "RIC-2"]
+    assert list(manager.iter_rows()) == [0, 1, 2]
+    with pytest.raises(ValueError):
+        manager.broken()
+    assert manager.swallowed() is False
+    assert asyncio.run(manager.get_async()) == [1]
+
+    async def read_three():
+        # викликач зупиняється раніше: запис з'являється при закритті генератора
+        stream = manager.iter_async()
+        rows = []
+        async for item in stream:
+            rows.append(item)
+            if len(rows) == 3:
+                break
+        await stream.aclose()
+        return rows
+
+    assert asyncio.run(read_three()) == [0, 1, 2]
+    manager._private()
+
+    calls = {call["method"]: call for call in telemetry.calls(render_id)}
+    assert set(calls) == {"get_frame", "get_many", "iter_rows", "broken", "swallowed", "get_async", "iter_async"}
+    assert calls["get_frame"]["rows"] == 2 and calls["get_frame"]["bytes"] > 0
+    assert calls["iter_rows"]["rows"] == 3
+    assert calls["iter_async"]["rows"] == 3 and calls["iter_async"]["duration"] >= 0.03
+    assert calls["broken"]["error"] == "ValueError"
+    assert calls["swallowed"]["logged_errors"] == ["Error: lost"]
+    assert telemetry.logged_errors() == {"databases.fake": 1}
+
+    stats = {item["method"]: item for item in telemetry.method_stats()}
+    assert stats["broken"]["errors"] == 1
+    assert stats["get_frame"]["calls"] == 1
+
+    telemetry.add_stats("cache", lambda: {"hits": 3, "hit_ratio": 0.5, "name": "x"}, cache="subscriber")
+    telemetry.add_stats("cache", lambda: {"hits": 1}, cache="debtors")
+    text = telemetry.render_prometheus()
+    assert 'mobile_operator_db_call_duration_seconds_count{component="fake",method="get_frame"} 1' in text
+    assert 'mobile_operator_db_call_duration_seconds_bucket{component="fake",method="get_frame",le="+Inf"} 1' in text
+    assert 'mobile_operator_db_call_errors_total{component="fake",method="broken"} 1' in text
+    assert 'mobile_operator_logged_errors_total{logger="databases.fake"} 1' in text
+    assert 'mobile_operator_cache_hits{cache="subscriber"} 3.0' in text
+    assert "mobile_operator_cache_name" not in text
+    # метрика з кількох збирачів описується одним блоком
+    assert text.count("# TYPE mobile_operator_cache_hits gauge") == 1
+    assert 'mobile_operator_cache_hits{cache="debtors"} 1.0' in text
+
+
+def test_update_statement_is_canonical():
+    """Той самий набір колонок у будь-якому порядку дає один текст UPDATE"""
+    from databases.postgres_db import update_columns, update_subscriber_sql
+
+    first = update_columns({"monthly_fee": 1, "full_name": "a", "unknown": 2})
+    second = update_columns({"full_name": "b", "monthly_fee": 3})
+    assert first == second == ("full_name", "monthly_fee")
+    assert update_subscriber_sql(first) == \
+        "UPDATE subscribers SET full_name = $1, monthly_fee = $2 WHERE ric = $3 RETURNING *"
+    assert update_columns({"ric": "RIC-1"}) == ()
+
+
+def test_copy_payload_falls_back_to_csv_for_special_characters():
+    """Звичайні рядки йдуть текстовим COPY, а поля з \\t, \\n чи \\ — через csv"""
+    from databases.postgres_db import copy_payload
+
+    def make(name, paid=None):
+        return Subscriber(
+            ric="RIC-1", pin_code="0000", full_name=name, phone_model="iPhone",
+            phone_type="Smartphone", service_type="Premium", contract_start_date=date(2024, 1, 31),
+            contract_duration_months=12, monthly_fee=99.5, is_active=False, last_payment_date=paid
+        )
+
+    buffer, options = copy_payload([make("Test User"), make("Other", date(2024, 2, 1))])
+    assert options == "FORMAT text"
+    assert buffer.read() == (
+        "RIC-1\t0000\tTest User\tiPhone\tSmartphone\tPremium\t2024-01-31\t12\t99.5\tf\t\\N\n"
+        "RIC-1\t0000\tOther\tiPhone\tSmartphone\tPremium\t2024-01-31\t12\t99.5\tf\t2024-02-01\n"
+    )
+
+    for name in ("Tab\tUser", "New\nLine", "Back\\N"):
+        buffer, options = copy_payload([make("Test User"), make(name)])
+        assert options.startswith("FORMAT csv")
+        assert name in buffer.read()
+
+
+def test_slow_query_fingerprints_ignore_literals():
+    """Запити, що відрізняються лише даними, мають однаковий відбиток"""
+    from databases.slow_queries import normalize_sql, normalize_mongo, fingerprint
+
+    first = normalize_sql("SELECT * FROM subscribers WHERE ric = 'RIC-1' AND monthly_fee > 150.5 LIMIT 50")
+    second = normalize_sql("select *  from subscribers\n where ric = 'O''Brien' and monthly_fee > 7 limit 10")
+    assert first == second == "select * from subscribers where ric = ? and monthly_fee > ? limit ?"
+    assert normalize_sql("SELECT * FROM subscribers WHERE ric IN ('a', 'b', 'c')") == \
+        normalize_sql("SELECT * FROM subscribers WHERE ric IN ('d')")
+    assert normalize_sql("SELECT * FROM subscribers WHERE ric = ANY(ARRAY['a','b'])").endswith("any(array[...])")
+    # імена підготовлених запитів із цифрами не перетворюються на параметри
+    assert normalize_sql("EXECUTE subscribers_update_1f ('x', 2)") == "execute subscribers_update_1f (...)"
+
+    find = {"find": "service_requests", "filter": {"ric": {"$in": ["A", "B"]}, "status": "open"},
+            "sort": {"created_at": -1}, "limit": 20}
+    other = dict(find, filter={"ric": {"$in": ["C"]}, "status": "closed"}, limit=5)
+    assert fingerprint(normalize_mongo("find", find)) == fingerprint(normalize_mongo("find", other))
+    assert fingerprint(normalize_mongo("find", find)) != \
+        fingerprint(normalize_mongo("find", dict(find, sort={"_id": 1})))
+
+
+def test_slow_query_log_rotates_and_rate_limits(tmp_path):
+    """Журнал повільних запитів обмежений за розміром і не дублює той самий відбиток"""
+    import json
+    from databases.slow_queries import SlowQueryLog
+
+    log = SlowQueryLog(str(tmp_path / "slow.log"), max_bytes=2000, backup_count=2, cooldown_seconds=60)
+    try:
+        assert log.should_capture("fp-1") is True
+        assert log.should_capture("fp-1") is False
+        for i in range(50):
+            log.write({"fingerprint": f"fp-{i}", "query": "x" * 100})
+    finally:
+        log.close()
+
+    files = sorted(p.name for p in tmp_path.iterdir())
+    assert files == ["slow.log", "slow.log.1", "slow.log.2"]
+    assert all((tmp_path / name).stat().st_size <= 2000 for name in files)
+    last = (tmp_path / "slow.log").read_text(encoding="utf-8").splitlines()[-1]
+    assert json.loads(last)["fingerprint"] == "fp-49"
+    assert log.recent()[0]["fingerprint"] == "fp-49"
+    assert log.stats()["suppressed"] == 1
+
+
+def test_slow_query_plans_drop_literal_values():
+    """Умови плану зберігають форму, але не значення з запиту"""
+    from databases.slow_queries import scrub_pg_plan, scrub_mongo_plan
+
+    pg_plan = {"Plan": {"Node Type": "Index Scan", "Relation Name": "subscribers",
+                        "Index Cond": "(ric = 'RIC-1'::text)",
+                        "Plans": [{"Filter": "(full_name ~~* '%Шевченко%'::text)", "Rows Removed by Filter": 3}]}}
+    scrubbed = scrub_pg_plan(pg_plan)
+    assert scrubbed["Plan"]["Index Cond"] == "(ric = '?'::text)"
+    assert scrubbed["Plan"]["Plans"][0] == {"Filter": "(full_name ~~* '?'::text)", "Rows Removed by Filter": 3}
+    assert scrubbed["Plan"]["Relation Name"] == "subscribers"
+
+    mongo_plan = {"queryPlanner": {
+        "parsedQuery": {"$and": [{"ric": {"$eq": "RIC-1"}}, {"status": {"$eq": "open"}}]},
+        "winningPlan": {"stage": "FETCH", "inputStage": {
+            "stage": "IXSCAN", "indexName": "ric_1", "indexBounds": {"ric": ['["RIC-1", "RIC-1"]']}}},
+    }}
+    scrubbed = scrub_mongo_plan(mongo_plan)["queryPlanner"]
+    assert scrubbed["parsedQuery"] == {"$and": [{"ric": {"$eq": "?"}}, {"status": {"$eq": "?"}}]}
+    assert scrubbed["winningPlan"]["inputStage"]["indexBounds"] == {"ric": "?"}
+    assert scrubbed["winningPlan"]["inputStage"]["indexName"] == "ric_1"
+
+
+def test_slow_query_explain_analyzes_only_reads():
+    """EXPLAIN ANALYZE лише для читання, DML отримує оцінний план без повторного виконання"""
+    from databases.slow_queries import normalize_sql, explain_options, EXPLAIN_ANALYZE, EXPLAIN_PLAN
+
+    def options(query):
+        return explain_options(normalize_sql(query))
+
+    assert options("SELECT * FROM subscribers WHERE ric = 'a'") == EXPLAIN_ANALYZE
+    assert options("(SELECT 1) UNION (SELECT 2)") == EXPLAIN_ANALYZE
+    assert options("WITH t AS (SELECT 1) SELECT * FROM t") == EXPLAIN_ANALYZE
+    assert options("UPDATE subscribers SET monthly_fee = 1 WHERE ric = 'a'") == EXPLAIN_PLAN
+    assert options("INSERT INTO subscribers SELECT * FROM subscribers") == EXPLAIN_PLAN
+    assert options("DELETE FROM subscribers WHERE ric = 'a'") == EXPLAIN_PLAN
+    # CTE з DML і блокування рядків теж не виконуються вдруге
+    assert options("WITH d AS (DELETE FROM subscribers RETURNING ric) SELECT count(*) FROM d") == EXPLAIN_PLAN
+    assert options("SELECT * FROM subscribers WHERE ric = 'a' FOR UPDATE") == EXPLAIN_PLAN
+    assert options("SELECT * FROM subscribers FOR KEY SHARE") == EXPLAIN_PLAN
+    assert options("EXECUTE subscribers_get_subscriber ('a')") is None
+    assert options("COPY subscribers FROM STDIN") is None
+
+
+def test_search_query_parameters():
+    """Пошук екранує шаблони LIKE і нумерує для asyncpg лише використані параметри"""
+    import re
+    from databases.search import escape_like, search_params, asyncpg_search_query, psycopg_search_query
+
+    assert escape_like("50%_a\\b") == "50\\%\\_a\\\\b"
+    params = search_params("  ric-1_ ", limit=10, min_score=0.4)
+    assert params["term"] == "ric-1_"
+    assert params["exact"] == "RIC-1_"
+    assert params["prefix"] == "RIC-1\\_%"
+    assert params["contains"] == "%ric-1\\_%"
+
+    for trigram in (True, False):
+        query, names = asyncpg_search_query("ric", trigram)
+        numbers = sorted({int(n) for n in re.findall(r"\$(\d+)", query)})
+        assert numbers == list(range(1, len(names) + 1))
+        assert ("term" in names) is trigram
+        assert {"prefix", "limit", "min_score"} <= set(names)
+        assert "{" not in psycopg_search_query("ric", trigram)
+
+
+def test_change_events_are_compact_and_coalesced():
+    """Подія змін несе лише потрібні колонки, а пачка згортається до останнього стану RIC"""
+    import json
+    from decimal import Decimal
+    from databases.change_stream import encode_change, coalesce_events, OP_RESET
+
+    row = {"ric": "RIC-1", "pin_code": "0000", "full_name": "Іван", "monthly_fee": Decimal("150.50"),
+           "is_active": True, "last_payment_date": date(2024, 1, 31)}
+    event = encode_change("RIC-1", row)
+    assert json.loads(event["row"]) == {"full_name": "Іван", "monthly_fee": 150.5,
+                                        "is_active": True, "last_payment_date": "2024-01-31"}
+    assert encode_change("RIC-2", None) == {"op": "d", "ric": "RIC-2"}
+
+    events = [
+        encode_change("RIC-1", row),
+        encode_change("RIC-2", row),
+        encode_change("RIC-1", dict(row, monthly_fee=200)),
+        encode_change("RIC-2", None),
+    ]
+    reset, changes = coalesce_events(events)
+    assert reset is False
+    assert [ric for ric, _ in changes] == ["RIC-1", "RIC-2"]
+    assert changes[0][1]["monthly_fee"] == 200 and changes[1][1] is None
+
+    # очищення таблиці скасовує зміни, що були до нього в тій самій пачці
+    reset, changes = coalesce_events(events + [{"op": OP_RESET}, encode_change("RIC-3", row)])
+    assert reset is True
+    assert [ric for ric, _ in changes] == ["RIC-3"]
+
+
+def test_job_fingerprint_ignores_param_order():
+    """Однакові звіти з параметрами в різному порядку мають один відбиток"""
+    from databases.jobs import job_fingerprint
+
+    assert job_fingerprint("debtors_report", {"a": 1, "b": date(2024, 1, 1)}) == \
+        job_fingerprint("debtors_report", {"b": date(2024, 1, 1), "a": 1})
+    assert job_fingerprint("debtors_report", {}) != job_fingerprint("tariff_report", {})
+    assert job_fingerprint("debtors_report", {"a": 1}) != job_fingerprint("debtors_report", {"a": 2})
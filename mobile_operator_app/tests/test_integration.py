@@ -1,8 +1,10 @@
 # tests/test_integration.py
 import pytest
 import time
-from datetime import date
-from databases.postgres_db import PostgresManager
+import asyncio
+import numpy as np
+from datetime import date, datetime, timedelta
+from databases.postgres_db import PostgresManager, subscriber_row
 from databases.mongo_db import MongoManager
 from databases.redis_db import RedisManager
 from databases.models import Subscriber, ServiceRequest
@@ -82,7 +84,7 @@ def test_redis_caching():
 
     print(" Робимо абонента RIC-TEST-001 боржником у SQL...")
     query = "UPDATE subscribers SET last_payment_date = CURRENT_DATE - INTERVAL '2 month' WHERE ric = 'RIC-TEST-001'"
-    with pg.connection.cursor() as cursor:
+    with pg.connection() as conn, conn.cursor() as cursor:
         cursor.execute(query)
 
 
@@ -105,4 +107,1189 @@ def test_redis_caching():
     empty = redis.get_cached_debtors()
     assert len(empty) == 0
     print(" Кеш Redis успішно очищено")
-    pg.close()
\ No newline at end of file
+    pg.close()
+
+@pytest.mark.order(4)
+def test_postgres_pool_concurrency_and_reconnect():
+    print("\n---  TEST: PostgreSQL Connection Pool ---")
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    pg = PostgresManager(min_connections=1, max_connections=3)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: pg.get_subscriber("RIC-TEST-001"), range(40)))
+
+    assert all(r is not None for r in results)
+    stats = pg.pool_stats()
+    print(f"   Статистика пулу: {stats}")
+    assert stats["checkouts"] >= 40
+    assert stats["in_use"] == 0
+    assert stats["idle"] <= 3
+
+    print(" Обриваємо з'єднання та перевіряємо перепідключення...")
+    with pg.connection() as conn:
+        conn.close()
+    assert pg.get_subscriber("RIC-TEST-001") is not None
+
+    pg.close()
+
+
+@pytest.mark.order(5)
+def test_postgres_streaming_and_keyset_pages():
+    print("\n---  TEST: PostgreSQL Streaming & Pagination ---")
+
+    pg = PostgresManager()
+
+    for i in range(1, 8):
+        pg.add_subscriber(Subscriber(
+            ric=f"RIC-PAGE-{i:03d}",
+            pin_code="1111",
+            full_name=f"Абонент {i}",
+            phone_model="Pixel 7",
+            phone_type="Смартфон",
+            service_type="Стандарт",
+            contract_start_date=date.today(),
+            contract_duration_months=12,
+            monthly_fee=150.0,
+            last_payment_date=date.today()
+        ))
+
+    streamed = list(pg.iter_subscribers(itersize=2))
+    assert {s.ric for s in streamed} == {s.ric for s in pg.get_all_subscribers()}
+    print(f"   Потоково зчитано: {len(streamed)}")
+
+    pages = []
+    after_ric = None
+    while True:
+        page = pg.get_subscribers_page(after_ric=after_ric, limit=3)
+        if not page:
+            break
+        assert len(page) <= 3
+        pages.append(page)
+        after_ric = page[-1].ric
+
+    rics = [s.ric for page in pages for s in page]
+    assert rics == sorted(s.ric for s in streamed)
+    print(f" Сторінок: {len(pages)}, записів: {len(rics)}")
+
+    pg.close()
+
+
+@pytest.mark.order(6)
+def test_postgres_bulk_copy_insert(monkeypatch):
+    print("\n---  TEST: PostgreSQL Bulk COPY ---")
+
+    pg = PostgresManager()
+
+    def make(i, name, fee=100.0):
+        return Subscriber(
+            ric=f"RIC-BULK-{i:05d}",
+            pin_code="2222",
+            full_name=name,
+            phone_model='Nokia "3310", classic',
+            phone_type="Кнопковий",
+            service_type="Економ",
+            contract_start_date=date.today(),
+            contract_duration_months=6,
+            monthly_fee=fee,
+            last_payment_date=None
+        )
+
+    batch = [make(i, f"Масовий {i}") for i in range(1000)]
+    batch.append(make(0, "Дублікат"))
+
+    result = pg.bulk_add_subscribers(batch, chunk_size=300)
+    print(f"   Результат: {result}")
+    assert result == {"inserted": 1000, "updated": 0, "skipped": 1}
+
+    stored = pg.get_subscriber("RIC-BULK-00000")
+    assert stored.full_name == "Масовий 0"
+    assert stored.phone_model == 'Nokia "3310", classic'
+    assert stored.last_payment_date is None
+
+    result = pg.bulk_add_subscribers([make(0, "Оновлений", fee=120.0), make(1000, "Новий")], upsert=True)
+    assert result == {"inserted": 1, "updated": 1, "skipped": 0}
+    assert pg.get_subscriber("RIC-BULK-00000").monthly_fee == 120.0
+    print(" COPY-імпорт зберіг семантику ON CONFLICT")
+
+    # порожня таблиця заповнюється прямим COPY: окрема схема, щоб не чіпати дані інших тестів
+    with pg.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DROP SCHEMA IF EXISTS bulk_empty_test CASCADE; CREATE SCHEMA bulk_empty_test")
+    monkeypatch.setenv("PGOPTIONS", "-c search_path=bulk_empty_test,public")
+    empty = PostgresManager()
+    try:
+        with empty.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'subscribers' AND schemaname = 'bulk_empty_test'")
+            indexes = {row[0] for row in cursor.fetchall()}
+
+        changes = []
+        empty.add_change_listener(changes.extend)
+        # RIC-BULK-00001 повторюється в наступній пачці: вона зливається через staging
+        batch = [make(i, f"Масовий {i}") for i in range(500)]
+        batch.insert(300, make(1, "Дублікат"))
+        result = empty.bulk_add_subscribers(batch, chunk_size=300)
+        print(f"   Порожня таблиця: {result}")
+        assert result == {"inserted": 500, "updated": 0, "skipped": 1}
+        assert len(changes) == 500
+        assert empty.get_subscriber("RIC-BULK-00001").full_name == "Масовий 1"
+        assert empty.get_subscriber("RIC-BULK-00000").phone_model == 'Nokia "3310", classic'
+
+        with empty.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'subscribers' AND schemaname = 'bulk_empty_test'")
+            assert {row[0] for row in cursor.fetchall()} == indexes
+            cursor.execute("SELECT user_count, total_revenue::float8 FROM tariff_stats WHERE service_type = 'Економ'")
+            assert cursor.fetchone() == (500, 50000.0)
+
+        # таблиця вже не порожня — звичайне злиття через staging
+        result = empty.bulk_add_subscribers([make(0, "Оновлений", fee=120.0), make(500, "Новий")], upsert=True)
+        assert result == {"inserted": 1, "updated": 1, "skipped": 0}
+        assert changes[-2:] == [("RIC-BULK-00000", subscriber_row(make(0, "Оновлений", fee=120.0))),
+                                ("RIC-BULK-00500", subscriber_row(make(500, "Новий")))]
+        print(" Порожню таблицю заповнено прямим COPY з перебудовою індексів")
+    finally:
+        empty.close()
+        monkeypatch.delenv("PGOPTIONS")
+        with pg.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("DROP SCHEMA bulk_empty_test CASCADE")
+        pg.close()
+
+
+@pytest.mark.order(7)
+def test_postgres_columnar_frames():
+    print("\n---  TEST: PostgreSQL Columnar Reads ---")
+
+    pg = PostgresManager()
+
+    with pg.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("UPDATE subscribers SET last_payment_date = CURRENT_DATE - 45 WHERE ric = 'RIC-PAGE-001'")
+
+    df = pg.get_subscribers_frame()
+    models = pg.get_all_subscribers()
+    assert len(df) == len(models)
+
+    by_ric = {s.ric: s.model_dump() for s in models}
+    for row in df.head(50).to_dict("records"):
+        expected = by_ric[row["ric"]]
+        assert row["monthly_fee"] == expected["monthly_fee"]
+        assert row["total_cost"] == expected["total_cost"]
+
+    page = pg.get_subscribers_frame(after_ric="RIC-PAGE-002", limit=2)
+    assert page["ric"].tolist() == ["RIC-PAGE-003", "RIC-PAGE-004"]
+
+    debtors_df = pg.get_debtors_frame()
+    debtors = pg.get_debtors_raw()
+    assert sorted(debtors_df["ric"]) == sorted(d.ric for d in debtors)
+    expected_debt = {d.ric: d.debt_amount for d in debtors}
+    assert dict(zip(debtors_df["ric"], debtors_df["debt_amount"])) == expected_debt
+    expected_days = {d.ric: d.days_overdue for d in debtors}
+    assert dict(zip(debtors_df["ric"], debtors_df["days_overdue"])) == expected_days
+    print(f"   Боржників у DataFrame: {len(debtors_df)}")
+
+    analytics = pg.get_tariff_analytics_frame()
+    legacy = pg.get_tariff_analytics()
+    assert analytics["service_type"].tolist() == [row["service_type"] for row in legacy]
+    assert analytics["total_revenue"].tolist() == [float(row["total_revenue"]) for row in legacy]
+
+    pg.close()
+
+
+@pytest.mark.order(8)
+def test_postgres_debtors_report_pushdown():
+    print("\n---  TEST: PostgreSQL Debtors Report ---")
+
+    from datetime import timedelta
+
+    pg = PostgresManager()
+    as_of = date.today()
+
+    for i, (days, fee) in enumerate([(45, 100.0), (95, 150.0), (200, 99.99), (400, 10.0)]):
+        pg.add_subscriber(Subscriber(
+            ric=f"RIC-DEBT-{i}",
+            pin_code="3333",
+            full_name=f"Боржник {i}",
+            phone_model="iPhone 13",
+            phone_type="Смартфон",
+            service_type="Преміум",
+            contract_start_date=as_of - timedelta(days=500),
+            contract_duration_months=12,
+            monthly_fee=fee,
+            last_payment_date=as_of - timedelta(days=days)
+        ))
+
+    full = pg.get_debtors_report(as_of=as_of)
+    expected = {d.ric: d.debt_amount for d in pg.get_debtors_raw()}
+    assert dict(zip(full["ric"], full["debt_amount"])) == expected
+    assert full["debt_amount"].tolist() == sorted(expected.values(), reverse=True)
+
+    page = pg.get_debtors_report(order_by="days_overdue", descending=False, limit=2, offset=1, as_of=as_of)
+    by_days = full.sort_values(["days_overdue", "ric"])
+    assert page["ric"].tolist() == by_days["ric"].tolist()[1:3]
+
+    filtered = pg.get_debtors_report(min_debt=500.0, as_of=as_of)
+    assert all(filtered["debt_amount"] >= 500.0)
+
+    totals = pg.get_debtors_totals(as_of=as_of)
+    assert totals["debtors_count"] == len(full)
+    assert totals["total_debt"] == pytest.approx(full["debt_amount"].sum())
+    print(f"   Підсумки: {totals}")
+
+    with pytest.raises(ValueError):
+        pg.get_debtors_report(order_by="pin_code; DROP TABLE subscribers")
+
+    pg.close()
+
+
+@pytest.mark.order(9)
+def test_postgres_migrations_and_index_usage():
+    print("\n---  TEST: PostgreSQL Migrations & Index Usage ---")
+
+    import random
+    from datetime import timedelta
+    from databases.migrations import MIGRATIONS
+
+    pg = PostgresManager()
+
+    with pg.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT version FROM schema_migrations ORDER BY version")
+        versions = [row[0] for row in cursor.fetchall()]
+    assert versions == [version for version, _, _ in MIGRATIONS]
+    assert pg._migrate() == []
+    print(f"   Застосовані міграції: {versions}")
+
+    rng = random.Random(42)
+    services = ["Преміум", "Стандарт", "Економ", "Студент"]
+    scale = (
+        Subscriber(
+            ric=f"RIC-SCALE-{i:07d}",
+            pin_code=str(rng.randint(1000, 9999)),
+            full_name=f"Шевченко Тарас Григорович {i}",
+            phone_model="Samsung Galaxy S21 Ultra",
+            phone_type="Смартфон",
+            service_type=rng.choice(services),
+            contract_start_date=date.today() - timedelta(days=rng.randint(100, 1000)),
+            contract_duration_months=12,
+            monthly_fee=float(rng.choice([150, 250, 500])),
+            is_active=rng.random() < 0.8,
+            last_payment_date=date.today() - timedelta(days=rng.choice([1, 5, 10, 20] * 20 + [45]))
+        )
+        for i in range(100_000)
+    )
+
+    try:
+        pg.bulk_add_subscribers(scale)
+        with pg.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("VACUUM ANALYZE subscribers")
+
+        offenders = pg.check_index_usage()
+        print(f"   Запити з Seq Scan: {offenders}")
+        assert offenders == {}
+    finally:
+        with pg.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("DELETE FROM subscribers WHERE ric LIKE 'RIC-SCALE-%%'")
+        pg.close()
+
+
+@pytest.mark.order(10)
+def test_redis_write_through_debtors_cache():
+    print("\n---  TEST: Redis Write-Through Debtors Cache ---")
+
+    from datetime import timedelta
+
+    pg = PostgresManager()
+    redis = RedisManager()
+    pg.add_change_listener(redis.apply_subscriber_changes)
+
+    redis.cache_debtors_frame(pg.get_debt_candidates_frame())
+    assert redis.is_debtors_cache_ready()
+
+    def cached_rics():
+        return set(redis.get_cached_debtors_frame().get("ric", []))
+
+    def sql_rics():
+        return set(pg.get_debtors_frame()["ric"])
+
+    assert cached_rics() == sql_rics()
+
+    pg.add_subscriber(Subscriber(
+        ric="RIC-WT-001",
+        pin_code="4444",
+        full_name="Кешований Боржник",
+        phone_model="Xiaomi 13",
+        phone_type="Смартфон",
+        service_type="Стандарт",
+        contract_start_date=date.today() - timedelta(days=300),
+        contract_duration_months=12,
+        monthly_fee=250.0,
+        last_payment_date=date.today() - timedelta(days=70)
+    ))
+    assert "RIC-WT-001" in cached_rics()
+    print(" Новий боржник з'явився в кеші без перебудови")
+
+    pg.update_subscriber("RIC-WT-001", {"last_payment_date": date.today()})
+    assert "RIC-WT-001" not in cached_rics()
+
+    pg.update_subscriber("RIC-WT-001", {"last_payment_date": date.today() - timedelta(days=40)})
+    assert "RIC-WT-001" in cached_rics()
+    debt = redis.get_cached_debtors_frame().set_index("ric").loc["RIC-WT-001", "debt_amount"]
+    assert debt == 500.0
+
+    pg.deactivate_subscriber("RIC-WT-001")
+    assert "RIC-WT-001" not in cached_rics()
+
+    pg.update_subscriber("RIC-WT-001", {"is_active": True})
+    assert "RIC-WT-001" in cached_rics()
+
+    pg.delete_subscriber("RIC-WT-001")
+    assert "RIC-WT-001" not in cached_rics()
+
+    assert cached_rics() == sql_rics()
+    print(" Кеш збігається з PostgreSQL після всіх змін")
+
+    redis.clear_cache()
+    assert not redis.is_debtors_cache_ready()
+    pg.close()
+
+
+@pytest.mark.order(11)
+def test_redis_single_flight_rebuild():
+    print("\n---  TEST: Redis Single-Flight Rebuild ---")
+
+    import threading
+    import pandas as pd
+    from datetime import timedelta
+    from concurrent.futures import ThreadPoolExecutor
+
+    redis = RedisManager()
+    redis.clear_cache()
+
+    old_date = date.today() - timedelta(days=90)
+    snapshot = pd.DataFrame([
+        {"ric": f"RIC-SF-{i}", "full_name": f"Боржник {i}", "monthly_fee": 100.0, "last_payment_date": old_date}
+        for i in range(50)
+    ])
+    calls = []
+    release = threading.Event()
+
+    def slow_loader():
+        calls.append(1)
+        release.wait(5)
+        return snapshot
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        futures = [executor.submit(redis.get_or_rebuild_debtors_frame, slow_loader) for _ in range(10)]
+        time.sleep(0.3)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert len(calls) == 1
+    assert all(len(df) == 50 for df, _ in results)
+    print(f" 10 одночасних запитів -> {len(calls)} перебудова")
+
+    redis.invalidate_debtors_cache()
+    release.clear()
+    updated = pd.concat([snapshot, pd.DataFrame([{
+        "ric": "RIC-SF-NEW", "full_name": "Новий", "monthly_fee": 100.0, "last_payment_date": old_date
+    }])])
+
+    def loader_with_write():
+        # запис під час побудови не повинен загубитися після підміни звіту
+        redis.apply_subscriber_changes([("RIC-SF-0", None)])
+        release.wait(5)
+        return updated
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        builder = executor.submit(redis.get_or_rebuild_debtors_frame, loader_with_write)
+        time.sleep(0.3)
+        stale_df, is_stale = redis.get_or_rebuild_debtors_frame(loader_with_write)
+        release.set()
+        fresh_df, _ = builder.result()
+
+    assert is_stale and len(stale_df) == 49
+    assert "RIC-SF-NEW" in set(fresh_df["ric"])
+    assert "RIC-SF-0" not in set(fresh_df["ric"])
+    print(" Під час перебудови віддано попередню версію, зміни не загублено")
+
+    # перебудова довша за оренду: блокування й журнал подовжуються, другої перебудови немає
+    redis.lock_lease_seconds = 1
+    redis.invalidate_debtors_cache()
+    calls.clear()
+
+    def loader_longer_than_lease():
+        calls.append(1)
+        time.sleep(1.5)
+        redis.apply_subscriber_changes([("RIC-SF-1", None)])
+        time.sleep(1.5)
+        return snapshot
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        builder = executor.submit(redis.get_or_rebuild_debtors_frame, loader_longer_than_lease)
+        time.sleep(2.5)
+        redis.r.delete(redis.entries_key)  # інакше другий клієнт просто отримав би стару копію
+        second = executor.submit(redis.get_or_rebuild_debtors_frame, loader_longer_than_lease, wait_timeout=5)
+        fresh_df, _ = builder.result()
+        second.result()
+
+    assert len(calls) == 1
+    assert "RIC-SF-1" not in set(fresh_df["ric"]) and len(fresh_df) == 49
+    print(" Оренду подовжено, зміни під час довгої перебудови збережено")
+
+    # побудова, що втратила маркер, не підміняє звіт своєю копією
+    redis.invalidate_debtors_cache()
+
+    def loader_losing_lease():
+        redis.r.set(redis.build_key, "інший-клієнт")
+        return snapshot
+
+    redis.get_or_rebuild_debtors_frame(loader_losing_lease)
+    assert not redis.is_debtors_cache_ready()
+    redis.r.delete(redis.build_key)
+
+    redis.clear_cache()
+
+
+@pytest.mark.order(12)
+def test_subscriber_read_through_cache():
+    print("\n---  TEST: Subscriber Read-Through Cache ---")
+
+    from databases.subscriber_cache import SubscriberCache
+
+    pg = PostgresManager()
+    redis = RedisManager()
+    cache = SubscriberCache(redis.r)
+    cache.clear()
+    pg.enable_subscriber_cache(cache)
+
+    assert pg.get_subscriber("RIC-CACHE-001") is None
+    assert pg.get_subscriber("RIC-CACHE-001") is None
+    assert cache.stats()["negative_hits"] == 1
+
+    pg.add_subscriber(Subscriber(
+        ric="RIC-CACHE-001",
+        pin_code="5555",
+        full_name="Кешований Абонент",
+        phone_model="Pixel 7",
+        phone_type="Смартфон",
+        service_type="Стандарт",
+        contract_start_date=date.today(),
+        contract_duration_months=12,
+        monthly_fee=150.0,
+        last_payment_date=date.today()
+    ))
+    found = pg.get_subscriber("RIC-CACHE-001")
+    assert found is not None and found.full_name == "Кешований Абонент"
+
+    # другий процес бачить запис через спільний Redis-рівень
+    other = SubscriberCache(redis.r)
+    assert other.get("RIC-CACHE-001", lambda ric: None).full_name == "Кешований Абонент"
+    assert other.stats()["redis_hits"] == 1
+
+    pg.update_subscriber("RIC-CACHE-001", {"full_name": "Оновлений Абонент"})
+    assert pg.get_subscriber("RIC-CACHE-001").full_name == "Оновлений Абонент"
+
+    # запис між читанням рядка і заповненням кешу: старий рядок не потрапляє в Redis
+    def racing_loader(ric):
+        row = pg._load_subscriber(ric)
+        pg.update_subscriber(ric, {"full_name": "Після гонки"})
+        return row
+
+    cache.invalidate(["RIC-CACHE-001"])
+    assert cache.get("RIC-CACHE-001", racing_loader).full_name == "Оновлений Абонент"
+    assert redis.r.get(cache.key_prefix + "RIC-CACHE-001") is None
+    assert pg.get_subscriber("RIC-CACHE-001").full_name == "Після гонки"
+    assert SubscriberCache(redis.r).get("RIC-CACHE-001", lambda ric: None).full_name == "Після гонки"
+
+    pg.deactivate_subscriber("RIC-CACHE-001")
+    assert pg.get_subscriber("RIC-CACHE-001").is_active is False
+
+    pg.delete_subscriber("RIC-CACHE-001")
+    assert pg.get_subscriber("RIC-CACHE-001") is None
+    print(f"   Статистика кешу: {cache.stats()}")
+
+    cache.clear()
+    pg.close()
+
+
+@pytest.mark.order(13)
+def test_mongo_indexes_and_projections():
+    print("\n---  TEST: MongoDB Indexes & Projections ---")
+
+    from databases.mongo_db import QUEUE_FIELDS, plan_stages
+
+    mongo = MongoManager()
+    indexes = mongo.collection.index_information()
+    assert {"status_created_at_id", "ric_created_at", "created_at"} <= set(indexes)
+    assert "status_created_at" not in indexes
+
+    req_id = mongo.create_request(ServiceRequest(
+        ric="RIC-TEST-IDX",
+        phone_model="Pixel 7",
+        issue_description="Перевірка проєкції"
+    ))
+
+    queue = mongo.get_all_requests(only_open=True, fields=QUEUE_FIELDS)
+    row = next(r for r in queue if r["id"] == req_id)
+    assert set(row) == set(QUEUE_FIELDS) | {"id"}
+
+    for filter_query in ({"status": "open"}, {"ric": "RIC-TEST-IDX"}):
+        stages = plan_stages(mongo.explain_find(filter_query))
+        print(f"   План для {filter_query}: {stages}")
+        assert "IXSCAN" in stages
+        assert "COLLSCAN" not in stages
+        assert "SORT" not in stages
+
+    mongo.delete_request(req_id)
+
+
+@pytest.mark.order(14)
+def test_open_requests_keyset_pages():
+    print("\n---  TEST: Open Requests Keyset Pagination ---")
+
+    mongo = MongoManager()
+    created = [
+        mongo.create_request(ServiceRequest(
+            ric="RIC-TEST-PAGE",
+            phone_model="Pixel 7",
+            issue_description=f"Заявка {i}"
+        ))
+        for i in range(7)
+    ]
+    # однаковий created_at перевіряє, що _id розв'язує нічию між сторінками
+    mongo.collection.update_many({"ric": "RIC-TEST-PAGE"},
+                                 {"$set": {"created_at": datetime(2099, 1, 1)}})
+
+    total_open = mongo.count_open_requests()
+    assert total_open >= len(created)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = mongo.get_open_requests_page(after=cursor, limit=3)
+        assert len(page) <= 3
+        seen.extend(r["id"] for r in page)
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen)) == total_open
+    assert seen[:len(created)] == list(reversed(created))
+    print(f"   Пройдено сторінками: {len(seen)} заявок")
+
+    for req_id in created:
+        mongo.delete_request(req_id)
+
+
+@pytest.mark.order(15)
+def test_bulk_request_operations():
+    print("\n---  TEST: Bulk Request Operations ---")
+
+    mongo = MongoManager()
+    mongo.batch_size = 4
+    ids = mongo.create_requests(
+        ServiceRequest(ric="RIC-TEST-BULK", phone_model="Pixel 7", issue_description=f"Масова заявка {i}")
+        for i in range(10)
+    )
+    assert len(ids) == 10 and all(ids)
+    assert len(mongo.get_requests_by_ric("RIC-TEST-BULK")) == 10
+
+    missing_id = "0" * 24
+    closed = mongo.close_requests(ids[:6] + [missing_id, "not-an-id"])
+    assert all(closed[req_id] for req_id in ids[:6])
+    assert closed[missing_id] is False and closed["not-an-id"] is False
+
+    # повторне закриття нічого не змінює
+    assert not any(mongo.close_requests(ids[:6]).values())
+    statuses = {r["id"]: r["status"] for r in mongo.get_requests_by_ric("RIC-TEST-BULK")}
+    assert sum(status == "closed" for status in statuses.values()) == 6
+
+    deleted = mongo.delete_requests(ids + [missing_id])
+    assert all(deleted[req_id] for req_id in ids)
+    assert deleted[missing_id] is False
+    assert mongo.get_requests_by_ric("RIC-TEST-BULK") == []
+
+
+@pytest.mark.order(16)
+def test_async_postgres_and_redis():
+    print("\n---  TEST: Async Postgres & Redis ---")
+
+    from databases.async_postgres_db import AsyncPostgresManager
+    from databases.async_redis_db import AsyncRedisManager
+
+    sub = Subscriber(
+        ric="RIC-ASYNC-001", pin_code="4321", full_name="Async Абонент",
+        phone_model="Pixel 7", phone_type="Смартфон", service_type="Стандарт",
+        contract_start_date=date(2023, 1, 1), contract_duration_months=12,
+        monthly_fee=250.0, last_payment_date=date.today() - timedelta(days=90)
+    )
+
+    from databases.subscriber_cache import SubscriberCache
+    from databases.result_cache import ColumnsResultCache
+
+    cache = SubscriberCache(RedisManager().r)
+    columns_cache = ColumnsResultCache(RedisManager().r)
+
+    async def scenario():
+        pg = await AsyncPostgresManager().connect()
+        redis = AsyncRedisManager()
+        pg.add_change_listener(redis.apply_subscriber_changes)
+        pg.enable_subscriber_cache(cache)
+        pg.enable_columns_cache(columns_cache)
+        try:
+            await pg.add_subscriber(sub)
+            found = await pg.get_subscriber(sub.ric)
+            assert found is not None and found.full_name == sub.full_name
+            # повторний пошук обслуговує спільний кеш, а не Postgres
+            assert (await pg.get_subscriber(sub.ric)).ric == sub.ric
+            assert cache.stats()["misses"] == 1 and cache.stats()["local_hits"] == 1
+
+            # запис через async-шар теж оновлює кеш боржників
+            cached = await redis.get_cached_debtors_frame()
+            assert sub.ric in set(cached["ric"])
+
+            # вибірка колонок іде через той самий кеш, що й у синхронного менеджера
+            columns = await pg.get_custom_columns(["monthly_fee", "ric"])
+            assert await pg.get_custom_columns(["ric", "monthly_fee"]) is columns
+            assert (await pg.get_custom_columns(["ric"]))["ric"] is columns["ric"]
+            assert columns_cache.stats()["hits"] == 1 and columns_cache.stats()["subset_hits"] == 1
+
+            # порядок полів в updates не впливає на результат
+            await pg.update_subscriber(sub.ric, {"full_name": "Async Перший", "monthly_fee": 250.0})
+            await pg.update_subscriber(sub.ric, {"monthly_fee": 300.0, "full_name": "Async Другий"})
+            updated = await pg.get_subscriber(sub.ric)
+            assert (updated.full_name, updated.monthly_fee) == ("Async Другий", 300.0)
+            report = await pg.get_debtors_report(min_debt=0.0)
+            row = report[report["ric"] == sub.ric].iloc[0]
+            assert row["monthly_fee"] == 300.0
+            assert row["debt_amount"] == 900.0
+
+            # запис через async-шар піднімає версію таблиці, і колонки читаються заново
+            fees = (await pg.get_custom_columns(["ric", "monthly_fee"]))["monthly_fee"]
+            assert 300.0 in fees and fees is not columns["monthly_fee"]
+
+            frame = await pg.get_subscribers_frame(limit=5)
+            assert "total_cost" in frame.columns
+
+            streamed = [s.ric async for s in pg.iter_subscribers(itersize=2)]
+            assert sub.ric in streamed
+
+            await pg.delete_subscriber(sub.ric)
+            assert await pg.get_subscriber(sub.ric) is None
+            cached = await redis.get_cached_debtors_frame()
+            assert cached.empty or sub.ric not in set(cached["ric"])
+        finally:
+            await pg.close()
+            await redis.close()
+
+    PostgresManager().close()  # міграції виконує синхронний менеджер
+    asyncio.run(scenario())
+
+
+@pytest.mark.order(17)
+def test_async_facade_fan_out():
+    print("\n---  TEST: Async Facade Fan-out ---")
+
+    from databases.async_facade import AsyncDataFacade
+
+    pg = PostgresManager()
+    mongo = MongoManager()
+    sub = Subscriber(
+        ric="RIC-ASYNC-002", pin_code="4321", full_name="Фасад Абонент",
+        phone_model="Pixel 7", phone_type="Смартфон", service_type="Стандарт",
+        contract_start_date=date(2023, 1, 1), contract_duration_months=12, monthly_fee=150.0
+    )
+    pg.add_subscriber(sub)
+    req_id = mongo.create_request(ServiceRequest(
+        ric=sub.ric, phone_model=sub.phone_model, issue_description="Історія для фасаду"
+    ))
+
+    facade = AsyncDataFacade().start()
+    try:
+        subscriber, history = facade.run(facade.get_subscriber_with_history(sub.ric))
+        assert subscriber.ric == sub.ric
+        assert [r["id"] for r in history] == [req_id]
+    finally:
+        facade.stop()
+        mongo.delete_request(req_id)
+        pg.delete_subscriber(sub.ric)
+        pg.close()
+
+
+@pytest.mark.order(18)
+def test_batched_subscriber_profiles():
+    print("\n---  TEST: Batched Subscriber Profiles ---")
+
+    from databases.profiles import build_profiles
+    from databases.mongo_db import HISTORY_FIELDS
+
+    pg = PostgresManager()
+    mongo = MongoManager()
+    rics = [f"RIC-PROFILE-{i}" for i in range(3)]
+    pg.bulk_add_subscribers(
+        Subscriber(
+            ric=ric, pin_code="0000", full_name=f"Профіль {i}", phone_model="Pixel 7",
+            phone_type="Смартфон", service_type="Стандарт", contract_start_date=date(2023, 1, 1),
+            contract_duration_months=12, monthly_fee=100.0,
+            last_payment_date=date.today() - timedelta(days=40 * i)
+        )
+        for i, ric in enumerate(rics)
+    )
+    req_ids = mongo.create_requests(
+        ServiceRequest(ric=ric, phone_model="Pixel 7", issue_description="Профіль")
+        for ric in rics[:2] for _ in range(2)
+    )
+    mongo.close_requests(req_ids[:1])
+
+    subscribers = pg.get_subscribers(rics + ["RIC-PROFILE-404"])
+    assert [s.ric for s in subscribers] == rics
+
+    history = mongo.get_requests_by_rics(rics, fields=["status"])
+    assert {ric: len(items) for ric, items in history.items()} == {rics[0]: 2, rics[1]: 2, rics[2]: 0}
+    assert all("ric" in item for items in history.values() for item in items)
+
+    profiles = build_profiles(rics, subscribers, mongo.get_requests_by_rics(rics, fields=HISTORY_FIELDS))
+    assert profiles[rics[0]].open_requests == 1
+    assert profiles[rics[1]].open_requests == 2
+    assert profiles[rics[0]].debt_amount == 0.0
+    assert profiles[rics[2]].debt_amount > 0
+
+    mongo.delete_requests(req_ids)
+    for ric in rics:
+        pg.delete_subscriber(ric)
+    pg.close()
+
+
+@pytest.mark.order(19)
+def test_materialized_tariff_stats():
+    print("\n---  TEST: Materialized Tariff Stats ---")
+
+    pg = PostgresManager()
+
+    def live_stats():
+        with pg.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT service_type, COUNT(*), SUM(monthly_fee)::float8
+                FROM subscribers WHERE is_active GROUP BY service_type
+            """)
+            return {row[0]: (row[1], round(row[2], 2)) for row in cursor.fetchall()}
+
+    def materialized_stats():
+        return {row["service_type"]: (row["user_count"], round(row["total_revenue"], 2))
+                for row in pg.get_tariff_analytics()}
+
+    rics = [f"RIC-TARIFF-{i}" for i in range(6)]
+    pg.bulk_add_subscribers(
+        Subscriber(
+            ric=ric, pin_code="0000", full_name="Тариф", phone_model="Pixel 7", phone_type="Смартфон",
+            service_type=["Преміум", "Економ"][i % 2], contract_start_date=date(2024, 1 + i % 3, 10),
+            contract_duration_months=12, monthly_fee=100.0 + i
+        )
+        for i, ric in enumerate(rics)
+    )
+    assert materialized_stats() == live_stats()
+
+    pg.update_subscriber(rics[0], {"service_type": "Студент", "monthly_fee": 55.5})
+    pg.update_subscriber(rics[1], {"full_name": "Без впливу на статистику"})
+    pg.deactivate_subscriber(rics[2])
+    pg.delete_subscriber(rics[3])
+    pg.bulk_add_subscribers([
+        Subscriber(
+            ric=rics[4], pin_code="0000", full_name="Тариф", phone_model="Pixel 7", phone_type="Смартфон",
+            service_type="Преміум", contract_start_date=date(2024, 2, 1),
+            contract_duration_months=12, monthly_fee=999.0
+        )
+    ], upsert=True)
+    assert materialized_stats() == live_stats()
+
+    history = pg.get_tariff_revenue_history()
+    with pg.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(SUM(monthly_fee), 0)::float8 FROM subscribers WHERE is_active")
+        assert round(history["total_revenue"].sum(), 2) == round(cursor.fetchone()[0], 2)
+
+    # перерахунок з нуля дає той самий результат, що й інкрементні оновлення
+    before = materialized_stats()
+    pg.rebuild_tariff_stats()
+    assert materialized_stats() == before
+
+    for ric in rics:
+        pg.delete_subscriber(ric)
+    assert materialized_stats() == live_stats()
+    pg.close()
+
+
+@pytest.mark.order(20)
+def test_custom_columns_result_cache():
+    print("\n---  TEST: Custom Columns Result Cache ---")
+
+    from databases.result_cache import ColumnsResultCache
+
+    pg = PostgresManager()
+    redis = RedisManager()
+    cache = ColumnsResultCache(redis.r)
+    pg.enable_columns_cache(cache)
+
+    sub = Subscriber(
+        ric="RIC-COLUMNS-001", pin_code="0000", full_name="Колонки", phone_model="Pixel 7",
+        phone_type="Смартфон", service_type="Стандарт", contract_start_date=date(2023, 1, 1),
+        contract_duration_months=12, monthly_fee=120.0
+    )
+    pg.add_subscriber(sub)
+
+    first = pg.get_custom_columns(["monthly_fee", "ric", "ric", "password"])
+    assert list(first) == ["ric", "monthly_fee"]
+    assert first["monthly_fee"].dtype == np.float64
+    # інший порядок тих самих колонок — той самий запис кешу
+    assert pg.get_custom_columns(["ric", "monthly_fee"]) is first
+
+    fees = dict(zip(first["ric"], first["monthly_fee"]))
+    assert fees[sub.ric] == 120.0
+
+    pg.update_subscriber(sub.ric, {"monthly_fee": 130.0})
+    second = pg.get_custom_columns(["ric", "monthly_fee"])
+    assert second is not first
+    assert dict(zip(second["ric"], second["monthly_fee"]))[sub.ric] == 130.0
+
+    # інший процес бачить ту саму версію таблиці через Redis
+    other = ColumnsResultCache(redis.r)
+    assert other.version() == cache.version()
+
+    pg.delete_subscriber(sub.ric)
+    assert sub.ric not in set(pg.get_custom_columns(["ric"])["ric"])
+    print(f"   Статистика кешу: {cache.stats()}")
+    pg.close()
+
+
+@pytest.mark.order(21)
+def test_prepared_hot_statements():
+    print("\n---  TEST: Prepared Hot Statements ---")
+
+    pg = PostgresManager(min_connections=1, max_connections=1)
+    sub = Subscriber(
+        ric="RIC-PREPARED-001", pin_code="0000", full_name="Підготовлений", phone_model="Pixel 7",
+        phone_type="Смартфон", service_type="Стандарт", contract_start_date=date(2023, 1, 1),
+        contract_duration_months=12, monthly_fee=100.0
+    )
+    pg.add_subscriber(sub)
+    for _ in range(3):
+        assert pg.get_subscriber(sub.ric).full_name == "Підготовлений"
+
+    # той самий набір колонок у різному порядку — один підготовлений UPDATE
+    pg.update_subscriber(sub.ric, {"monthly_fee": 110.0, "full_name": "Оновлений"})
+    pg.update_subscriber(sub.ric, {"full_name": "Ще раз", "monthly_fee": 120.0})
+    pg.update_subscriber(sub.ric, {"last_payment_date": date(2024, 5, 1), "is_active": False})
+    updated = pg.get_subscriber(sub.ric)
+    assert (updated.full_name, updated.monthly_fee) == ("Ще раз", 120.0)
+    assert updated.last_payment_date == date(2024, 5, 1) and updated.is_active is False
+
+    with pg.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT name FROM pg_prepared_statements")
+        prepared = {row[0] for row in cursor.fetchall()}
+    print(f"   Підготовлені запити: {sorted(prepared)}")
+    assert {"subscribers_add_subscriber", "subscribers_get_subscriber"} <= prepared
+    assert len([name for name in prepared if name.startswith("subscribers_update_")]) == 2
+
+    stats = pg.statement_stats()
+    assert stats["executions"] > stats["prepares"]
+
+    pg.delete_subscriber(sub.ric)
+    pg.close()
+
+
+@pytest.mark.order(22)
+def test_postgres_slow_query_log(tmp_path, monkeypatch):
+    print("\n---  TEST: Postgres Slow Query Log ---")
+    import json
+
+    # нульовий поріг: у журнал потрапляє кожен запит
+    monkeypatch.setenv("PG_SLOW_QUERY_MS", "0.0001")
+    monkeypatch.setenv("SLOW_QUERY_LOG", str(tmp_path / "slow.log"))
+    monkeypatch.setenv("SLOW_QUERY_COOLDOWN_SECONDS", "0")
+    pg = PostgresManager(min_connections=1, max_connections=1)
+
+    sub = Subscriber(
+        ric="RIC-SLOW-001", pin_code="0000", full_name="Повільний", phone_model="Pixel 7",
+        phone_type="Смартфон", service_type="Стандарт", contract_start_date=date(2023, 1, 1),
+        contract_duration_months=12, monthly_fee=100.0, last_payment_date=date(2024, 1, 1)
+    )
+    pg.add_subscriber(sub)
+    pg.get_tariff_analytics()
+    assert pg.get_subscriber(sub.ric).full_name == "Повільний"
+
+    with pg.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE subscribers SET monthly_fee = monthly_fee + 10 WHERE ric = %s RETURNING monthly_fee",
+                           (sub.ric,))
+            # EXPLAIN у фоні не зачіпає результат курсора
+            assert cursor.fetchone()[0] == 110.0
+        # EXPLAIN іде на окремому з'єднанні, тож не чекає на блокування рядка відкритою транзакцією
+        conn.autocommit = False
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE subscribers SET monthly_fee = monthly_fee + 10 WHERE ric = %s", (sub.ric,))
+        pg.slow_query_explainer.wait(timeout=10)
+        conn.commit()
+        conn.autocommit = True
+        assert conn.info.transaction_status == 0
+
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO subscribers (ric, pin_code, full_name, phone_model, phone_type, service_type,
+                                         contract_start_date, contract_duration_months, monthly_fee)
+                SELECT %s, pin_code, full_name, phone_model, phone_type, service_type,
+                       contract_start_date, contract_duration_months, monthly_fee
+                FROM subscribers WHERE ric = %s
+            """, ("RIC-SLOW-002", sub.ric))
+
+    # DML не виконується вдруге: кожен UPDATE застосувався рівно один раз
+    assert pg.get_subscriber(sub.ric).monthly_fee == 120.0
+    assert pg.get_subscriber("RIC-SLOW-002") is not None
+    assert sum(1 for _ in pg.iter_subscribers()) >= 2
+    pg.slow_query_explainer.wait(timeout=10)
+
+    entries = [json.loads(line) for line in (tmp_path / "slow.log").read_text(encoding="utf-8").splitlines()]
+    by_query = {entry["normalized"]: entry for entry in entries}
+    print(f"   Записів у журналі: {len(entries)}")
+
+    tariff = next(e for e in entries if "from tariff_stats" in e["normalized"])
+    assert "Execution Time" in tariff["plan"] and tariff["fingerprint"]
+    # для DML лише оцінний план, без повторного виконання і його помилок
+    update = by_query["update subscribers set monthly_fee = monthly_fee + ? where ric = ? returning monthly_fee"]
+    assert update["plan"]["Plan"]["Node Type"] == "ModifyTable" and "Execution Time" not in update["plan"]
+    insert = next(e for e in entries if e["normalized"].startswith("insert into subscribers"))
+    assert "explain_error" not in insert
+    assert insert["plan"]["Plan"]["Node Type"] == "ModifyTable" and "Execution Time" not in insert["plan"]
+    # EXECUTE читання пояснюється на фоновому з'єднанні через текст з реєстру підготовлених запитів
+    if pg.statements.enabled:
+        lookup = next(e for e in entries if e["normalized"].startswith("execute subscribers_get_subscriber"))
+        assert "Execution Time" in lookup["plan"]
+    assert not any("explain_error" in e for e in entries)
+    assert pg.slow_queries.stats()["captured"] == len(entries)
+    # значення параметрів (ПІБ, PIN, RIC) не потрапляють на диск ні з текстом, ні з планом
+    assert not any("query" in e for e in entries)
+    log_text = (tmp_path / "slow.log").read_text(encoding="utf-8")
+    assert "Повільний" not in log_text and "RIC-SLOW-001" not in log_text
+
+    pg.delete_subscriber(sub.ric)
+    pg.delete_subscriber("RIC-SLOW-002")
+    pg.close()
+
+
+@pytest.mark.order(23)
+def test_subscriber_search():
+    print("\n---  TEST: Subscriber Search ---")
+
+    from databases.async_postgres_db import AsyncPostgresManager
+
+    pg = PostgresManager()
+    print(f"   Режим пошуку: {'pg_trgm' if pg.trigram_search else 'ILIKE'}")
+    base = dict(pin_code="0000", phone_type="Смартфон", service_type="Стандарт",
+                contract_start_date=date(2023, 1, 1), contract_duration_months=12, monthly_fee=100.0)
+    subs = [
+        Subscriber(ric="RIC-SEARCH-001", full_name="Шевченко Тарас Григорович", phone_model="Pixel 7", **base),
+        Subscriber(ric="RIC-SEARCH-002", full_name="Шевчук Олена Петрівна", phone_model="iPhone 15", **base),
+        Subscriber(ric="RIC-SEARCH-010", full_name="Коваль Андрій", phone_model="Nokia Lumia 920", **base),
+    ]
+    for sub in subs:
+        pg.add_subscriber(sub)
+
+    try:
+        # префікс RIC без урахування регістру, точний збіг — першим
+        found = pg.search_subscribers("ric-search-00")
+        assert {"RIC-SEARCH-001", "RIC-SEARCH-002"} <= set(found["ric"])
+        assert "RIC-SEARCH-010" not in set(found["ric"])
+        exact = pg.search_subscribers("RIC-SEARCH-010")
+        assert exact["ric"].iloc[0] == "RIC-SEARCH-010" and exact["score"].iloc[0] == 1.0
+
+        by_name = pg.search_subscribers("Шевченко")
+        assert by_name["ric"].iloc[0] == "RIC-SEARCH-001"
+        assert list(by_name["score"]) == sorted(by_name["score"], reverse=True)
+
+        assert pg.search_subscribers("lumia")["ric"].iloc[0] == "RIC-SEARCH-010"
+        # символи шаблону LIKE — звичайні літери, а не маски
+        assert pg.search_subscribers("%%").empty
+        assert pg.search_subscribers("Ш").empty
+
+        if pg.trigram_search:
+            # одруківка в прізвищі все одно знаходить абонента
+            assert "RIC-SEARCH-001" in set(pg.search_subscribers("Шевчинко")["ric"])
+            assert "RIC-SEARCH-002" in set(pg.search_subscribers("Шевчук Олна")["ric"])
+
+            # топ-N за відстанню <<-> читається з GiST-індексу, а не сортуванням усієї таблиці
+            with pg.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'subscribers'")
+                    indexes = {row[0] for row in cursor.fetchall()}
+                    conn.autocommit = False
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+                    cursor.execute("EXPLAIN (FORMAT JSON) SELECT ric FROM subscribers "
+                                   "ORDER BY %s <<-> full_name LIMIT 5", ("Шевчинко",))
+                    plan = cursor.fetchone()[0][0]["Plan"]
+                    conn.rollback()
+                    conn.autocommit = True
+            assert {"idx_subscribers_full_name_trgm_gist", "idx_subscribers_phone_model_trgm_gist"} <= indexes
+            assert "idx_subscribers_full_name_trgm" not in indexes
+            scan = plan["Plans"][0]
+            print(f"   План пошуку за ПІБ: {scan['Node Type']} using {scan.get('Index Name')}")
+            assert scan["Index Name"] == "idx_subscribers_full_name_trgm_gist" and "Order By" in scan
+
+        async def scenario():
+            apg = await AsyncPostgresManager().connect()
+            try:
+                return await apg.search_subscribers("Шевчук")
+            finally:
+                await apg.close()
+
+        assert asyncio.run(scenario())["ric"].iloc[0] == "RIC-SEARCH-002"
+    finally:
+        for sub in subs:
+            pg.delete_subscriber(sub.ric)
+        pg.close()
+
+
+@pytest.mark.order(24)
+def test_change_stream_updates_derived_views():
+    print("\n---  TEST: Change Stream ---")
+
+    import uuid
+    from databases.change_stream import ChangeStreamPublisher, ChangeStreamConsumer
+    from databases.subscriber_cache import SubscriberCache
+
+    pg = PostgresManager()
+    redis = RedisManager()
+    stream_key = f"test:changes:{uuid.uuid4().hex}"
+    publisher = ChangeStreamPublisher(redis.r, stream_key=stream_key)
+    consumer = ChangeStreamConsumer(redis.r, stream_key=stream_key, consumer="test", max_attempts=2)
+    pg.add_change_listener(publisher.publish, publisher.publish_reset)
+    consumer.add_change_listener(redis.apply_subscriber_changes, redis.clear_cache)
+    cache = SubscriberCache(redis.r)
+    pg.enable_subscriber_cache(cache, consumer)
+
+    failures = []
+
+    def flaky(changes):
+        # перша пачка падає: подію не підтверджено, і вона приходить повторно
+        if not failures:
+            failures.append(changes)
+            raise RuntimeError("тимчасовий збій")
+
+    consumer.add_change_listener(flaky)
+
+    sub = Subscriber(
+        ric="RIC-STREAM-001", pin_code="0000", full_name="Потоковий", phone_model="Pixel 7",
+        phone_type="Смартфон", service_type="Стандарт", contract_start_date=date(2023, 1, 1),
+        contract_duration_months=12, monthly_fee=100.0, last_payment_date=date.today() - timedelta(days=90)
+    )
+    try:
+        consumer.ensure_group()
+        redis.clear_cache()
+        pg.add_subscriber(sub)
+        assert pg.get_subscriber(sub.ric).monthly_fee == 100.0
+        pg.update_subscriber(sub.ric, {"monthly_fee": 175.0})
+        pg.update_subscriber(sub.ric, {"monthly_fee": 180.0})
+
+        # до обробки потоку кеші ще не знають про зміни
+        assert redis.r.hlen(redis.entries_key) == 0
+        assert consumer.poll(block_ms=100) == 0
+        assert len(failures) == 1 and consumer.stats()["pending"] == 3
+
+        assert consumer.poll(block_ms=100) == 3
+        stats = consumer.stats()
+        print(f"   Статистика споживача: {stats}")
+        assert stats["changes"] == 1 and stats["pending"] == 0
+        debtors = redis.get_cached_debtors_frame()
+        assert list(debtors["ric"]) == [sub.ric] and debtors["monthly_fee"].iloc[0] == 180.0
+        # кеш абонента інвалідовано, тож читання бачить останню версію
+        assert pg.get_subscriber(sub.ric).monthly_fee == 180.0
+
+        pg.delete_subscriber(sub.ric)
+        assert consumer.poll(block_ms=100) == 1
+        assert redis.get_cached_debtors_frame().empty
+
+        publisher.publish_reset()
+        redis.r.set(redis.ready_key, 1)
+        assert consumer.poll(block_ms=100) == 1
+        assert not redis.is_debtors_cache_ready()
+        assert consumer.stats()["resets"] == 1
+    finally:
+        pg.delete_subscriber(sub.ric)
+        redis.r.delete(stream_key)
+        redis.clear_cache()
+        pg.close()
+
+
+@pytest.mark.order(25)
+def test_background_report_jobs():
+    print("\n---  TEST: Background Report Jobs ---")
+
+    import threading
+    import uuid
+    import pandas as pd
+    from databases.jobs import (JobQueue, JobWorker, report_handlers, JOB_DONE, JOB_FAILED, JOB_QUEUED,
+                                REPORT_DEBTORS, REPORT_TARIFFS)
+
+    pg = PostgresManager()
+    redis = RedisManager()
+    queue = JobQueue(redis.r, redis.r_raw, prefix=f"test:jobs:{uuid.uuid4().hex}")
+    release = threading.Event()
+
+    def slow_report(params, progress):
+        progress(0.5, "Половина")
+        release.wait(10)
+        return {"rows": pd.DataFrame({"n": range(params["size"])})}
+
+    def broken_report(params, progress):
+        raise RuntimeError("зламаний звіт")
+
+    handlers = dict(report_handlers(pg, redis), slow=slow_report, broken=broken_report)
+    worker = JobWorker(queue, handlers, concurrency=2, name="test-worker", block_seconds=0.2)
+
+    def wait_for(job_id, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = queue.status(job_id)
+            if job["status"] in (JOB_DONE, JOB_FAILED):
+                return job
+            time.sleep(0.05)
+        raise AssertionError(f"Завдання {job_id} не завершилось")
+
+    try:
+        # поки воркер не запущено, однакові завдання зливаються в одне
+        first = queue.submit("slow", {"size": 3})
+        assert queue.submit("slow", {"size": 3}) == first
+        assert queue.submit("slow", {"size": 4}) != first
+        assert queue.status(first)["status"] == JOB_QUEUED
+        assert queue.queue_length() == 2
+
+        worker.start()
+        deadline = time.monotonic() + 5
+        while queue.status(first)["progress"] < 0.5 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        job = queue.status(first)
+        assert (job["progress"], job["message"]) == (0.5, "Половина")
+        # завдання вже виконується — повторне натискання теж не ставить нового
+        assert queue.submit("slow", {"size": 3}) == first
+        release.set()
+
+        job = wait_for(first)
+        assert job["status"] == JOB_DONE and job["progress"] == 1.0
+        assert list(queue.result(first)["rows"]["n"]) == [0, 1, 2]
+        # після завершення той самий звіт можна перерахувати
+        assert queue.submit("slow", {"size": 3}) != first
+
+        failed = wait_for(queue.submit("broken"))
+        assert failed["status"] == JOB_FAILED and "зламаний звіт" in failed["error"]
+
+        tariffs = wait_for(queue.submit(REPORT_TARIFFS))
+        assert tariffs["status"] == JOB_DONE
+        assert set(queue.result(tariffs["id"])) == {"stats", "history"}
+        # відновлення статистики з UI йде тим самим завданням з прапорцем перерахунку
+        rebuilt = wait_for(queue.submit(REPORT_TARIFFS, {"rebuild": True}))
+        assert rebuilt["status"] == JOB_DONE
+        assert queue.result(rebuilt["id"])["stats"].equals(queue.result(tariffs["id"])["stats"])
+        debtors = wait_for(queue.submit(REPORT_DEBTORS))
+        assert debtors["status"] == JOB_DONE
+        assert "debtors" in queue.result(debtors["id"])
+        print(f"   Статистика воркера: {worker.stats()}")
+    finally:
+        release.set()
+        worker.stop()
+        keys = list(redis.r.scan_iter(match=f"{queue.prefix}:*"))
+        if keys:
+            redis.r.delete(*keys)
+        pg.close()